@@ -59,6 +59,7 @@ META_ANALYSIS_COLUMNS = [
 
 # Importuj prompty ze starého skriptu
 from paste import DOCUMENT_1_PROMPT, DOCUMENT_2_PROMPT, DOCUMENT_3_PROMPT
+from meta_parsing import parse_tsv
 
 
 class HybridPDFAnalyzer:
@@ -230,25 +231,13 @@ class HybridPDFAnalyzer:
     
     def _parse_response(self, text: str) -> Dict[str, Any]:
         """Parsuje textovou odpověď na tabulková data"""
-        lines = text.strip().split('\n')
-        
-        # Hledáme začátek tabulky
-        table_start = -1
-        for i, line in enumerate(lines):
-            if 'Idstudy\t' in line or line.startswith('Idstudy'):
-                table_start = i
-                break
-        
-        if table_start >= 0:
-            # Extrahujeme řádky tabulky
-            table_rows = []
-            for line in lines[table_start + 1:]:
-                if '\t' in line:
-                    cols = line.split('\t')
-                    if len(cols) == len(META_ANALYSIS_COLUMNS):
-                        table_rows.append(cols)
-            
-            return {'table_rows': table_rows}
+        parsed = parse_tsv(text, META_ANALYSIS_COLUMNS)
+        # Odmítnuté řádky už nemizí potichu
+        for problem in parsed.diagnostics():
+            logger.warning(f"⚠️ TSV: {problem}")
+        
+        if parsed.header_blocks > 0:
+            return {'table_rows': parsed.rows}
         else:
             return {'raw_text': text}
     
@@ -6,14 +6,11 @@ INFLATION_META_ANALYSIS_v8_new_structure.py
 Nová struktura dokumentů pro optimální extrakci dat
 """
 
+from __future__ import annotations
+
 import logging
 import sys
 import os
-import tkinter as tk
-from tkinter import filedialog
-import pandas as pd
-import PyPDF2
-import anthropic
 import datetime
 import time
 from typing import List, Dict, Optional, Tuple, Any
@@ -23,9 +20,32 @@ import json
 import pickle
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import re
-from dataclasses import dataclass
+import sqlite3
+import threading
+from dataclasses import dataclass, field
 from collections import defaultdict
 
+from meta_common import RunJournal, lazy_import, load_config
+from meta_dedup import DEDUP_MODES, DuplicateLink, find_duplicates, fingerprint
+from meta_document import PaperDocument
+from meta_evidence import NOT_FOUND, SCALED, VERBATIM, EvidenceIndex
+from meta_metadata import (FOLDED_METADATA_COLUMNS, LOCAL_METADATA_COLUMNS, MetadataPlan, local_metadata,
+                           plan_metadata, prompt_tasks, read_xmp)
+from meta_parsing import build_repair_prompt, is_compact, parse_compact, parse_tsv
+from meta_prescan import local_pre_scan
+from meta_responses import DEFAULT_RESPONSE_CACHE_NAME, ResponseCache, request_key
+from meta_search import DEFAULT_INDEX_NAME, RETRIEVAL_PAGES, SearchIndex, fts5_available, phrase_query
+from meta_schema import (BINARY_COLUMNS, COLUMN_INDEX, DIGIT_COLUMNS, FLOAT_COLUMNS, META_ANALYSIS_COLUMNS,
+                         apply_schema, concat_frames, empty_frame, frame_from_grid, rows_from_tool_input,
+                         rows_tool)
+from meta_sink import STUDIES_SHEET, ResultsSink, studies_frame, write_studies
+from meta_tables import TABLE_CAPTION_PATTERN, parse_table_grids, resolve_cell
+from meta_text import appendix_text, main_text, normalize_pages
+
+# Těžké knihovny se načítají až při prvním použití (rychlý start CLI)
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
 # Nastavení loggingu
 logging.basicConfig(
     level=logging.INFO,
@@ -36,36 +56,242 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Načtení konfigurace
-try:
-    from config import CLAUDE_API_KEY, SCOPUS_API_KEY, CLAUDE_MODEL
-except ImportError:
-    logger.error("❌ Chyba: Soubor config.py nebyl nalezen!")
-    print("Vytvořte soubor config.py s:")
-    print("CLAUDE_API_KEY = 'your_api_key_here'")
-    print("SCOPUS_API_KEY = 'your_scopus_key_here'")
-    print("CLAUDE_MODEL = 'claude-opus-4-20250514'  # Claude 4 Opus")
-    sys.exit(1)
-
-# Definice sloupců
-META_ANALYSIS_COLUMNS = [
-    "Idstudy", "IdEstimate", "Author", "Author_Affiliation", "DOI", "Journal_Name", 
-    "Num_Citations", "Year", "Base_Model_Type", "Augmented_base_model", 
-    "Augmentation_Description", "Ramsey_Rule", "HH_Included", "Firms_Included", 
-    "Banks_Included", "Government_Included", "HH_Maximization_Type", 
-    "HH_Maximized_Vars", "Producer_Type", "Producer_Assumption", 
-    "Other_Agent_Included", "Other_Agent_Assumptions", "Empirical_Research", 
-    "Country", "Flexible_Price_Assumption", "Exogenous_Inflation", "Households_discount_factor", 
-    "Consumption_curvature_parameter", "Disutility_of_labor", 
-    "Inverse_of_labor_supply_elasticity", "Money_curvature_parameter", 
-    "Loan_to_value_ratio", "Labor_share_of_output", "Depositors_discount_factor", 
-    "Price_adjustment_cost", "Elasticity_of_substitution_between_goods", 
-    "AR1_coefficient_of_TFP", "Std_dev_to_TFP_shock", "Zero_Lower_Bound", 
-    "Results_Table", "Results_Inflation", "Results_Inflation_Assumption", 
-    "Preferred_Estimate", "Reason_for_Preferred", "Std_Dev_Inflation", 
-    "Interest_Rate", "Impact_Factor"
+# Mapování pro Document 1 (metadata)
+DOC1_MAPPING = {
+    0: 'Idstudy', 2: 'Author', 3: 'Author_Affiliation', 
+    4: 'DOI', 5: 'Journal_Name', 6: 'Num_Citations',
+    7: 'Year', 8: 'Base_Model_Type', 23: 'Country', 
+    46: 'Impact_Factor'
+}
+
+# Mapování pro Document 2 (structure - bez moved variables)
+DOC2_MAPPING = {
+    9: 'Augmented_base_model', 10: 'Augmentation_Description',
+    11: 'Ramsey_Rule', 12: 'HH_Included', 13: 'Firms_Included',
+    14: 'Banks_Included', 15: 'Government_Included',
+    16: 'HH_Maximization_Type', 17: 'HH_Maximized_Vars',
+    18: 'Producer_Type', 19: 'Producer_Assumption',
+    20: 'Other_Agent_Included', 21: 'Other_Agent_Assumptions',
+    22: 'Empirical_Research'
+}
+
+# Mapování pro Document 3 (results + moved variables)
+DOC3_MAPPING = {
+    1: 'IdEstimate', 
+    24: 'Flexible_Price_Assumption',  # MOVED FROM DOC2
+    25: 'Exogenous_Inflation',        # MOVED FROM DOC2
+    26: 'Households_discount_factor',
+    27: 'Consumption_curvature_parameter', 28: 'Disutility_of_labor',
+    29: 'Inverse_of_labor_supply_elasticity', 30: 'Money_curvature_parameter',
+    31: 'Loan_to_value_ratio', 32: 'Labor_share_of_output',
+    33: 'Depositors_discount_factor', 34: 'Price_adjustment_cost',
+    35: 'Elasticity_of_substitution_between_goods',
+    36: 'AR1_coefficient_of_TFP', 37: 'Std_dev_to_TFP_shock',
+    38: 'Zero_Lower_Bound',           # MOVED FROM DOC2
+    39: 'Results_Table',
+    40: 'Results_Inflation', 41: 'Results_Inflation_Assumption',
+    42: 'Preferred_Estimate', 43: 'Reason_for_Preferred',
+    44: 'Std_Dev_Inflation', 45: 'Interest_Rate'
+}
+
+# Sloupce, které jednotlivé fáze plní
+STAGE_MAPPINGS = {
+    "metadata": DOC1_MAPPING,
+    "structure": DOC2_MAPPING,
+    "results": DOC3_MAPPING,
+}
+
+# Sloupce, které fáze vypisuje (Idstudy + vlastní mapování v kanonickém pořadí);
+# merge je podle mapování zapíše do plného schématu
+STAGE_COLUMNS = {
+    doc_type: ["Idstudy"] + [mapping[idx] for idx in sorted(mapping) if mapping[idx] != "Idstudy"]
+    for doc_type, mapping in STAGE_MAPPINGS.items()
+}
+
+
+
+def column_stage(column: str) -> Optional[str]:
+    """Fáze, která sloupec plní (None pro neznámé sloupce)"""
+    return next((doc_type for doc_type, mapping in STAGE_MAPPINGS.items()
+                 if column in mapping.values() and column != "Idstudy"), None)
+
+
+# Kolikrát nejvýš navázat na odpověď useknutou na max_tokens
+MAX_CONTINUATIONS = 3
+
+CONTINUATION_PROMPT = """Your output was cut off by the output limit.{last_row}
+Continue the same table with the remaining rows only: no header, no section markers, no prose, no code fences.
+Do not repeat rows that were already written."""
+
+# Fan-out Document 3 po tabulkách: od kolika tabulek, kolik tabulek na požadavek
+# a kolik skupin běží souběžně (první skupina jde sama, aby zahřála cache)
+TABLE_FAN_OUT_MIN_TABLES = 4
+TABLE_GROUP_SIZE = 2
+TABLE_FAN_OUT_WORKERS = 4
+
+TABLE_FOCUS_PROMPT = """
+
+## FOCUS OF THIS REQUEST
+This request covers ONLY the inflation results reported in: {tables}.
+Ignore results from all other tables - they are extracted by separate requests.
+Number IdEstimate from 1 within this request.
+"""
+
+TEXT_FOCUS_PROMPT = """
+
+## FOCUS OF THIS REQUEST
+This request covers ONLY inflation results stated in the text or in figures, NOT in any table
+(tables {tables} are extracted by separate requests). If there are none, output only the header.
+Number IdEstimate from 1 within this request.
+"""
+
+# Hybridní režim: hodnoty z lokálních mřížek tabulek, model vrací jen adresy buněk
+GRID_COLUMNS = ["Grid_Cell", "Scale"]
+GRID_RESULT_COLUMNS = META_ANALYSIS_COLUMNS + GRID_COLUMNS
+
+GRID_LABEL_PROMPT = """
+
+## LOCAL TABLE GRIDS
+The numeric tables below were parsed directly from the PDF; every cell has an address G<grid>R<row>C<column>.
+For every inflation result that appears in these grids, do NOT type its value:
+- add the columns Grid_Cell and Scale to the @ROWS header
+- Grid_Cell = the cell address (e.g. G1R3C2) and Results_Inflation = "="
+- Scale = "percent" if the table reports inflation in percent, otherwise "decimal"
+Results that are not in any grid are written as usual, with Grid_Cell = NA.
+
+{grids}
+"""
+
+# Doplnění chybějících výsledků (reconciliation): nejvýš tolik lokací na článek
+MAX_RECONCILE_LOCATIONS = 5
+
+# Tabulka/obrázek/sekce v popisu lokace ("Table 3", "Fig. 2", "Appendix B.1")
+LOCATION_PATTERN = re.compile(
+    r'\b(table|figure|fig\.?|appendix|section)\s*([A-Z]?\.?\d+(?:\.\d+)*[a-z]?|[A-Z]\b)', re.IGNORECASE)
+
+# Věta pre-scanu "This paper contains AT LEAST [X] distinct inflation results" (i bez AT LEAST, s [X] či **X**)
+PRE_SCAN_COUNT_PATTERN = re.compile(
+    r'contains\s+(?:at\s+least\s+)?[\[*]*\s*(\d+)\s*[\]*]*\s+distinct\s+inflation\s+results', re.IGNORECASE)
+
+# Verze extrakce v klíči cache - změna zneplatní dříve uložené extrakce
+EXTRACTION_VERSION = 5
+
+# Lokace pre-scanu, která ukazuje do přílohy ("Appendix B", "Online supplement", "Table A.2")
+APPENDIX_LOCATION_PATTERN = re.compile(r'appendix|supplement|online|\btable\s+[A-Z]\.?\d', re.IGNORECASE)
+
+# Pre-scan vidí z přílohy jen titulky tabulek, aby mohl ukázat, že výsledky jsou i tam
+APPENDIX_TABLES_NOTE = "\n\nAPPENDIX (not included; table captions only):\n{captions}"
+
+# Lokální pre-scan s aspoň takovou jistotou nahradí API volání Document 0
+PRE_SCAN_CONFIDENCE = 0.8
+
+# Řádek rozpisu pre-scanu "Table 1<TAB>5"
+PRE_SCAN_LOCATION_LINE = re.compile(r'^\s*([^\t]*[A-Za-z][^\t]*?)\s*\t\s*(\d+)\s*$')
+
+RECONCILE_PROMPT = """# Document 3 follow-up: missing results in {location}
+
+The pre-scan counted {expected} inflation results in {location}, but only {found} were extracted:
+{extracted}
+
+Extract ONLY the missing inflation results from {location}, with the same rules as the full extraction:
+- Results_Inflation exactly as reported (keep the sign), Results_Table = {location}
+- Calibration parameters and assumptions that apply to each result, "NA" if not stated
+- Do not repeat the results listed above; if nothing is missing, output only the header
+
+Output a tab-separated table with exactly this header and no prose:
+{header}
+"""
+
+# Překódování jednoho sloupce: řádky studie, podle kterých model pozná odhady, a kolik stran kontextu
+RECODE_ROW_COLUMNS = ["IdEstimate", "Results_Table", "Results_Inflation", "Results_Inflation_Assumption"]
+RECODE_PAGES = 6
+
+RECODE_PROMPT = """# Re-coding one column: {column}
+
+This study (Idstudy {study_id}) was already extracted. Re-code ONLY the column {column}
+according to the revised instruction below; every other column stays as it is.
+
+## REVISED INSTRUCTION
+{instruction}
+
+## EXISTING ROWS
+{rows}
+
+## OUTPUT FORMAT REQUIREMENTS
+- **NEVER fabricate data** - use "NA" when the paper does not support a value
+- {scope}
+- Output a tab-separated table with exactly this header and no prose:
+{header}
+"""
+
+
+def location_key(location: str) -> str:
+    """Normalizovaný klíč lokace, aby se "Fig. 2" z pre-scanu shodovalo s "Figure 2" v Results_Table"""
+    match = LOCATION_PATTERN.search(location or '')
+    if not match:
+        return ' '.join(str(location or '').lower().split())
+    kind = match.group(1).lower()
+    kind = 'figure' if kind.startswith('fig') else kind
+    return f"{kind} {match.group(2).lower().lstrip('.')}"
+
+
+def grid_label_prompt(user_prompt: str, grids: List) -> str:
+    """Prompt Document 3 doplněný o lokální mřížky tabulek"""
+    return user_prompt + GRID_LABEL_PROMPT.format(grids='\n\n'.join(g.render() for g in grids))
+
+
+def result_key(row: List[Any]) -> tuple:
+    """Klíč výsledku bez IdEstimate - stejný řádek z dvou odpovědí se započítá jednou"""
+    return tuple(str(value).strip() for idx, value in enumerate(row) if idx != 1)
+
+
+# Sloupce, které Document 3 v kompaktním tvaru vždy píše do @ROWS;
+# kalibrace a předpoklady jdou jednou do @DEFAULTS
+COMPACT_ROW_COLUMNS = [
+    "IdEstimate", "Results_Table", "Results_Inflation", "Results_Inflation_Assumption",
+    "Preferred_Estimate", "Reason_for_Preferred",
 ]
 
+# Režimy výstupu: TSV v textu, nebo typované řádky přes tool use
+OUTPUT_MODES = ("tsv", "tool")
+
+PRE_SCAN_TOOL = {
+    "name": "report_count",
+    "description": "Report the number of distinct inflation results found in the paper.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "count": {"type": "integer", "minimum": 0},
+            "locations": {
+                "type": "array",
+                "description": "Count per location (table/figure/text section) using the paper's labels",
+                "items": {
+                    "type": "object",
+                    "properties": {"location": {"type": "string"}, "count": {"type": "integer", "minimum": 0}},
+                    "required": ["location", "count"],
+                },
+            },
+        },
+        "required": ["count"],
+    },
+}
+
+TOOL_OUTPUT_INSTRUCTION = """
+
+## OUTPUT VIA TOOL
+Ignore the tab-separated output format above. Return the result ONLY by calling the `{tool}` tool:
+one object per row, with the listed columns as keys. Use null for missing values (never the string "NA").
+"""
+
+
+def stage_tool(doc_type: str) -> Dict[str, Any]:
+    """Nástroj s JSON schématem výstupu dané fáze"""
+    if doc_type == "pre_scan":
+        return PRE_SCAN_TOOL
+    return rows_tool(f"record_{doc_type}", f"Record the extracted {doc_type} rows of the paper.",
+                     STAGE_COLUMNS[doc_type])
+
+
 # EMBEDDED PROMPTS - Nová struktura
 DOCUMENT_0_PROMPT = """
 # Document 0: Inflation Results Pre-Scanner
@@ -105,6 +331,12 @@ Check these locations in order:
 ### 4. Output Format
 State clearly: "This paper contains AT LEAST [X] distinct inflation results. Document 3 will perform a detailed extraction and may find additional results."
 
+Then list the count per location, one location per line, tab-separated, using the paper's own labels:
+LOCATION	COUNT
+Table 1	5
+Figure 2	3
+Text Section 4.2	2
+
 ## VALIDATION NOTE
 If Document 3 finds more results during detailed extraction, Document 3's count is authoritative. This pre-scan provides a minimum baseline to help subsequent documents prepare.
 
@@ -129,19 +361,17 @@ Extract data from academic PDF articles for meta-analysis dataset creation. Proc
 ### MANDATORY COMPLIANCE REQUIREMENTS
 - **NEVER leave any cell empty** - use "NA" for missing information
 - **NEVER fabricate data** - only report verifiable information from sources
-- **ALWAYS use exact column names** as specified in the complete output format
-- **ALWAYS fill only assigned columns** - use "NA" for all other columns
+- **ALWAYS use exact column names** as specified in the output columns
+- **ALWAYS output only the assigned columns** - other columns are filled by other documents
 
 ### OUTPUT FORMAT REQUIREMENTS
-- Generate a table with ALL 47 column headers (complete list at the end of the document)
-- Fill ONLY the columns specified in this document
-- Mark all other columns as "NA"
+- Generate a table with ONLY the 10 columns listed below, in this order
 - Use tab-separated format for easy Excel import
-- Include a header row with all column names
+- Include a header row with exactly these column names
 
-## COMPLETE COLUMN LIST (47 COLUMNS)
+## OUTPUT COLUMNS (10 COLUMNS)
 ```
-Idstudy	IdEstimate	Author	Author_Affiliation	DOI	Journal_Name	Num_Citations	Year	Base_Model_Type	Augmented_base_model	Augmentation_Description	Ramsey_Rule	HH_Included	Firms_Included	Banks_Included	Government_Included	HH_Maximization_Type	HH_Maximized_Vars	Producer_Type	Producer_Assumption	Other_Agent_Included	Other_Agent_Assumptions	Empirical_Research	Country	Flexible_Price_Assumption	Exogenous_Inflation	Households_discount_factor	Consumption_curvature_parameter	Disutility_of_labor	Inverse_of_labor_supply_elasticity	Money_curvature_parameter	Loan_to_value_ratio	Labor_share_of_output	Depositors_discount_factor	Price_adjustment_cost	Elasticity_of_substitution_between_goods	AR1_coefficient_of_TFP	Std_dev_to_TFP_shock	Zero_Lower_Bound	Results_Table	Results_Inflation	Results_Inflation_Assumption	Preferred_Estimate	Reason_for_Preferred	Std_Dev_Inflation	Interest_Rate	Impact_Factor
+Idstudy	Author	Author_Affiliation	DOI	Journal_Name	Num_Citations	Year	Base_Model_Type	Country	Impact_Factor
 ```
 
 ## DOCUMENT 1 ASSIGNED COLUMNS
@@ -157,7 +387,7 @@ This document extracts the following columns:
 - Country
 - Impact_Factor
 
-All other columns must be filled with "NA".
+Do not output any other column.
 
 ## EXTRACTION INSTRUCTIONS
 
@@ -253,16 +483,53 @@ All other columns must be filled with "NA".
 
 ### Post-Extraction:
 - [ ] All assigned columns have values or appropriate "Cannot find" messages
-- [ ] All non-assigned columns marked as "NA"
+- [ ] Only the 10 output columns present
 - [ ] Study ID assigned
 
 ## OUTPUT EXAMPLE
 
-Idstudy  IdEstimate  Author  Author_Affiliation  DOI  Journal_Name  Num_Citations  Year  Base_Model_Type	Augmented_base_model	Augmentation_Description	Ramsey_Rule	HH_Included	Firms_Included	Banks_Included	Government_Included	HH_Maximization_Type	HH_Maximized_Vars	Producer_Type	Producer_Assumption	Other_Agent_Included	Other_Agent_Assumptions	Empirical_Research	Country	Flexible_Price_Assumption	Exogenous_Inflation	Households_discount_factor	Consumption_curvature_parameter	Disutility_of_labor	Inverse_of_labor_supply_elasticity	Money_curvature_parameter	Loan_to_value_ratio	Labor_share_of_output	Depositors_discount_factor	Price_adjustment_cost	Elasticity_of_substitution_between_goods	AR1_coefficient_of_TFP	Std_dev_to_TFP_shock	Zero_Lower_Bound	Results_Table	Results_Inflation	Results_Inflation_Assumption	Preferred_Estimate	Reason_for_Preferred	Std_Dev_Inflation	Interest_Rate	Impact_Factor
-1  NA  Smith, J. (2023)  MIT  10.1234/example  Journal of Monetary Economics  45	2023	DSGE	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	US	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA
+Idstudy	Author	Author_Affiliation	DOI	Journal_Name	Num_Citations	Year	Base_Model_Type	Country	Impact_Factor
+1	Smith, J. (2023)	MIT	10.1234/example	Journal of Monetary Economics	45	2023	DSGE	US	NA
+
+"""
+
+# Document 1 jen na sloupce, které se lokálně nenašly (úkoly se berou z DOCUMENT_1_PROMPT)
+METADATA_REDUCED_PROMPT = """
+# Document 1: Metadata & Study Identification Instructions (remaining columns)
 
+These columns were already read from the PDF itself - do not search for them and do not output them:
+{known}
+
+## OUTPUT FORMAT REQUIREMENTS
+- **NEVER fabricate data** - use "NA" for missing information
+- Tab-separated table with a header row and exactly ONE data row
+- Output ONLY these columns, in this order:
+```
+Idstudy	{columns}
+```
+
+## EXTRACTION INSTRUCTIONS
+
+{tasks}
+"""
+
+# Když se Document 1 přeskočí, jeho sloupce, které potřebují text článku, přibudou do Document 2
+STRUCTURE_METADATA_PROMPT = """
+
+## ADDITIONAL STUDY COLUMNS
+Bibliographic metadata was already read from the PDF, so this request also covers the columns below.
+Append them at the end of the header and of the single study row, in this order: {columns}
+The title page is included at the start of the PDF content.
+
+{tasks}
 """
 
+# Kolik stran dostane zúžený Document 1, když autor, rok, DOI i časopis jsou známé
+REDUCED_METADATA_PAGES = 2
+
+# Kolik znaků titulní strany se přidá do Document 2 místo přeskočeného Document 1
+TITLE_PAGE_CHARS = 4000
+
 DOCUMENT_2_PROMPT = """
 # Document 2: Model Structure & Assumptions Instructions
 
@@ -271,22 +538,20 @@ DOCUMENT_2_PROMPT = """
 ### MANDATORY COMPLIANCE REQUIREMENTS
 - **NEVER leave any cell empty** - use "NA" for missing information
 - **NEVER fabricate data** - only report verifiable information from sources
-- **ALWAYS use exact column names** as specified in the complete output format
+- **ALWAYS use exact column names** as specified in the output columns
 - **ALWAYS follow the 0/1 coding system** for Yes/No questions (0 = No, 1 = Yes)
-- **ALWAYS fill only assigned columns** - use "NA" for all other columns
+- **ALWAYS output only the assigned columns** - other columns are filled by other documents
 - **CREATE ONLY ONE ROW PER STUDY** - this document extracts study-level information only
 
 ### OUTPUT FORMAT REQUIREMENTS
-- Generate a table with ALL 47 column headers (complete list below)
-- Fill ONLY the columns specified in this document
-- Mark all other columns as "NA"
+- Generate a table with ONLY the 15 columns listed below, in this order
 - Use tab-separated format for easy Excel import
-- Include a header row with all column names
+- Include a header row with exactly these column names
 - **Output exactly ONE row representing the entire study**
 
-## COMPLETE COLUMN LIST (47 COLUMNS)
+## OUTPUT COLUMNS (15 COLUMNS)
 
-Idstudy	IdEstimate	Author	Author_Affiliation	DOI	Journal_Name	Num_Citations	Year	Base_Model_Type	Augmented_base_model	Augmentation_Description	Ramsey_Rule	HH_Included	Firms_Included	Banks_Included	Government_Included	HH_Maximization_Type	HH_Maximized_Vars	Producer_Type	Producer_Assumption	Other_Agent_Included	Other_Agent_Assumptions	Empirical_Research	Country	Flexible_Price_Assumption	Exogenous_Inflation	Households_discount_factor	Consumption_curvature_parameter	Disutility_of_labor	Inverse_of_labor_supply_elasticity	Money_curvature_parameter	Loan_to_value_ratio	Labor_share_of_output	Depositors_discount_factor	Price_adjustment_cost	Elasticity_of_substitution_between_goods	AR1_coefficient_of_TFP	Std_dev_to_TFP_shock	Zero_Lower_Bound	Results_Table	Results_Inflation	Results_Inflation_Assumption	Preferred_Estimate	Reason_for_Preferred	Std_Dev_Inflation	Interest_Rate	Impact_Factor
+Idstudy	Augmented_base_model	Augmentation_Description	Ramsey_Rule	HH_Included	Firms_Included	Banks_Included	Government_Included	HH_Maximization_Type	HH_Maximized_Vars	Producer_Type	Producer_Assumption	Other_Agent_Included	Other_Agent_Assumptions	Empirical_Research
 
 ## DOCUMENT 2 ASSIGNED COLUMNS
 This document extracts the following study-level columns:
@@ -306,7 +571,7 @@ This document extracts the following study-level columns:
 - Other_Agent_Assumptions
 - Empirical_Research
 
-All other columns must be filled with "NA".
+Do not output any other column.
 
 ## EXTRACTION INSTRUCTIONS
 
@@ -424,8 +689,8 @@ All other columns must be filled with "NA".
 
 ## OUTPUT EXAMPLE (ONE ROW ONLY)
 
-Idstudy  IdEstimate  Author	Author_Affiliation	DOI	Journal_Name	Num_Citations	Year	Base_Model_Type  Augmented_base_model  Augmentation_Description  Ramsey_Rule	HH_Included  Firms_Included  Banks_Included  Government_Included  HH_Maximization_Type	HH_Maximized_Vars	Producer_Type	Producer_Assumption	Other_Agent_Included	Other_Agent_Assumptions	Empirical_Research	Country	Flexible_Price_Assumption	Exogenous_Inflation	Households_discount_factor	Consumption_curvature_parameter	Disutility_of_labor	Inverse_of_labor_supply_elasticity	Money_curvature_parameter	Loan_to_value_ratio	Labor_share_of_output	Depositors_discount_factor	Price_adjustment_cost	Elasticity_of_substitution_between_goods	AR1_coefficient_of_TFP	Std_dev_to_TFP_shock	Zero_Lower_Bound	Results_Table	Results_Inflation	Results_Inflation_Assumption	Preferred_Estimate	Reason_for_Preferred	Std_Dev_Inflation	Interest_Rate	Impact_Factor
-1  NA  NA  NA  NA  NA  NA  NA  NA  1  Financial frictions  0  1  1  1  1  utility	consumption, labor	intermediate firms, final firms	intermediate firms: monopolistic competition, final firms: perfect competition	0  NA  0  NA  NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA
+Idstudy	Augmented_base_model	Augmentation_Description	Ramsey_Rule	HH_Included	Firms_Included	Banks_Included	Government_Included	HH_Maximization_Type	HH_Maximized_Vars	Producer_Type	Producer_Assumption	Other_Agent_Included	Other_Agent_Assumptions	Empirical_Research
+1	1	Financial frictions	0	1	1	1	1	utility	consumption, labor	intermediate firms, final firms	intermediate firms: monopolistic competition, final firms: perfect competition	0	NA	0
 """
 
 DOCUMENT_3_PROMPT = """
@@ -437,26 +702,26 @@ DOCUMENT_3_PROMPT = """
 ### MANDATORY COMPLIANCE REQUIREMENTS
 - **NEVER leave any cell empty** - use "NA" for missing information
 - **NEVER fabricate data** - only report verifiable information from sources
-- **ALWAYS use exact column names** as specified in the complete output format
+- **ALWAYS use exact column names** as specified in the output columns
 - **ALWAYS extract ALL inflation results** from ALL tables, figures, and the whole study (sensitivity analysis or robustness checks as well)
 - **ALWAYS verify variable identification** using notation sections and context
 - **ALWAYS reset assumptions for each new table** - never carry over structure assumptions
 - **ALWAYS preserve numerical signs** - negative values must include minus sign
 - **ALWAYS cross-verify results** when similar tables appear
-- **ALWAYS fill only assigned columns** - use "NA" for all other columns
-
-### OUTPUT FORMAT REQUIREMENTS
-- Generate a table with ALL 47 column headers (complete list below)
-- Fill ONLY the columns specified in this document
-- Mark all other columns as "NA"
-- Each row = one inflation result from the paper
-- Use tab-separated format for easy Excel import
-- Include a header row with all column names
+- **ALWAYS output only the assigned columns** - other columns are filled by other documents
+
+### OUTPUT FORMAT REQUIREMENTS (COMPACT)
+- Use ONLY the 24 columns listed below, tab-separated, in two sections:
+  1. A line `@DEFAULTS`, then a header row and exactly ONE row with the values shared by the paper's estimates (Idstudy, calibration parameters, usual assumptions)
+  2. A line `@ROWS`, then a header row with IdEstimate, Results_Table, Results_Inflation, Results_Inflation_Assumption, Preferred_Estimate, Reason_for_Preferred and every other column whose value differs between estimates, then one row per inflation result
+- In @ROWS write `=` to keep the default value; write "NA" only when the value is missing for that estimate
+- Every column must appear in @DEFAULTS or in @ROWS
+- Each @ROWS row = one inflation result from the paper
 - **FINAL ROW COUNT**: Extract ALL inflation results found. If more results are found than Document 0's estimate, the higher count is correct.
 
-## COMPLETE COLUMN LIST (47 COLUMNS)
+## OUTPUT COLUMNS (24 COLUMNS)
 
-Idstudy	IdEstimate	Author	Author_Affiliation	DOI	Journal_Name	Num_Citations	Year	Base_Model_Type	Augmented_base_model	Augmentation_Description	Ramsey_Rule	HH_Included	Firms_Included	Banks_Included	Government_Included	HH_Maximization_Type	HH_Maximized_Vars	Producer_Type	Producer_Assumption	Other_Agent_Included	Other_Agent_Assumptions	Empirical_Research	Country	Flexible_Price_Assumption	Exogenous_Inflation	Households_discount_factor	Consumption_curvature_parameter	Disutility_of_labor	Inverse_of_labor_supply_elasticity	Money_curvature_parameter	Loan_to_value_ratio	Labor_share_of_output	Depositors_discount_factor	Price_adjustment_cost	Elasticity_of_substitution_between_goods	AR1_coefficient_of_TFP	Std_dev_to_TFP_shock	Zero_Lower_Bound	Results_Table	Results_Inflation	Results_Inflation_Assumption	Preferred_Estimate	Reason_for_Preferred	Std_Dev_Inflation	Interest_Rate	Impact_Factor
+Idstudy	IdEstimate	Flexible_Price_Assumption	Exogenous_Inflation	Households_discount_factor	Consumption_curvature_parameter	Disutility_of_labor	Inverse_of_labor_supply_elasticity	Money_curvature_parameter	Loan_to_value_ratio	Labor_share_of_output	Depositors_discount_factor	Price_adjustment_cost	Elasticity_of_substitution_between_goods	AR1_coefficient_of_TFP	Std_dev_to_TFP_shock	Zero_Lower_Bound	Results_Table	Results_Inflation	Results_Inflation_Assumption	Preferred_Estimate	Reason_for_Preferred	Std_Dev_Inflation	Interest_Rate
 
 
 ## DOCUMENT 3 ASSIGNED COLUMNS
@@ -475,7 +740,7 @@ This document extracts the following columns:
 - Std_Dev_Inflation
 - Interest_Rate
 
-All other columns must be filled with "NA".
+Do not output any other column.
 
 ## CRITICAL NOTATION GUIDE (READ FIRST)
 
@@ -772,13 +1037,45 @@ All other columns must be filled with "NA".
 - [ ] All signs verified
 
 ## OUTPUT EXAMPLE (Multiple rows showing variation)
-OUTPUT EXAMPLE (Multiple rows showing variation)
-Idstudy	IdEstimate	Author	Author_Affiliation	DOI	Journal_Name	Num_Citations	Year	Base_Model_Type	Augmented_base_model	Augmentation_Description	Ramsey_Rule	HH_Included	Firms_Included	Banks_Included	Government_Included	HH_Maximization_Type	HH_Maximized_Vars	Producer_Type	Producer_Assumption	Other_Agent_Included	Other_Agent_Assumptions	Empirical_Research	Country	Flexible_Price_Assumption	Exogenous_Inflation	Households_discount_factor	Consumption_curvature_parameter	Disutility_of_labor	Inverse_of_labor_supply_elasticity	Money_curvature_parameter	Loan_to_value_ratio	Labor_share_of_output	Depositors_discount_factor	Price_adjustment_cost	Elasticity_of_substitution_between_goods	AR1_coefficient_of_TFP	Std_dev_to_TFP_shock	Zero_Lower_Bound	Results_Table	Results_Inflation	Results_Inflation_Assumption	Preferred_Estimate	Reason_for_Preferred	Std_Dev_Inflation	Interest_Rate	Impact_Factor
-1	1	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	1	0	0.99	2	0.5	1	0	NA	0.67	NA	NA	6	0.95	0.007	0	Table 1	-0.045	Baseline with flexible prices	1	Main specification	NA	0.02	NA
-1	2	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	0	0	0.99	2	0.5	1	0	NA	0.67	NA	75	6	0.95	0.007	0	Table 1	0.002	Baseline with sticky prices	0	NA	NA	0.04	NA
-1	3	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	NA	0	0	0.99	2	0.5	1	0	NA	0.67	NA	75	6	0.95	0.007	1	Table 2	0.000	Sticky prices with ZLB	0	NA	NA	0.04	NA
+@DEFAULTS
+Idstudy	Flexible_Price_Assumption	Exogenous_Inflation	Households_discount_factor	Consumption_curvature_parameter	Disutility_of_labor	Inverse_of_labor_supply_elasticity	Money_curvature_parameter	Loan_to_value_ratio	Labor_share_of_output	Depositors_discount_factor	Price_adjustment_cost	Elasticity_of_substitution_between_goods	AR1_coefficient_of_TFP	Std_dev_to_TFP_shock	Zero_Lower_Bound	Std_Dev_Inflation	Interest_Rate
+1	0	0	0.99	2	0.5	1	0	NA	0.67	NA	75	6	0.95	0.007	0	NA	0.04
+@ROWS
+IdEstimate	Flexible_Price_Assumption	Price_adjustment_cost	Zero_Lower_Bound	Results_Table	Results_Inflation	Results_Inflation_Assumption	Preferred_Estimate	Reason_for_Preferred	Interest_Rate
+1	1	NA	=	Table 1	-0.045	Baseline with flexible prices	1	Main specification	0.02
+2	=	=	=	Table 1	0.002	Baseline with sticky prices	0	NA	=
+3	=	=	1	Table 2	0.000	Sticky prices with ZLB	0	NA	=
 
 """
+# Aktualizované ceny pro různé modely (v USD za 1M tokenů)
+MODEL_PRICING = {
+    "claude-opus-4-20250514": {
+        "input": 15.00,    # $15 per 1M input tokens
+        "output": 75.00,   # $75 per 1M output tokens
+        "cache_write": 3.75,  # 25% z input ceny
+        "cache_read": 0.15    # 1% z input ceny
+    },
+    "claude-3-opus-20240229": {
+        "input": 15.00,    # $15 per 1M input tokens
+        "output": 75.00,   # $75 per 1M output tokens
+        "cache_write": 3.75,  # 25% z input ceny
+        "cache_read": 0.15    # 1% z input ceny
+    },
+    "claude-3-5-sonnet-20241022": {
+        "input": 3.00,     # $3 per 1M input tokens
+        "output": 15.00,   # $15 per 1M output tokens
+        "cache_write": 0.75,  # 25% z input ceny
+        "cache_read": 0.03    # 1% z input ceny
+    },
+    "claude-3-5-haiku-20241022": {
+        "input": 0.80,     # $0.80 per 1M input tokens
+        "output": 4.00,    # $4 per 1M output tokens
+        "cache_write": 0.20,  # 25% z input ceny
+        "cache_read": 0.008   # 1% z input ceny
+    }
+}
+
+
 @dataclass
 class CostEstimate:
     """Třída pro sledování nákladů"""
@@ -786,83 +1083,221 @@ class CostEstimate:
     output_tokens: int = 0
     cache_write_tokens: int = 0
     cache_read_tokens: int = 0
+    # Skutečné využití po modelech: model -> CostEstimate bez dalšího vnoření
+    model_usage: Dict[str, "CostEstimate"] = field(default_factory=dict)
     
-    def calculate_cost(self, model: str = "claude-3-opus-20240229") -> float:
-        """Vypočítá odhadované náklady v USD"""
-        # Aktualizované ceny pro různé modely (v USD za 1M tokenů)
-        pricing = {
-            "claude-opus-4-20250514": {
-                "input": 15.00,    # $15 per 1M input tokens
-                "output": 75.00,   # $75 per 1M output tokens
-                "cache_write": 3.75,  # 25% z input ceny
-                "cache_read": 0.15    # 1% z input ceny
-            },
-            "claude-3-opus-20240229": {
-                "input": 15.00,    # $15 per 1M input tokens
-                "output": 75.00,   # $75 per 1M output tokens
-                "cache_write": 3.75,  # 25% z input ceny
-                "cache_read": 0.15    # 1% z input ceny
-            },
-            "claude-3-5-sonnet-20241022": {
-                "input": 3.00,     # $3 per 1M input tokens
-                "output": 15.00,   # $15 per 1M output tokens
-                "cache_write": 0.75,  # 25% z input ceny
-                "cache_read": 0.03    # 1% z input ceny
-            }
-        }
+    def add_usage(self, model: Optional[str], input_tokens: int = 0, output_tokens: int = 0,
+                  cache_write_tokens: int = 0, cache_read_tokens: int = 0):
+        """Přičte tokeny celkově i k danému modelu"""
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cache_write_tokens += cache_write_tokens
+        self.cache_read_tokens += cache_read_tokens
+        if model:
+            usage = self.model_usage.setdefault(model, CostEstimate())
+            usage.add_usage(None, input_tokens, output_tokens, cache_write_tokens, cache_read_tokens)
+    
+    def _priced(self, prices: Dict[str, float]) -> float:
+        """Náklady tokenů tohoto objektu při daném ceníku"""
+        return (
+            (self.input_tokens / 1_000_000) * prices["input"] +
+            (self.output_tokens / 1_000_000) * prices["output"] +
+            (self.cache_write_tokens / 1_000_000) * prices["cache_write"] +
+            (self.cache_read_tokens / 1_000_000) * prices["cache_read"]
+        )
+    
+    def calculate_cost(self, model: Optional[str] = None) -> float:
+        """Vypočítá odhadované náklady v USD
+        
+        Bez parametru se počítá ze skutečného využití po modelech; s parametrem
+        jsou všechny tokeny oceněny cenou zadaného modelu.
+        """
+        if model is not None:
+            return self._priced(MODEL_PRICING.get(model, MODEL_PRICING["claude-opus-4-20250514"]))
+        
+        if self.model_usage:
+            return sum(usage.calculate_cost(name) for name, usage in self.model_usage.items())
         
-        # Použijeme průměrné ceny, protože používáme mix modelů
+        # Bez údajů po modelech použijeme průměrné ceny mixu modelů
         opus4_ratio = 0.4  # Přibližně 40% volání je Claude 4 Opus (results + fallbacks)
         sonnet_ratio = 0.6  # 60% je Sonnet (pre-scan, metadata, structure)
         
         avg_prices = {
-            "input": (pricing["claude-opus-4-20250514"]["input"] * opus4_ratio + 
-                     pricing["claude-3-5-sonnet-20241022"]["input"] * sonnet_ratio),
-            "output": (pricing["claude-opus-4-20250514"]["output"] * opus4_ratio + 
-                      pricing["claude-3-5-sonnet-20241022"]["output"] * sonnet_ratio),
-            "cache_write": (pricing["claude-opus-4-20250514"]["cache_write"] * opus4_ratio + 
-                           pricing["claude-3-5-sonnet-20241022"]["cache_write"] * sonnet_ratio),
-            "cache_read": (pricing["claude-opus-4-20250514"]["cache_read"] * opus4_ratio + 
-                          pricing["claude-3-5-sonnet-20241022"]["cache_read"] * sonnet_ratio)
+            key: (MODEL_PRICING["claude-opus-4-20250514"][key] * opus4_ratio +
+                  MODEL_PRICING["claude-3-5-sonnet-20241022"][key] * sonnet_ratio)
+            for key in ("input", "output", "cache_write", "cache_read")
         }
+        return self._priced(avg_prices)
+
+
+class BudgetGovernor:
+    """Hlídá projektované náklady běhu a postupně šetří, když se blíží limit
+    
+    Úrovně (nevrací se zpět): 1 = results stage na levnější model,
+    2 = bez Opus fallbacků, 3 = pauza (další články se nezpracují).
+    Každé rozhodnutí se zapíše do journalu běhu.
+    """
+    
+    LEVEL_NAMES = {1: "downgrade_results", 2: "skip_fallbacks", 3: "pause"}
+    
+    def __init__(self, cap_usd: float, journal: Optional[RunJournal] = None,
+                 downgrade_at: float = 0.8, skip_fallback_at: float = 0.9,
+                 cheap_model: str = "claude-3-5-sonnet-20241022", window: int = 10):
+        self.cap_usd = cap_usd
+        self.journal = journal
+        self.downgrade_at = downgrade_at
+        self.skip_fallback_at = skip_fallback_at
+        self.cheap_model = cheap_model
+        self.window = window
+        self.level = 0
+        self._paper_costs: List[float] = []
+        self._last_spent = 0.0
+        self._lock = threading.Lock()
+    
+    @property
+    def paused(self) -> bool:
+        """Governor zastavil zpracování dalších článků"""
+        return self.level >= 3
+    
+    def project(self, spent: float, remaining: int) -> float:
+        """Projekce celkových nákladů z průměru posledních článků"""
+        recent = self._paper_costs[-self.window:]
+        if not recent:
+            return spent
+        return spent + (sum(recent) / len(recent)) * remaining
+    
+    def record_paper(self, analyzer: "OptimizedPDFAnalyzer", done: int, total: int) -> float:
+        """Zaznamená dokončený článek, případně zpřísní režim a vrátí projekci"""
+        with self._lock:
+            spent = analyzer.cost_tracker.calculate_cost()
+            self._paper_costs.append(spent - self._last_spent)
+            self._last_spent = spent
+            remaining = max(total - done, 0)
+            projected = self.project(spent, remaining)
+            next_paper = self.project(spent, 1) - spent
+            
+            if self.level < 1 and projected >= self.cap_usd * self.downgrade_at:
+                self._escalate(1, analyzer, spent, projected, remaining)
+            if self.level < 2 and projected >= self.cap_usd * self.skip_fallback_at:
+                self._escalate(2, analyzer, spent, projected, remaining)
+            if self.level < 3 and remaining > 0 and spent + next_paper >= self.cap_usd:
+                self._escalate(3, analyzer, spent, projected, remaining)
+            return projected
+    
+    def _escalate(self, level: int, analyzer: "OptimizedPDFAnalyzer", spent: float,
+                  projected: float, remaining: int):
+        """Aplikuje úroveň úspor na analyzátor a zapíše rozhodnutí"""
+        self.level = level
+        if level == 1:
+            previous = analyzer.model_config["results"]
+            analyzer.model_config["results"] = self.cheap_model
+            detail = f"results: {previous} -> {self.cheap_model}"
+        elif level == 2:
+            analyzer.allow_fallback = False
+            detail = "fallback vypnut"
+        else:
+            detail = f"zbývá {remaining} článků"
         
-        cost = (
-            (self.input_tokens / 1_000_000) * avg_prices["input"] +
-            (self.output_tokens / 1_000_000) * avg_prices["output"] +
-            (self.cache_write_tokens / 1_000_000) * avg_prices["cache_write"] +
-            (self.cache_read_tokens / 1_000_000) * avg_prices["cache_read"]
-        )
-        
-        return cost
+        logger.warning(f"💸 Budget governor: {self.LEVEL_NAMES[level]} ({detail}) - "
+                       f"utraceno ${spent:.2f}, projekce ${projected:.2f}, limit ${self.cap_usd:.2f}")
+        if self.journal:
+            self.journal.log("budget_decision", decision=self.LEVEL_NAMES[level], detail=detail,
+                             spent_usd=round(spent, 4), projected_usd=round(projected, 4),
+                             cap_usd=self.cap_usd, remaining_papers=remaining)
+
+
+class RequestRateLimiter:
+    """Thread-safe limit počtu API požadavků za minutu (klouzavé okno)"""
+    
+    def __init__(self, requests_per_minute: int = 50):
+        self.requests_per_minute = requests_per_minute
+        self._timestamps: List[float] = []
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Počká, dokud není v okně volné místo, a zaregistruje požadavek"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._timestamps = [t for t in self._timestamps if now - t < 60]
+                if len(self._timestamps) < self.requests_per_minute:
+                    self._timestamps.append(now)
+                    return
+                wait = 60 - (now - self._timestamps[0])
+            time.sleep(max(wait, 0.05))
 
 
 class OptimizedPDFAnalyzer:
     """Optimalizovaný analyzátor s novou strukturou dokumentů"""
     
-    def __init__(self, api_key: str, export_folder: str):
+    def __init__(self, api_key: Optional[str], export_folder: str,
+                 model_config: Optional[Dict[str, str]] = None,
+                 budget_usd: Optional[float] = None, output_mode: str = "tsv",
+                 fan_out_tables: bool = False, local_tables: bool = False,
+                 pre_scan_confidence: float = PRE_SCAN_CONFIDENCE, dedup: str = "link",
+                 response_cache: bool = False, index_pages: bool = True):
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"Neznámý režim výstupu: {output_mode} (povolené: {', '.join(OUTPUT_MODES)})")
+        if dedup not in DEDUP_MODES:
+            raise ValueError(f"Neznámý režim duplicit: {dedup} (povolené: {', '.join(DEDUP_MODES)})")
         self.api_key = api_key
+        self.output_mode = output_mode
+        self.fan_out_tables = fan_out_tables
+        self.local_tables = local_tables
+        self.pre_scan_confidence = pre_scan_confidence
+        self.dedup = dedup
         self.export_folder = export_folder
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self._client = None
         self.current_study_id = 1
+        self.study_ids: Dict[str, int] = {}           # jméno PDF -> Idstudy
+        self.duplicates: List[DuplicateLink] = []     # kopie a verze nalezené před zpracováním
         
         # Cache složky
         self.cache_dir = Path(export_folder) / "cache"
         self.cache_dir.mkdir(exist_ok=True)
         
+        # Fulltextový index stran (plní se z cache, slouží jako výběr kontextu);
+        # extrakční procesy ho nepotřebují - strany zaindexuje hlavní proces
+        self.search_index = (SearchIndex(self.cache_dir / DEFAULT_INDEX_NAME)
+                             if index_pages and fts5_available() else None)
+        
+        # Cache odpovědí API (stejný požadavek se znovu neposílá)
+        self.response_cache = ResponseCache(self.cache_dir / DEFAULT_RESPONSE_CACHE_NAME) if response_cache else None
+        
         # Statistiky
         self.cost_tracker = CostEstimate()
         self.extraction_stats = defaultdict(int)
         self.document_stats = defaultdict(list)  # Pro sledování všech dokumentů
         self.quality_metrics = defaultdict(list)  # Pro kvalitu extrakce
         
+        # Sdílené mezi API workery
+        self.rate_limiter = RequestRateLimiter()
+        self._lock = threading.RLock()
+        
         # Konfigurace modelů - používáme nejlepší pro složité úkoly
         self.model_config = {
             "pre_scan": "claude-3-5-sonnet-20241022",     # Levnější pro jednoduché počítání
             "metadata": "claude-3-5-sonnet-20241022",     # Levnější pro metadata
             "structure": "claude-3-5-sonnet-20241022",    # Levnější pro strukturu
             "results": "claude-opus-4-20250514",          # Claude 4 Opus pro nejsložitější extrakci
-            "fallback": "claude-opus-4-20250514"          # Claude 4 Opus jako fallback
+            "fallback": "claude-opus-4-20250514",         # Claude 4 Opus jako fallback
+            "repair": "claude-3-5-haiku-20241022"         # Oprava formátu odpovědi (bez PDF)
         }
+        if model_config:
+            self.model_config.update(model_config)
+        
+        # Journal rozhodnutí a hlídání rozpočtu
+        self.journal = RunJournal(Path(export_folder) / "run_journal.jsonl")
+        self.allow_fallback = True
+        self.budget_governor = BudgetGovernor(budget_usd, self.journal) if budget_usd else None
+    
+    @property
+    def client(self):
+        """Anthropic klient se vytváří až při prvním API volání"""
+        if self._client is None:
+            import anthropic
+            self._client = anthropic.Anthropic(api_key=self.api_key)
+        return self._client
         
     def extract_pdf_content_enhanced(self, pdf_path: str) -> Dict[str, Any]:
         """Vylepšená extrakce PDF s preprocessing"""
@@ -873,35 +1308,45 @@ class OptimizedPDFAnalyzer:
         cached_content = self._load_from_cache(cache_key)
         if cached_content:
             logger.info("📦 Načteno z cache")
+            cached_content['cache_key'] = cache_key
+            cached_content['file'] = os.path.basename(pdf_path)
+            self._index_document(cached_content)
             return cached_content
         
         try:
+            import PyPDF2
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 
-                # Strukturovaná extrakce
-                content = {
-                    "full_text": "",
-                    "pages": [],
-                    "metadata": self._extract_pdf_metadata(pdf_reader),
-                    "sections": {}
-                }
-                
                 # Extrakce po stránkách
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    page_text = page.extract_text()
-                    content["pages"].append(page_text)
-                    content["full_text"] += page_text + "\n"
+                raw_pages = [page.extract_text() or '' for page in pdf_reader.pages]
+                
+                # Bez záhlaví/zápatí, čísel stran a literatury (literatura zvlášť v "references")
+                normalized = normalize_pages(raw_pages)
+                stats = normalized["text_stats"]
+                logger.info(f"✂️ Normalizace textu: {stats['raw_tokens']:,} -> {stats['clean_tokens']:,} tokenů "
+                            f"(-{stats['saved_pct']:.1f} %, literatura {stats['references_chars']:,} znaků)")
                 
-                # Detekce sekcí
-                content["sections"] = self._detect_sections(content["full_text"])
+                # Text jednou v bufferu, strany/sekce/tabulky jsou jen rozsahy v něm;
+                # index čísel (evidence) se postaví až při ověřování
+                # Bibliografická pole z metadat PDF a surového záhlaví (normalizace je zahazuje)
+                metadata = self._extract_pdf_metadata(pdf_reader)
+                metadata['local'] = local_metadata(metadata, raw_pages)
                 
-                # Extrakce tabulek
-                content["tables"] = self._extract_tables(content["full_text"])
+                content = PaperDocument.from_pages(
+                    normalized["pages"], metadata=metadata,
+                    references=normalized["references"], appendix_page=normalized["appendix_page"],
+                    appendix_offset=normalized["appendix_offset"], text_stats=stats)
                 
-                # Uložit do cache
+                # Sekce a tabulky (tabulky jen v hlavním textu - příloha se přidává až podle pre-scanu)
+                content.set_spans(self._detect_sections(content.full_text),
+                                  self._extract_tables(main_text(content)))
+                
+                # Uložit do cache a zaindexovat strany
+                content['cache_key'] = cache_key
+                content['file'] = os.path.basename(pdf_path)
                 self._save_to_cache(cache_key, content)
+                self._index_document(content)
                 
                 logger.info(f"✅ Extrahováno {len(content['full_text'])} znaků z {len(pdf_reader.pages)} stran")
                 return content
@@ -910,6 +1355,26 @@ class OptimizedPDFAnalyzer:
             logger.error(f"❌ Chyba při čtení PDF: {e}")
             return {"full_text": "", "pages": [], "metadata": {}, "sections": {}}
     
+    def _index_document(self, content: Dict):
+        """Přidá strany článku do fulltextového indexu (jen pokud tam ještě nejsou)"""
+        if self.search_index is None:
+            return
+        try:
+            if not self.search_index.has(content['cache_key']):
+                self.search_index.add_document(content['cache_key'], content['file'], content['pages'])
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Indexace stran selhala: {e}")
+    
+    def retrieve_pages(self, pdf_content: Dict, query: str, limit: int = RETRIEVAL_PAGES) -> List[int]:
+        """Strany článku relevantní k dotazu podle indexu (prázdné bez indexu)"""
+        if self.search_index is None or not pdf_content.get('cache_key') or not query:
+            return []
+        try:
+            return self.search_index.retrieve_pages(pdf_content['cache_key'], query, limit)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Dotaz do indexu selhal: {e}")
+            return []
+    
     def _extract_pdf_metadata(self, pdf_reader) -> Dict:
         """Extrahuje metadata z PDF"""
         metadata = {}
@@ -919,14 +1384,18 @@ class OptimizedPDFAnalyzer:
                     "title": pdf_reader.metadata.get('/Title', ''),
                     "author": pdf_reader.metadata.get('/Author', ''),
                     "subject": pdf_reader.metadata.get('/Subject', ''),
-                    "creation_date": pdf_reader.metadata.get('/CreationDate', '')
+                    "creation_date": pdf_reader.metadata.get('/CreationDate', ''),
+                    "doi": pdf_reader.metadata.get('/doi', '')
                 }
         except:
             pass
+        xmp = read_xmp(pdf_reader)
+        if xmp:
+            metadata["xmp"] = xmp
         return metadata
     
-    def _detect_sections(self, text: str) -> Dict[str, str]:
-        """Detekuje sekce v textu"""
+    def _detect_sections(self, text: str) -> Dict[str, Tuple[int, int]]:
+        """Detekuje sekce v textu - vrací rozsahy (start, konec) v textu"""
         sections = {}
         
         # Hledáme běžné sekce
@@ -941,51 +1410,66 @@ class OptimizedPDFAnalyzer:
         for pattern, name in section_patterns:
             match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
             if match:
-                sections[name] = match.group(1)[:2000]  # Limit délky
+                start, end = match.span(1)
+                sections[name] = (start, min(end, start + 2000))  # Limit délky
         
         return sections
     
-    def _extract_tables(self, text: str) -> List[str]:
-        """Extrahuje potenciální tabulky z textu"""
+    def _extract_tables(self, text: str) -> List[Tuple[int, int]]:
+        """Extrahuje potenciální tabulky z textu - vrací rozsahy (start, konec) v textu
+        
+        Tabulka je souvislý úsek od titulku po poslední řádek, který vypadá jako řádek tabulky.
+        """
         tables = []
         
         # Hledáme struktury které vypadají jako tabulky
-        lines = text.split('\n')
-        potential_table = []
-        in_table = False
+        potential_rows = 0
+        table_start = table_end = None
+        pos = 0
         
-        for line in lines:
+        for line in text.split('\n'):
+            line_start, pos = pos, pos + len(line) + 1
             # Detekce začátku tabulky
             if re.search(r'table\s+\d+', line, re.IGNORECASE):
-                in_table = True
-                potential_table = [line]
-            elif in_table:
+                table_start, table_end = line_start, line_start + len(line)
+                potential_rows = 1
+            elif table_start is not None:
                 # Kontrola jestli řádek vypadá jako součást tabulky
                 if re.search(r'\d+\.\d+|\t|  {2,}', line):
-                    potential_table.append(line)
-                elif len(potential_table) > 3:
+                    table_end = line_start + len(line)
+                    potential_rows += 1
+                elif potential_rows > 3:
                     # Konec tabulky
-                    tables.append('\n'.join(potential_table))
-                    in_table = False
-                    potential_table = []
+                    tables.append((table_start, table_end))
+                    table_start = None
         
         return tables
     
-    def create_optimized_prompts(self, pdf_content: Dict, doc_type: str) -> Tuple[List[Dict], str]:
-        """Vytvoří optimalizované prompty s minimální velikostí"""
+    def create_optimized_prompts(self, pdf_content: Dict, doc_type: str,
+                                 include_appendix: bool = False) -> Tuple[List[Dict], str]:
+        """Vytvoří optimalizované prompty s minimální velikostí (příloha jen s include_appendix)"""
         
         # Pro různé dokumenty používáme různé části PDF
         if doc_type == "pre_scan":
             # Pro pre-scan potřebujeme celý dokument ale zkrácený
-            relevant_text = pdf_content['full_text'][:30000]  # Limit pro rychlost
+            relevant_text = main_text(pdf_content)[:30000]  # Limit pro rychlost
+            captions = [f"{t['label']} (page {t['page']}) {t['caption']}"
+                        for t in self.build_table_index(pdf_content) if self._in_appendix(pdf_content, t['page'])]
+            if captions:
+                relevant_text += APPENDIX_TABLES_NOTE.format(captions='\n'.join(captions))
         elif doc_type == "metadata":
-            # Pro metadata stačí prvních pár stran
-            relevant_text = '\n'.join(pdf_content['pages'][:5]) if pdf_content['pages'] else pdf_content['full_text'][:10000]
+            # Pro metadata stačí prvních pár stran (po lokálním nálezu autora, roku, DOI a časopisu méně)
+            plan = self.metadata_plan(pdf_content)
+            pages = REDUCED_METADATA_PAGES if all(c in plan.local for c in LOCAL_METADATA_COLUMNS) else 5
+            relevant_text = '\n'.join(pdf_content['pages'][:pages]) if pdf_content['pages'] else pdf_content['full_text'][:10000]
         elif doc_type == "structure":
             # Pro strukturu potřebujeme metodologii
             relevant_text = pdf_content['sections'].get('methodology', '') + '\n' + pdf_content['sections'].get('introduction', '')
             if len(relevant_text) < 1000:
-                relevant_text = pdf_content['full_text'][:20000]
+                relevant_text = main_text(pdf_content)[:20000]
+            # Afiliace místo přeskočeného Document 1 jsou na titulní straně
+            if self.metadata_plan(pdf_content).skip and pdf_content['pages']:
+                relevant_text = f"TITLE PAGE:\n{pdf_content['pages'][0][:TITLE_PAGE_CHARS]}\n\n{relevant_text}"
         else:  # results
             # Pro výsledky potřebujeme tabulky a výsledky
             relevant_text = pdf_content['sections'].get('results', '') + '\n' + pdf_content['sections'].get('calibration', '')
@@ -993,59 +1477,276 @@ class OptimizedPDFAnalyzer:
             for table in pdf_content['tables'][:5]:  # Max 5 tabulek
                 relevant_text += '\n' + table
             if len(relevant_text) < 2000:
-                relevant_text = pdf_content['full_text']
+                relevant_text = main_text(pdf_content)
+            if include_appendix:
+                relevant_text += '\n' + appendix_text(pdf_content)
         
-        # System prompt s cache control
-        system_prompt = [
-            {
-                "type": "text",
-                "text": f"You are analyzing an academic paper. Extract ONLY the requested information."
-            },
-            {
-                "type": "text",
-                "text": f"PDF CONTENT:\n\n{relevant_text}",
-                "cache_control": {"type": "ephemeral"}
-            }
-        ]
+        system_prompt = self._system_prompt(relevant_text)
         
         # User prompts podle typu
         if doc_type == "pre_scan":
             user_prompt = DOCUMENT_0_PROMPT
         elif doc_type == "metadata":
-            user_prompt = DOCUMENT_1_PROMPT
+            user_prompt = self._metadata_prompt(self.metadata_plan(pdf_content))
         elif doc_type == "structure":
             user_prompt = DOCUMENT_2_PROMPT
+            if self.metadata_plan(pdf_content).skip:
+                user_prompt += STRUCTURE_METADATA_PROMPT.format(
+                    columns='\t'.join(FOLDED_METADATA_COLUMNS),
+                    tasks=prompt_tasks(DOCUMENT_1_PROMPT, FOLDED_METADATA_COLUMNS))
         else:
             user_prompt = DOCUMENT_3_PROMPT
         
         return system_prompt, user_prompt
     
-    def analyze_with_fallback(self, system_prompt: List[Dict], user_prompt: str, 
-                            doc_type: str, use_thinking: bool = False) -> Dict[str, Any]:
-        """Analyzuje s fallback mechanismem pro levnější modely"""
+    def metadata_plan(self, pdf_content: Dict) -> MetadataPlan:
+        """Document 1: přeskočit, zúžit na chybějící sloupce, nebo poslat celý
         
+        Přeskočení jen v TSV režimu - schéma nástroje Document 2 přidané sloupce nezná.
+        """
+        return plan_metadata(pdf_content.get('metadata'), STAGE_COLUMNS["metadata"],
+                             allow_skip=self.output_mode == "tsv")
+    
+    def _metadata_prompt(self, plan: MetadataPlan) -> str:
+        """Prompt Document 1 - bez lokálních nálezů beze změny"""
+        if not plan.local:
+            return DOCUMENT_1_PROMPT
+        return METADATA_REDUCED_PROMPT.format(
+            known='\n'.join(f"- {column}: {value}" for column, value in plan.local.items()),
+            columns='\t'.join(plan.api_columns),
+            tasks=prompt_tasks(DOCUMENT_1_PROMPT, plan.api_columns))
+    
+    def _fill_known(self, result: Optional[Dict], known: Optional[Dict[str, str]]) -> Optional[Dict]:
+        """Doplní lokálně nalezené hodnoty do řádků odpovědi (mají přednost před modelem)"""
+        if not known or not result or not result.get('table_rows'):
+            return result
+        for row in result['table_rows']:
+            for column, value in known.items():
+                index = COLUMN_INDEX[column]
+                if index < len(row):
+                    row[index] = value
+        return result
+    
+    def _record_metadata_plan(self, doc_name: str, plan: MetadataPlan):
+        """Statistika lokálních metadat (podíl ušetřených volání Document 1)"""
+        with self._lock:
+            self.extraction_stats[f'metadata_{plan.mode}'] += 1
+            self.document_stats['local_metadata'].append({
+                'File': doc_name,
+                'Document_1': plan.mode,
+                **{column: plan.local.get(column) for column in LOCAL_METADATA_COLUMNS},
+                'Sources': ', '.join(f"{column}: {source}" for column, source in plan.sources.items()),
+                'API_Columns': ', '.join(plan.api_columns) if not plan.skip else ', '.join(FOLDED_METADATA_COLUMNS) + ' (Document 2)',
+            })
+    
+    def metadata_savings(self) -> Dict[str, Any]:
+        """Kolik volání Document 1 lokální metadata ušetřila (i jako podíl všech API volání)"""
+        counts = {mode: self.extraction_stats.get(f'metadata_{mode}', 0) for mode in ('skipped', 'reduced', 'full')}
+        papers = sum(counts.values())
+        requests = self.extraction_stats.get('api_requests', 0) + counts['skipped']
+        return {
+            **counts,
+            'doc1_avoided_pct': 100 * counts['skipped'] / papers if papers else 0.0,
+            'api_avoided_pct': 100 * counts['skipped'] / requests if requests else 0.0,
+        }
+    
+    def _local_metadata_result(self, plan: MetadataPlan, results2: Dict, study_id: int) -> Dict[str, Any]:
+        """Řádek Document 1 z lokálních polí a sloupců, které přibyly do Document 2"""
+        row = ['NA'] * len(META_ANALYSIS_COLUMNS)
+        row[COLUMN_INDEX['Idstudy']] = str(study_id)
+        structure_rows = (results2 or {}).get('table_rows') or []
+        for column in FOLDED_METADATA_COLUMNS:
+            if structure_rows and COLUMN_INDEX[column] < len(structure_rows[0]):
+                row[COLUMN_INDEX[column]] = structure_rows[0][COLUMN_INDEX[column]]
+        self._fill_known({'table_rows': [row]}, plan.local)
+        return {'table_rows': [row]}
+    
+    def _system_prompt(self, relevant_text: str) -> List[Dict]:
+        """System prompt s textem článku jako cachovaným prefixem"""
+        return [
+            {
+                "type": "text",
+                "text": f"You are analyzing an academic paper. Extract ONLY the requested information."
+            },
+            {
+                "type": "text",
+                "text": f"PDF CONTENT:\n\n{relevant_text}",
+                "cache_control": {"type": "ephemeral"}
+            }
+        ]
+    
+    def _in_appendix(self, pdf_content: Dict, page: int) -> bool:
+        """Leží strana (od 1) v příloze?"""
+        appendix_page = pdf_content.get('appendix_page')
+        return appendix_page is not None and page >= appendix_page
+    
+    def appendix_locations(self, pdf_content: Dict, locations: Optional[Dict[str, int]]) -> List[str]:
+        """Lokace pre-scanu, které ukazují do přílohy (prázdné = příloha se neposílá)"""
+        if not pdf_content.get('appendix_page') or not locations:
+            return []
+        pages = {location_key(t['label']): t['page'] for t in self.build_table_index(pdf_content)}
+        return [location for location in locations
+                if APPENDIX_LOCATION_PATTERN.search(location)
+                or self._in_appendix(pdf_content, pages.get(location_key(location), 0))]
+    
+    def build_table_index(self, pdf_content: Dict) -> List[Dict[str, Any]]:
+        """Tabulky článku podle titulků na stránkách: [{'label', 'page', 'caption'}]"""
+        index = []
+        seen = set()
+        for page_num, page_text in enumerate(pdf_content.get('pages') or [], 1):
+            for line in page_text.split('\n'):
+                match = TABLE_CAPTION_PATTERN.match(line)
+                if not match:
+                    continue
+                label = f"Table {match.group(1)}"
+                # První výskyt na začátku řádku je titulek, další jsou odkazy v textu
+                if label.lower() in seen:
+                    continue
+                seen.add(label.lower())
+                index.append({'label': label, 'page': page_num, 'caption': match.group(2).strip()[:120]})
+        return index
+    
+    def table_groups(self, pdf_content: Dict, include_appendix: bool = False) -> List[List[Dict[str, Any]]]:
+        """Skupiny tabulek pro fan-out, prázdný seznam = jeden požadavek na celý článek"""
+        index = [t for t in self.build_table_index(pdf_content)
+                 if include_appendix or not self._in_appendix(pdf_content, t['page'])]
+        if len(index) < TABLE_FAN_OUT_MIN_TABLES:
+            return []
+        return [index[i:i + TABLE_GROUP_SIZE] for i in range(0, len(index), TABLE_GROUP_SIZE)]
+    
+    def results_grids(self, pdf_content: Dict, include_appendix: bool = False) -> List:
+        """Lokální mřížky tabulek pro Document 3 (bez přílohy, pokud se neposílá)"""
+        pages = pdf_content.get('pages') or []
+        if not include_appendix and pdf_content.get('appendix_page'):
+            pages = pages[:pdf_content['appendix_page'] - 1]
+        return parse_table_grids(pages)
+    
+    def fan_out_prompts(self, pdf_content: Dict, groups: List[List[Dict[str, Any]]],
+                        include_appendix: bool = False) -> Tuple[List[Dict], List[str]]:
+        """Společný system prompt a user prompty fan-outu (skupiny tabulek, poslední je text)"""
+        text = pdf_content['full_text'] if include_appendix else main_text(pdf_content)
+        labels = ', '.join(f"{t['label']} (page {t['page']})" for group in groups for t in group)
+        prompts = [DOCUMENT_3_PROMPT + TABLE_FOCUS_PROMPT.format(
+                       tables=', '.join(f"{t['label']} (page {t['page']})" for t in group))
+                   for group in groups]
+        prompts.append(DOCUMENT_3_PROMPT + TEXT_FOCUS_PROMPT.format(tables=labels))
+        return self._system_prompt(text), prompts
+    
+    def analyze_results_fan_out(self, pdf_content: Dict, groups: List[List[Dict[str, Any]]],
+                                include_appendix: bool = False) -> Dict[str, Any]:
+        """Document 3 po skupinách tabulek nad společným cachovaným textem článku
+        
+        První požadavek běží sám a zapíše prefix do cache, ostatní pak souběžně
+        čtou z cache. Řádky se spojí v pořadí tabulek a přečíslují.
+        """
+        system_prompt, prompts = self.fan_out_prompts(pdf_content, groups, include_appendix)
+        labels = ', '.join(f"{t['label']} (page {t['page']})" for group in groups for t in group)
+        logger.info(f"🔀 Document 3 fan-out: {len(groups)} skupin tabulek + text ({labels})")
+        self.extraction_stats['results_fan_out_papers'] += 1
+        self.extraction_stats['results_fan_out_requests'] += len(prompts)
+        
+        results = [self.analyze_with_fallback(system_prompt, prompts[0], "results")]
+        with ThreadPoolExecutor(max_workers=min(TABLE_FAN_OUT_WORKERS, len(prompts) - 1)) as executor:
+            results += list(executor.map(
+                lambda prompt: self.analyze_with_fallback(system_prompt, prompt, "results"), prompts[1:]))
+        
+        rows, seen = [], set()
+        for result in results:
+            for row in result.get('table_rows') or []:
+                # Stejný výsledek vrácený dvěma skupinami započítáme jednou
+                key = result_key(row)
+                if key in seen:
+                    continue
+                seen.add(key)
+                rows.append(list(row))
+        for number, row in enumerate(rows, 1):
+            row[1] = str(number)
+        
+        if not rows:
+            return {'error': 'Failed to extract data', 'table_rows': []}
+        return {'table_rows': rows}
+    
+    def analyze_results_from_grids(self, system_prompt: List[Dict], user_prompt: str,
+                                   grids: List) -> Optional[Dict[str, Any]]:
+        """Document 3 nad lokálními mřížkami: model označí buňky, čísla se vezmou z dokumentu
+        
+        Vrací None, pokud odpověď nejde použít - pak běží běžná extrakce.
+        """
+        logger.info(f"🧮 Document 3 z lokálních mřížek: {', '.join(g.label for g in grids)}")
+        params = self.build_request_params(system_prompt, grid_label_prompt(user_prompt, grids), "results")
+        try:
+            response = self._create_message(params)
+            response = self._complete_truncated(params, response, "results")
+        except Exception as e:
+            logger.error(f"❌ Označení mřížek selhalo: {e}")
+            return None
+        
+        by_id = {grid.grid_id: grid for grid in grids}
+        cell_idx, scale_idx = len(META_ANALYSIS_COLUMNS), len(META_ANALYSIS_COLUMNS) + 1
+        rows = []
+        for row in self._parse_response(response, GRID_RESULT_COLUMNS).get('table_rows') or []:
+            if len(row) > cell_idx and row[cell_idx] not in ('NA', '', None):
+                cell = resolve_cell(by_id, row[cell_idx], row[scale_idx])
+                if cell is None:
+                    logger.warning(f"⚠️ Neplatná adresa buňky: {row[cell_idx]}")
+                    self.extraction_stats['grid_cell_invalid'] += 1
+                    continue
+                row[40] = cell['value']
+                if row[39] in ('NA', '', None):
+                    row[39] = cell['table']
+                self.extraction_stats['grid_values_filled'] += 1
+            rows.append(row[:len(META_ANALYSIS_COLUMNS)])
+        
+        result = {'table_rows': rows}
+        if not self._validate_response(result, "results"):
+            logger.warning("⚠️ Odpověď nad mřížkami nejde použít, zkouším běžnou extrakci")
+            self.extraction_stats['grid_failed'] += 1
+            return None
+        self.extraction_stats['results_success'] += 1
+        return result
+    
+    def build_request_params(self, system_prompt: List[Dict], user_prompt: str,
+                             doc_type: str, use_thinking: bool = False) -> Dict[str, Any]:
+        """Parametry API požadavku pro daný dokument (sdílí je analýza i --dry-run)"""
         # Vybereme model podle typu dokumentu
-        primary_model = self.model_config.get(doc_type, self.model_config["fallback"])
+        params = {
+            "model": self.model_config.get(doc_type, self.model_config["fallback"]),
+            "max_tokens": 8000 if not use_thinking else 10000,
+            "temperature": 0.1,
+            "system": system_prompt,
+            "messages": [{"role": "user", "content": user_prompt}]
+        }
+        if self.output_mode == "tool":
+            # Schéma vynutí typované řádky, odpadá parsování textu
+            tool = stage_tool(doc_type)
+            params["tools"] = [tool]
+            params["tool_choice"] = {"type": "tool", "name": tool["name"]}
+            params["messages"][0]["content"] = user_prompt + TOOL_OUTPUT_INSTRUCTION.format(tool=tool["name"])
+        return params
+    
+    def analyze_with_fallback(self, system_prompt: List[Dict], user_prompt: str, 
+                            doc_type: str, use_thinking: bool = False,
+                            known: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Analyzuje s fallback mechanismem pro levnější modely
+        
+        `known` jsou lokálně nalezené hodnoty sloupců - doplní se do odpovědi před validací.
+        """
+        
+        params = self.build_request_params(system_prompt, user_prompt, doc_type, use_thinking)
+        primary_model = params["model"]
         
         # První pokus s primárním modelem
         try:
             logger.info(f"🤖 Používám model {primary_model} pro {doc_type}")
             
-            params = {
-                "model": primary_model,
-                "max_tokens": 8000 if not use_thinking else 10000,
-                "temperature": 0.1,
-                "system": system_prompt,
-                "messages": [{"role": "user", "content": user_prompt}]
-            }
-            
-            response = self.client.messages.create(**params)
-            
-            # Tracking nákladů
-            self._track_usage(response)
+            response = self._create_message(params)
+            response = self._complete_truncated(params, response, doc_type)
             
             # Validace odpovědi
-            result = self._parse_response(response)
+            result = self._parse_response(response, doc_type=doc_type)
+            if result is not None and result.get('parse_errors') and doc_type != "pre_scan":
+                result = self._repair_response(response, result, doc_type)
+            result = self._fill_known(result, known)
             logger.info(f"📊 Parsed result for {doc_type}: {type(result)} - {result}")
             if result is None:
                 logger.warning(f"⚠️ Prázdná odpověď od {primary_model}, zkouším fallback")
@@ -1058,42 +1759,165 @@ class OptimizedPDFAnalyzer:
         except Exception as e:
             logger.error(f"❌ Chyba s {primary_model}: {e}")
         
-        # Fallback na Opus
-        if primary_model != self.model_config["fallback"]:
+        # Fallback na Opus (budget governor ho může vypnout)
+        if primary_model != self.model_config["fallback"] and not self.allow_fallback:
+            logger.warning(f"💸 Fallback pro {doc_type} přeskočen kvůli rozpočtu")
+            self.extraction_stats[f"{doc_type}_fallback_skipped"] += 1
+        elif primary_model != self.model_config["fallback"]:
             logger.info(f"🔄 Fallback na {self.model_config['fallback']}")
             self.extraction_stats[f"{doc_type}_fallback"] += 1
             
             params["model"] = self.model_config["fallback"]
             
             try:
-                response = self.client.messages.create(**params)
-                self._track_usage(response)
-                result = self._parse_response(response)
+                response = self._create_message(params)
+                response = self._complete_truncated(params, response, doc_type)
+                result = self._parse_response(response, doc_type=doc_type)
                 if result is None:
                     return {'error': 'Failed to parse response', 'table_rows': []}
-                return result
+                return self._fill_known(result, known)
             except Exception as e:
                 logger.error(f"❌ Fallback také selhal: {e}")
         
         return {'error': 'Failed to extract data', 'table_rows': []}
     
-    def _track_usage(self, response):
-        """Sleduje použití tokenů z response"""
+    def _complete_truncated(self, params: Dict[str, Any], response, doc_type: str):
+        """Naváže na odpověď useknutou na max_tokens; vrací původní odpověď nebo sešitý text
+        
+        Rozepsaný poslední řádek se zahodí a model pokračuje od posledního celého
+        odhadu. Systémový prompt (článek) je stejný, takže se čte z cache.
+        """
+        if getattr(response, 'stop_reason', None) != 'max_tokens':
+            return response
+        if self.output_mode == "tool":
+            # Useknutý vstup nástroje nejde navázat - zůstanou řádky, které prošly
+            logger.warning(f"✂️ {doc_type}: tool_use useknutý na max_tokens")
+            self.extraction_stats[f"{doc_type}_truncated"] += 1
+            return response
+        
+        text = self._response_text(response)
+        for _ in range(MAX_CONTINUATIONS):
+            # Poslední řádek je rozepsaný
+            text = text[:text.rfind('\n') + 1]
+            if not text.strip():
+                break
+            last_id = self._last_estimate_id(text)
+            last_row = f" The last complete row is IdEstimate {last_id}." if last_id else ""
+            logger.warning(f"✂️ {doc_type}: odpověď useknutá na max_tokens, navazuji za IdEstimate {last_id or '?'}")
+            self.extraction_stats[f"{doc_type}_continuations"] += 1
+            
+            continuation = dict(params)
+            continuation["messages"] = params["messages"] + [
+                {"role": "assistant", "content": text.rstrip()},
+                {"role": "user", "content": CONTINUATION_PROMPT.format(last_row=last_row)},
+            ]
+            response = self._create_message(continuation)
+            text = text.rstrip('\n') + '\n' + self._continuation_rows(self._response_text(response))
+            if getattr(response, 'stop_reason', None) != 'max_tokens':
+                return text
+        
+        self.extraction_stats[f"{doc_type}_truncated"] += 1
+        return text[:text.rfind('\n') + 1]
+    
+    def _last_estimate_id(self, text: str) -> Optional[int]:
+        """Nejvyšší IdEstimate mezi celými řádky"""
+        parse = parse_compact if is_compact(text) else parse_tsv
+        parsed = parse(text, META_ANALYSIS_COLUMNS)
+        ids = [int(row[1]) for row in parsed.rows if str(row[1]).strip().isdigit()]
+        return max(ids) if ids else None
+    
+    def _continuation_rows(self, text: str) -> str:
+        """Z pokračování ponechá jen tabulku (bez úvodní prózy a ``` ohraničení)"""
+        lines = [line for line in text.splitlines() if not line.strip().startswith('```')]
+        while lines and '\t' not in lines[0]:
+            lines.pop(0)
+        return '\n'.join(lines)
+    
+    def _response_text(self, response) -> str:
+        """Text odpovědi API (nebo už sešitý text z pokračování)"""
+        if isinstance(response, str):
+            return response
+        if hasattr(response, 'content'):
+            return response.content[0].text if response.content else ""
+        return str(response)
+    
+    def _repair_response(self, response, result: Dict[str, Any], doc_type: str) -> Dict[str, Any]:
+        """Levná oprava rozbitého TSV (bez PDF v kontextu) místo plného opakování na Opus"""
+        text = self._response_text(response)
+        repair_model = self.model_config["repair"]
+        logger.info(f"🩹 Opravuji formát {doc_type} přes {repair_model} ({len(result['parse_errors'])} problémů)")
+        
+        params = {
+            "model": repair_model,
+            "max_tokens": 8000,
+            "temperature": 0,
+            "messages": [{"role": "user", "content": build_repair_prompt(
+                text, STAGE_COLUMNS.get(doc_type, META_ANALYSIS_COLUMNS), result['parse_errors'])}]
+        }
+        try:
+            repaired = self._parse_response(self._create_message(params))
+        except Exception as e:
+            logger.error(f"❌ Oprava formátu selhala: {e}")
+            return result
+        
+        if repaired and repaired.get('table_rows') and not repaired.get('parse_errors'):
+            self.extraction_stats[f"{doc_type}_repaired"] += 1
+            return repaired
+        
+        # Oprava nepomohla - ponecháme řádky, které prošly
+        self.extraction_stats[f"{doc_type}_repair_failed"] += 1
+        return result
+    
+    def _create_message(self, params: Dict[str, Any]):
+        """Jediné místo, kde se volá API - cache odpovědí, rate limit a tracking nákladů"""
+        key = None
+        if self.response_cache is not None:
+            key = request_key(params)
+            try:
+                cached = self.response_cache.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Cache odpovědí nejde číst: {e}")
+                cached = None
+            if cached is not None:
+                with self._lock:
+                    self.extraction_stats['response_cache_hits'] += 1
+                return cached
+        
+        self.rate_limiter.acquire()
+        with self._lock:
+            self.extraction_stats['api_requests'] += 1
+        response = self.client.messages.create(**params)
+        self._track_usage(response, params.get("model"))
+        
+        if key is not None:
+            try:
+                self.response_cache.put(key, params.get("model"), response)
+            except (sqlite3.Error, pickle.PicklingError, TypeError) as e:
+                logger.warning(f"⚠️ Odpověď nejde uložit do cache: {e}")
+        return response
+    
+    def _track_usage(self, response, model: Optional[str] = None):
+        """Sleduje použití tokenů z response (celkově i po modelech)"""
         if hasattr(response, 'usage') and response.usage is not None:
             usage = response.usage
-            input_tokens = getattr(usage, 'input_tokens', None)
-            output_tokens = getattr(usage, 'output_tokens', None)
-            cache_write_tokens = getattr(usage, 'cache_creation_input_tokens', None)
-            cache_read_tokens = getattr(usage, 'cache_read_input_tokens', None)
-            
-            if input_tokens is not None:
-                self.cost_tracker.input_tokens += input_tokens
-            if output_tokens is not None:
-                self.cost_tracker.output_tokens += output_tokens
-            if cache_write_tokens is not None:
-                self.cost_tracker.cache_write_tokens += cache_write_tokens
-            if cache_read_tokens is not None:
-                self.cost_tracker.cache_read_tokens += cache_read_tokens
+            with self._lock:
+                self.cost_tracker.add_usage(
+                    model or getattr(response, 'model', None),
+                    input_tokens=getattr(usage, 'input_tokens', None) or 0,
+                    output_tokens=getattr(usage, 'output_tokens', None) or 0,
+                    cache_write_tokens=getattr(usage, 'cache_creation_input_tokens', None) or 0,
+                    cache_read_tokens=getattr(usage, 'cache_read_input_tokens', None) or 0,
+                )
+    
+    def is_paused(self) -> bool:
+        """Rozpočet nedovoluje zpracovat další článek"""
+        return self.budget_governor is not None and self.budget_governor.paused
+    
+    def check_budget(self, done: int, total: int) -> Optional[float]:
+        """Po dokončení článku aktualizuje budget governor a vrátí projekci nákladů"""
+        if self.budget_governor is None:
+            return None
+        return self.budget_governor.record_paper(self, done, total)
     
     def _analyze_document_quality(self, result: Dict, doc_type: str, filename: str) -> Dict:
         """Analyzuje kvalitu extrakce pro daný dokument"""
@@ -1240,7 +2064,7 @@ class OptimizedPDFAnalyzer:
             row = result['table_rows'][0]
             if len(row) < 8:
                 return False
-            if row[2] == 'NA' or row[7] == 'NA':  # Author, Year
+            if row[2] in ('NA', None) or row[7] in ('NA', None):  # Author, Year
                 return False
                 
         elif doc_type == "structure":
@@ -1256,53 +2080,46 @@ class OptimizedPDFAnalyzer:
             for row in result['table_rows']:
                 if len(row) < 46:
                     return False
-                if row[40] == 'NA':  # Results_Inflation
+                if row[40] in ('NA', None):  # Results_Inflation
                     return False
         
         return True
     
-    def _parse_response(self, response) -> Dict[str, Any]:
-        """Parsuje odpověď s lepším error handling"""
+    def _parse_response(self, response, columns: Optional[List[str]] = None,
+                        doc_type: Optional[str] = None) -> Dict[str, Any]:
+        """Parsuje odpověď s lepším error handling (columns = rozšířené schéma, jinak META_ANALYSIS_COLUMNS)
+        
+        U pre-scanu se rozpis po lokacích čte i bez rozpoznané věty s počtem.
+        """
+        columns = columns or META_ANALYSIS_COLUMNS
         try:
-            if hasattr(response, 'content'):
-                text = response.content[0].text if response.content else ""
-            else:
-                text = str(response)
+            # Tool use: vstup nástroje už odpovídá schématu fáze
+            for block in getattr(response, 'content', None) or []:
+                if getattr(block, 'type', None) == 'tool_use':
+                    return self._parse_tool_use(block)
             
-            # Speciální parsing pro pre-scan
-            if "This paper contains" in text and "distinct inflation results" in text:
-                # Hledáme číslo v textu
-                match = re.search(r'This paper contains (\d+) distinct inflation results', text)
-                if match:
-                    return {'count': int(match.group(1))}
+            text = self._response_text(response)
             
-            lines = text.strip().split('\n')
+            # Speciální parsing pro pre-scan
+            match = PRE_SCAN_COUNT_PATTERN.search(text)
+            locations = self._parse_pre_scan_locations(text) if match or doc_type == "pre_scan" else {}
+            if match or locations:
+                result = {'count': int(match.group(1)) if match else sum(locations.values())}
+                if locations:
+                    result['locations'] = locations
+                return result
             
-            # Hledáme začátek tabulky
-            table_start = -1
-            for i, line in enumerate(lines):
-                if 'Idstudy\t' in line or (line.startswith('Idstudy') and '\t' in line):
-                    table_start = i
-                    break
+            # Document 3 posílá kompaktní tvar (@DEFAULTS/@ROWS), ostatní prostou tabulku
+            if is_compact(text):
+                parsed = parse_compact(text, columns)
+            else:
+                parsed = parse_tsv(text, columns)
+            for problem in parsed.diagnostics():
+                logger.warning(f"⚠️ TSV: {problem}")
             
-            if table_start >= 0:
-                # Extrahujeme řádky tabulky
-                table_rows = []
-                for line in lines[table_start + 1:]:
-                    if '\t' in line:
-                        cols = line.split('\t')
-                        # Doplníme chybějící sloupce
-                        while len(cols) < len(META_ANALYSIS_COLUMNS):
-                            cols.append('NA')
-                        # Ořežeme přebytečné
-                        if len(cols) > len(META_ANALYSIS_COLUMNS):
-                            cols = cols[:len(META_ANALYSIS_COLUMNS)]
-                        table_rows.append(cols)
-                
-                if table_rows:
-                    return {'table_rows': table_rows}
-                else:
-                    return {'error': 'No valid table rows found'}
+            if parsed.header_blocks > 0 or parsed.stray_tab_lines:
+                # Tabulka (i rozbitá) - při chybách formátu rozhodne analyze_with_fallback o opravě
+                return parsed.to_result()
             else:
                 # Zkusíme najít strukturovaná data jinak
                 logger.warning("Nenalezena standardní tabulka, zkouším alternativní parsing")
@@ -1316,6 +2133,35 @@ class OptimizedPDFAnalyzer:
             logger.error(f"Chyba při parsování: {e}")
             return {'error': str(e)}
     
+    def _parse_pre_scan_locations(self, text: str) -> Dict[str, int]:
+        """Rozpis pre-scanu po lokacích: {'Table 1': 5, ...}"""
+        locations = {}
+        for line in text.splitlines():
+            match = PRE_SCAN_LOCATION_LINE.match(line)
+            if match and match.group(1).strip().upper() != 'LOCATION':
+                location = match.group(1).strip()
+                locations[location] = locations.get(location, 0) + int(match.group(2))
+        return locations
+    
+    def _parse_tool_use(self, block) -> Dict[str, Any]:
+        """Převede vstup nástroje na count (pre-scan) nebo typované řádky"""
+        tool_input = block.input if isinstance(block.input, dict) else {}
+        if block.name == PRE_SCAN_TOOL["name"]:
+            if isinstance(tool_input.get('count'), int):
+                result = {'count': tool_input['count']}
+                locations = {str(item.get('location')): item.get('count')
+                             for item in tool_input.get('locations') or []
+                             if isinstance(item, dict) and isinstance(item.get('count'), int)}
+                if locations:
+                    result['locations'] = locations
+                return result
+            return {'error': 'Missing count in tool input'}
+        
+        rows = rows_from_tool_input(tool_input)
+        if not rows:
+            return {'error': 'No rows in tool input', 'table_rows': []}
+        return {'table_rows': rows}
+    
     def _parse_alternative_format(self, text: str) -> Dict[str, Any]:
         """Parsuje alternativní formáty odpovědí"""
         # Zkusíme najít JSON
@@ -1356,10 +2202,12 @@ class OptimizedPDFAnalyzer:
         
         return {'error': 'Could not parse response', 'table_rows': []}
     
-    def analyze_pdf_optimized(self, pdf_path: str) -> pd.DataFrame:
+    def analyze_pdf_optimized(self, pdf_path: str, study_id: Optional[int] = None) -> pd.DataFrame:
         """Optimalizovaná analýza PDF s novou strukturou"""
         
         doc_name = os.path.basename(pdf_path)  # Definujeme hned na začátku
+        if study_id is None:
+            study_id = self.current_study_id
         
         logger.info(f"\n{'='*60}")
         logger.info(f"📚 Analyzuji PDF: {doc_name}")
@@ -1369,40 +2217,40 @@ class OptimizedPDFAnalyzer:
         pdf_content = self.extract_pdf_content_enhanced(pdf_path)
         if not pdf_content['full_text']:
             logger.error(f"❌ Nepodařilo se extrahovat obsah")
-            return self._create_empty_dataframe(self.current_study_id)
+            return self._create_empty_dataframe(study_id)
+        with self._lock:
+            self.study_ids[doc_name] = study_id
+        if self.search_index is not None and pdf_content.get('cache_key'):
+            try:
+                self.search_index.set_study_id(pdf_content['cache_key'], study_id)
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Zápis Idstudy do indexu selhal: {e}")
+        if pdf_content.get('text_stats'):
+            self.document_stats['text_normalization'].append({'file': doc_name, **pdf_content['text_stats']})
         
-        # 2. Document 0: Pre-scan pro počítání výsledků
-        logger.info("\n🔍 Document 0: Pre-scan (Sonnet)")
-        system_prompt, user_prompt = self.create_optimized_prompts(pdf_content, "pre_scan")
-        pre_scan_result = self.analyze_with_fallback(system_prompt, user_prompt, "pre_scan")
+        # 2. Document 0: Pre-scan pro počítání výsledků (lokálně, API jen při nízké jistotě)
+        pre_scan_result, local_scan = self.pre_scan(pdf_content)
         
         expected_results = 1  # Default
         if 'count' in pre_scan_result:
             expected_results = pre_scan_result['count']
             logger.info(f"📊 Očekávám {expected_results} inflačních výsledků")
         
-        # 3. Document 1: Metadata (levný model)
-        logger.info("\n📋 Document 1: Metadata (Sonnet)")
-        time.sleep(1)
-        system_prompt, user_prompt = self.create_optimized_prompts(pdf_content, "metadata")
-        results1 = self.analyze_with_fallback(system_prompt, user_prompt, "metadata")
-        
-        # Debug Document 1
-        doc1_quality = self._analyze_document_quality(results1, "metadata", doc_name)
-        logger.info(f"📊 Document 1 kvalita: {doc1_quality}")
-        if doc1_quality and 'valid_fields' in doc1_quality:
-            logger.info(f"📊 Document 1 kvalita: {doc1_quality['valid_fields']}/{doc1_quality['total_fields']} polí ({doc1_quality['success_rate']:.1f}%)")
-            if doc1_quality['missing_critical']:
-                logger.warning(f"⚠️ Document 1 chybí kritická pole: {', '.join(doc1_quality['missing_critical'])}")
+        # 3. Document 1: Metadata (levný model) - pole nalezená lokálně se modelu neposílají
+        plan = self.metadata_plan(pdf_content)
+        self._record_metadata_plan(doc_name, plan)
+        if plan.skip:
+            logger.info("\n📋 Document 1: přeskočeno - Author, Year, DOI a Journal_Name z PDF, "
+                        f"{', '.join(FOLDED_METADATA_COLUMNS)} v Document 2")
+            results1 = None
         else:
-            logger.error(f"❌ Document 1 kvalita je None nebo neplatná: {doc1_quality}")
-        
-        if doc1_quality:
-            self.document_stats['doc1_results'].append(doc1_quality)
+            logger.info("\n📋 Document 1: Metadata (Sonnet)"
+                        + (f" - jen {', '.join(plan.api_columns)}" if plan.local else ""))
+            system_prompt, user_prompt = self.create_optimized_prompts(pdf_content, "metadata")
+            results1 = self.analyze_with_fallback(system_prompt, user_prompt, "metadata", known=plan.local)
         
         # 4. Document 2: Structure - jen STUDIJNÍ úroveň (levný model)
         logger.info("\n📋 Document 2: Structure - Study Level (Sonnet)")
-        time.sleep(1)
         system_prompt, user_prompt = self.create_optimized_prompts(pdf_content, "structure")
         results2 = self.analyze_with_fallback(system_prompt, user_prompt, "structure")
         
@@ -1419,11 +2267,38 @@ class OptimizedPDFAnalyzer:
         if doc2_quality:
             self.document_stats['doc2_results'].append(doc2_quality)
         
-        # 5. Document 3: Results s moved variables (Opus)
+        # Přeskočený Document 1 = lokální pole + sloupce přidané do Document 2
+        if results1 is None:
+            results1 = self._local_metadata_result(plan, results2, study_id)
+        
+        # Debug Document 1
+        doc1_quality = self._analyze_document_quality(results1, "metadata", doc_name)
+        logger.info(f"📊 Document 1 kvalita: {doc1_quality}")
+        if doc1_quality and 'valid_fields' in doc1_quality:
+            logger.info(f"📊 Document 1 kvalita: {doc1_quality['valid_fields']}/{doc1_quality['total_fields']} polí ({doc1_quality['success_rate']:.1f}%)")
+            if doc1_quality['missing_critical']:
+                logger.warning(f"⚠️ Document 1 chybí kritická pole: {', '.join(doc1_quality['missing_critical'])}")
+        else:
+            logger.error(f"❌ Document 1 kvalita je None nebo neplatná: {doc1_quality}")
+        
+        if doc1_quality:
+            self.document_stats['doc1_results'].append(doc1_quality)
+        
+        # 5. Document 3: Results s moved variables (Opus) - příloha jen když na ni ukazuje pre-scan
         logger.info("\n📋 Document 3: Results + Parameters (Opus)")
-        time.sleep(1)
-        system_prompt, user_prompt = self.create_optimized_prompts(pdf_content, "results")
-        results3 = self.analyze_with_fallback(system_prompt, user_prompt, "results")
+        include_appendix = self._log_appendix_decision(pdf_content, pre_scan_result.get('locations'))
+        system_prompt, user_prompt = self.create_optimized_prompts(pdf_content, "results", include_appendix)
+        results3 = None
+        if self.local_tables and self.output_mode == "tsv":
+            grids = self.results_grids(pdf_content, include_appendix)
+            if grids:
+                results3 = self.analyze_results_from_grids(system_prompt, user_prompt, grids)
+        if results3 is None:
+            table_groups = self.table_groups(pdf_content, include_appendix) if self.fan_out_tables else []
+            if table_groups:
+                results3 = self.analyze_results_fan_out(pdf_content, table_groups, include_appendix)
+            else:
+                results3 = self.analyze_with_fallback(system_prompt, user_prompt, "results")
         
         # Zjistíme kolik výsledků Document 3 skutečně extrahoval
         actual_results = 0
@@ -1432,7 +2307,7 @@ class OptimizedPDFAnalyzer:
             # Filtrujeme prázdné řádky
             valid_results = []
             for row in results3['table_rows']:
-                if len(row) > 40 and row[40] != 'NA':  # Results_Inflation není NA
+                if len(row) > 40 and row[40] not in ('NA', None):  # Results_Inflation není NA
                     valid_results.append(row)
             actual_results = len(valid_results)
             results3['table_rows'] = valid_results  # Aktualizujeme na platné řádky
@@ -1460,8 +2335,16 @@ class OptimizedPDFAnalyzer:
         else:
             logger.info(f"✅ SHODA: Document 0 i Document 3 shodně {actual_results} výsledků")
         
-        # Uložíme pro debugging
+        # Uložíme pro debugging (doc0_expected a doc3_actual musí jít párově)
         if doc3_quality:
+            self.document_stats['doc0_expected'].append({
+                'file': doc_name,
+                'count': expected_results,
+                'source': pre_scan_result.get('source', 'api'),
+                'local_count': local_scan.count,
+                'local_confidence': local_scan.confidence,
+                'api_count': pre_scan_result['count'] if pre_scan_result.get('source') == 'api' else None,
+            })
             self.document_stats['doc3_actual'].append({
                 'file': doc_name,
                 'count': actual_results,
@@ -1472,6 +2355,11 @@ class OptimizedPDFAnalyzer:
             
             self.document_stats['doc3_results'].append(doc3_quality)
         
+        # Cílené doplnění lokací, kde Document 3 našel méně výsledků než pre-scan
+        if pre_scan_result.get('locations') and 0 < actual_results < expected_results:
+            results3 = self.reconcile_results(pdf_content, system_prompt, results3,
+                                              pre_scan_result['locations'])
+        
         # Pokud results3 obsahuje error, zkusíme jednodušší přístup
         if 'error' in results3:
             logger.warning("⚠️ Zkouším alternativní extrakci výsledků")
@@ -1480,13 +2368,14 @@ class OptimizedPDFAnalyzer:
         
         # 6. Sloučit výsledky s novou strukturou
         df = self.merge_results_new_structure(results1, results2, results3, 
-                                            self.current_study_id, expected_results)
+                                            study_id, expected_results)
         
         # 7. Post-processing a validace
         df = self.post_process_dataframe(df)
+        self.verify_evidence(df, pdf_content, doc_name)
         
         # 8. Pokud stále chybí výsledky, zkusíme manuální extrakci
-        if df['Results_Inflation'].eq('NA').all():
+        if df['Results_Inflation'].isna().all():
             logger.warning("⚠️ Žádné inflační výsledky, zkouším manuální extrakci")
             manual_results = self._extract_results_manually(pdf_content)
             if manual_results:
@@ -1494,9 +2383,184 @@ class OptimizedPDFAnalyzer:
         
         return df
     
+    def _log_appendix_decision(self, pdf_content: Dict, locations: Optional[Dict[str, int]]) -> bool:
+        """Rozhodne, zda Document 3 dostane přílohu, a zapíše to do statistik"""
+        if not pdf_content.get('appendix_page'):
+            return False
+        targets = self.appendix_locations(pdf_content, locations)
+        if targets:
+            logger.info(f"📎 Příloha přidána do Document 3 (pre-scan: {', '.join(targets)})")
+            self.extraction_stats['appendix_included'] += 1
+            return True
+        tokens = pdf_content.get('text_stats', {}).get('appendix_tokens', 0)
+        logger.info(f"📎 Příloha vynechána (~{tokens:,} tokenů), pre-scan na ni neukazuje")
+        self.extraction_stats['appendix_skipped'] += 1
+        self.extraction_stats['appendix_tokens_skipped'] += tokens
+        return False
+    
+    def pre_scan(self, pdf_content: Dict):
+        """Document 0: lokální odhad, API pre-scan jen při nízké jistotě; vrací (výsledek, lokální odhad)"""
+        local = local_pre_scan(pdf_content.get('pages') or [])
+        if local.count and local.confidence >= self.pre_scan_confidence:
+            logger.info(f"\n🔍 Document 0: lokální pre-scan - {local.count} výsledků "
+                        f"(jistota {local.confidence:.2f}), API volání přeskočeno")
+            self.extraction_stats['pre_scan_local'] += 1
+            return local.to_result(), local
+        
+        logger.info(f"\n🔍 Document 0: Pre-scan (Sonnet) - lokální jistota {local.confidence:.2f} je nízká")
+        system_prompt, user_prompt = self.create_optimized_prompts(pdf_content, "pre_scan")
+        result = self.analyze_with_fallback(system_prompt, user_prompt, "pre_scan")
+        self.extraction_stats['pre_scan_api'] += 1
+        if 'count' in result:
+            result['source'] = 'api'
+            logger.info(f"📊 Pre-scan: lokálně {local.count} (jistota {local.confidence:.2f}) "
+                        f"vs API {result['count']} {local.signals}")
+        elif local.count:
+            logger.warning(f"⚠️ API pre-scan bez počtu, použiji lokální odhad {local.count}")
+            result = local.to_result()
+        return result, local
+    
+    def reconcile_results(self, pdf_content: Dict, system_prompt: List[Dict], results3: Dict[str, Any],
+                          locations: Dict[str, int]) -> Dict[str, Any]:
+        """Porovná počty po lokacích s Results_Table a malými dotazy doplní jen chybějící výsledky"""
+        rows = results3['table_rows']
+        found = defaultdict(list)
+        for row in rows:
+            found[location_key(str(row[39]))].append(row)
+        
+        missing = []
+        for location, expected in locations.items():
+            extracted = found.get(location_key(location), [])
+            if expected > len(extracted):
+                missing.append((location, expected, extracted))
+        if not missing:
+            return results3
+        
+        missing.sort(key=lambda item: len(item[2]) - item[1])   # největší mezery první
+        logger.info(f"🧩 Reconciliation: chybí výsledky v {len(missing)} lokacích "
+                    f"({', '.join(f'{loc} {len(ext)}/{exp}' for loc, exp, ext in missing)})")
+        
+        # Lokace mimo text v cachovaném promptu Document 3 (typicky příloha) hledáme ve stranách
+        # vybraných indexem, bez zásahu v celém článku
+        results_text = system_prompt[-1]['text'].lower()
+        full_prompt = None
+        header = '\t'.join(STAGE_COLUMNS["results"])
+        recovered = []
+        seen = {result_key(row) for row in rows}
+        for location, expected, extracted in missing[:MAX_RECONCILE_LOCATIONS]:
+            listing = '\n'.join(f"- {row[40]} ({row[41]})" for row in extracted) or "(none)"
+            prompt = RECONCILE_PROMPT.format(location=location, expected=expected, found=len(extracted),
+                                             extracted=listing, header=header)
+            target = system_prompt
+            if location.lower() not in results_text:
+                target = self._location_prompt(pdf_content, location)
+                if target is None:
+                    full_prompt = full_prompt or self._system_prompt(pdf_content['full_text'])
+                    target = full_prompt
+            
+            self.extraction_stats['reconcile_requests'] += 1
+            result = self.analyze_with_fallback(target, prompt, "results")
+            # Bereme jen řádky z chybějící lokace, které už ve výsledcích nejsou
+            # (model často zopakuje řádky z jiné tabulky)
+            new_rows = []
+            for row in result.get('table_rows') or []:
+                if len(row) <= 40 or row[40] in ('NA', None):
+                    continue
+                key = result_key(row)
+                if location_key(str(row[39])) != location_key(location) or key in seen:
+                    continue
+                seen.add(key)
+                new_rows.append(row)
+            recovered.extend(new_rows[:expected - len(extracted)])
+        
+        if not recovered:
+            return results3
+        
+        # Doplněné řádky pokračují v číslování IdEstimate
+        ids = [int(row[1]) for row in rows if str(row[1]).strip().isdigit()]
+        next_id = max(ids, default=len(rows)) + 1
+        for offset, row in enumerate(recovered):
+            row = list(row)
+            row[1] = str(next_id + offset)
+            rows.append(row)
+        self.extraction_stats['reconcile_recovered'] += len(recovered)
+        logger.info(f"🧩 Reconciliation doplnila {len(recovered)} výsledků")
+        return {'table_rows': rows}
+    
+    def _location_prompt(self, pdf_content: Dict, location: str) -> Optional[List[Dict]]:
+        """System prompt jen se stranami, kde index najde lokaci ("Table A.1", "Figure 2")"""
+        queries = {phrase_query(location), phrase_query(location_key(location))} - {''}
+        pages = self.retrieve_pages(pdf_content, ' OR '.join(sorted(queries)))
+        if not pages:
+            return None
+        self.extraction_stats['reconcile_retrieved'] += 1
+        logger.info(f"🔎 {location}: kontext ze stran {', '.join(map(str, pages))} místo celého článku")
+        return self._system_prompt('\n\n'.join(f"[Page {page}]\n{pdf_content['pages'][page - 1]}"
+                                                for page in pages))
+    
+    def recode_study(self, pdf_content: Dict, rows: List[Dict[str, Any]], column: str,
+                     instruction: str) -> List[Optional[str]]:
+        """Nová hodnota jednoho sloupce pro existující řádky studie (None = model ji nevrátil)
+        
+        `rows` jsou řádky studie v exportní podobě. Sloupce Document 1 a 2 platí pro celou
+        studii (jeden řádek odpovědi), sloupce Document 3 se kódují po IdEstimate.
+        """
+        stage = column_stage(column)
+        per_estimate = stage == "results"
+        shown = RECODE_ROW_COLUMNS + ([column] if column not in RECODE_ROW_COLUMNS else [])
+        if per_estimate:
+            listing = '\n'.join(['\t'.join(shown)] + ['\t'.join(str(row.get(c, 'NA')) for c in shown)
+                                                     for row in rows])
+            header = f"IdEstimate\t{column}"
+            scope = f"Exactly one row per existing IdEstimate ({len(rows)} rows), in the same order"
+        else:
+            listing = f"{column} (study-level, the same in all {len(rows)} rows): {rows[0].get(column, 'NA')}"
+            header = f"Idstudy\t{column}"
+            scope = "Exactly ONE data row - the column describes the whole study"
+        
+        prompt = RECODE_PROMPT.format(column=column, study_id=rows[0].get('Idstudy'), instruction=instruction.strip(),
+                                      rows=listing, scope=scope, header=header)
+        params = {
+            "model": self.model_config.get(stage, self.model_config["fallback"]),
+            "max_tokens": 4000,
+            "temperature": 0.1,
+            "system": self._recode_context(pdf_content, column, rows, stage),
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        with self._lock:
+            self.extraction_stats['recode_requests'] += 1
+        try:
+            parsed = parse_tsv(self._response_text(self._create_message(params)), META_ANALYSIS_COLUMNS)
+        except Exception as e:
+            logger.error(f"❌ Překódování {column} (Idstudy {rows[0].get('Idstudy')}) selhalo: {e}")
+            return [None] * len(rows)
+        
+        index = COLUMN_INDEX[column]
+        if not per_estimate:
+            value = parsed.rows[0][index] if parsed.rows else None
+            return [value] * len(rows)
+        answers = {str(row[1]).strip(): row[index] for row in parsed.rows}
+        return [answers.get(str(row.get('IdEstimate')).strip()) for row in rows]
+    
+    def _recode_context(self, pdf_content: Dict, column: str, rows: List[Dict[str, Any]],
+                        stage: str) -> List[Dict]:
+        """Kontext překódování: strany z indexu k sloupci a lokacím výsledků, jinak kontext původní fáze"""
+        if stage != "metadata":
+            queries = {phrase_query(column.replace('_', ' '))}
+            if stage == "results":
+                queries |= {phrase_query(location_key(str(row.get('Results_Table')))) for row in rows
+                            if row.get('Results_Table') not in (None, 'NA')}
+            pages = self.retrieve_pages(pdf_content, ' OR '.join(sorted(queries - {''})), RECODE_PAGES)
+            if pages:
+                return self._system_prompt('\n\n'.join(f"[Page {page}]\n{pdf_content['pages'][page - 1]}"
+                                                        for page in pages))
+        return self.create_optimized_prompts(pdf_content, stage)[0]
+    
     def _create_simplified_results_prompt(self, pdf_content: Dict) -> str:
         """Vytvoří zjednodušený prompt pro extrakci výsledků"""
-        return """
+        columns = STAGE_COLUMNS["results"]
+        header = '\t'.join(columns)
+        return f"""
 Extract ONLY inflation results from the PDF. Focus on:
 1. Find ALL tables with inflation values (π, pi, inflation rate)
 2. Extract the numerical inflation values
@@ -1505,7 +2569,7 @@ Extract ONLY inflation results from the PDF. Focus on:
 5. Note if prices are flexible/sticky for each result
 6. Note if ZLB applies for each result
 
-Create a simple table with columns:
+Most important columns:
 - IdEstimate (1, 2, 3...)
 - Results_Table (e.g., "Table 1")
 - Results_Inflation (the numerical value)
@@ -1513,8 +2577,11 @@ Create a simple table with columns:
 - Zero_Lower_Bound (1 if ZLB mentioned, 0 if not)
 - Results_Inflation_Assumption (brief description)
 
-Fill all 47 columns but focus mainly on extracting the inflation values and per-result assumptions.
-Use NA for any missing values.
+Generate a table with ONLY the {len(columns)} columns listed below, in this order, and no prose.
+Use tab-separated format and include a header row with exactly these column names:
+{header}
+
+Focus mainly on the inflation values and per-result assumptions; use NA for any missing values.
 """
     
     def merge_results_new_structure(self, results1: Dict, results2: Dict, results3: Dict, 
@@ -1528,96 +2595,51 @@ Use NA for any missing values.
         
         logger.info(f"📊 Slučuji výsledky: {num_rows} inflačních odhadů")
         
-        # Vytvoříme DataFrame
-        df = pd.DataFrame(index=range(num_rows), columns=META_ANALYSIS_COLUMNS)
-        df.fillna('NA', inplace=True)
-        
-        # Mapování pro Document 1 (metadata)
-        doc1_mapping = {
-            0: 'Idstudy', 2: 'Author', 3: 'Author_Affiliation', 
-            4: 'DOI', 5: 'Journal_Name', 6: 'Num_Citations',
-            7: 'Year', 8: 'Base_Model_Type', 23: 'Country', 
-            46: 'Impact_Factor'
-        }
-        
-        # Mapování pro Document 2 (structure - bez moved variables)
-        doc2_mapping = {
-            9: 'Augmented_base_model', 10: 'Augmentation_Description',
-            11: 'Ramsey_Rule', 12: 'HH_Included', 13: 'Firms_Included',
-            14: 'Banks_Included', 15: 'Government_Included',
-            16: 'HH_Maximization_Type', 17: 'HH_Maximized_Vars',
-            18: 'Producer_Type', 19: 'Producer_Assumption',
-            20: 'Other_Agent_Included', 21: 'Other_Agent_Assumptions',
-            22: 'Empirical_Research'
-        }
+        # Řádky skládáme v poli a DataFrame vytvoříme až na konci jednou
+        grid = np.full((num_rows, len(META_ANALYSIS_COLUMNS)), 'NA', dtype=object)
         
-        # Mapování pro Document 3 (results + moved variables)
-        doc3_mapping = {
-            1: 'IdEstimate', 
-            24: 'Flexible_Price_Assumption',  # MOVED FROM DOC2
-            25: 'Exogenous_Inflation',        # MOVED FROM DOC2
-            26: 'Households_discount_factor',
-            27: 'Consumption_curvature_parameter', 28: 'Disutility_of_labor',
-            29: 'Inverse_of_labor_supply_elasticity', 30: 'Money_curvature_parameter',
-            31: 'Loan_to_value_ratio', 32: 'Labor_share_of_output',
-            33: 'Depositors_discount_factor', 34: 'Price_adjustment_cost',
-            35: 'Elasticity_of_substitution_between_goods',
-            36: 'AR1_coefficient_of_TFP', 37: 'Std_dev_to_TFP_shock',
-            38: 'Zero_Lower_Bound',           # MOVED FROM DOC2
-            39: 'Results_Table',
-            40: 'Results_Inflation', 41: 'Results_Inflation_Assumption',
-            42: 'Preferred_Estimate', 43: 'Reason_for_Preferred',
-            44: 'Std_Dev_Inflation', 45: 'Interest_Rate'
-        }
-        
-        # Aplikujeme mapování s validací
+        # Document 1 a 2 platí pro celou studii (broadcast prvního řádku)
         if results1 is not None and 'table_rows' in results1 and results1['table_rows']:
-            self._apply_mapping(df, results1['table_rows'][0], doc1_mapping, broadcast=True)
+            self._apply_mapping(grid, [results1['table_rows'][0]], DOC1_MAPPING, broadcast=True)
         
         if results2 is not None and 'table_rows' in results2 and results2['table_rows']:
-            self._apply_mapping(df, results2['table_rows'][0], doc2_mapping, broadcast=True)
+            self._apply_mapping(grid, [results2['table_rows'][0]], DOC2_MAPPING, broadcast=True)
         
+        # Document 3 má řádek na každý výsledek
         if results3 is not None and 'table_rows' in results3 and results3['table_rows']:
-            for row_idx, row_data in enumerate(results3['table_rows']):
-                if row_idx < num_rows:
-                    self._apply_mapping(df, row_data, doc3_mapping, row_idx=row_idx)
+            self._apply_mapping(grid, results3['table_rows'][:num_rows], DOC3_MAPPING)
         
         # Finální úpravy
-        df['Idstudy'] = str(study_id)
-        if df['IdEstimate'].eq('NA').all():
-            df['IdEstimate'] = range(1, num_rows + 1)
+        grid[:, COLUMN_INDEX['Idstudy']] = study_id
+        if (grid[:, COLUMN_INDEX['IdEstimate']] == 'NA').all():
+            grid[:, COLUMN_INDEX['IdEstimate']] = range(1, num_rows + 1)
         
-        return df
+        return frame_from_grid(grid)
     
-    def _apply_mapping(self, df: pd.DataFrame, row_data: List, mapping: Dict, 
-                      broadcast: bool = False, row_idx: int = None):
-        """Aplikuje mapování s validací"""
-        if row_data is None or not isinstance(row_data, list):
+    def _apply_mapping(self, grid, rows: List, mapping: Dict[int, str], broadcast: bool = False):
+        """Zvaliduje namapované sloupce najednou (vektorově) a zapíše je do pole řádků"""
+        rows = [row if isinstance(row, list) else [] for row in rows]
+        if not rows or len(grid) == 0:
             return
-            
-        for idx, col_name in mapping.items():
-            if idx < len(row_data) and row_data[idx] not in ['NA', '', None]:
-                value = str(row_data[idx]).strip()
-                
-                # Validace hodnot
-                if col_name in ['Year', 'Num_Citations']:
-                    # Musí být číslo
-                    if not value.isdigit():
-                        continue
-                
-                if col_name in ['HH_Included', 'Firms_Included', 'Banks_Included', 
-                               'Government_Included', 'Empirical_Research', 
-                               'Flexible_Price_Assumption', 'Exogenous_Inflation',
-                               'Zero_Lower_Bound', 'Preferred_Estimate']:
-                    # Musí být 0 nebo 1
-                    if value not in ['0', '1']:
-                        continue
-                
-                # Aplikuj hodnotu
-                if broadcast:
-                    df[col_name] = value
-                elif row_idx is not None:
-                    df.loc[row_idx, col_name] = value
+        
+        sources = list(mapping)
+        width = max(sources) + 1
+        raw = np.array([row[:width] + [None] * (width - len(row[:width])) for row in rows],
+                       dtype=object)[:, sources]
+        
+        # Validace po sloupcích: chybějící hodnoty, čísla a 0/1 příznaky
+        valid = ~(pd.isna(raw) | np.isin(raw, ['NA', '']))
+        values = np.char.strip(raw.astype(str))
+        for j, col_name in enumerate(mapping.values()):
+            if col_name in DIGIT_COLUMNS:
+                valid[:, j] &= np.char.isdigit(values[:, j])
+            elif col_name in BINARY_COLUMNS:
+                valid[:, j] &= np.isin(values[:, j], ['0', '1'])
+        
+        # Broadcast rozkopíruje jediný řádek do všech řádků studie
+        target_rows = slice(None) if broadcast else slice(0, len(rows))
+        targets = [COLUMN_INDEX[col_name] for col_name in mapping.values()]
+        grid[target_rows, targets] = np.where(valid, values.astype(object), grid[target_rows, targets])
     
     def _extract_results_manually(self, pdf_content: Dict) -> List[Dict]:
         """Pokusí se manuálně extrahovat inflační výsledky z PDF"""
@@ -1667,35 +2689,22 @@ Use NA for any missing values.
         # Vytvoříme nový DataFrame s manuálními výsledky
         new_rows = []
         for i, result in enumerate(manual_results):
-            row = df.iloc[0].copy() if len(df) > 0 else pd.Series(['NA'] * len(META_ANALYSIS_COLUMNS), index=META_ANALYSIS_COLUMNS)
-            row['IdEstimate'] = str(i + 1)
+            row = df.iloc[0].to_dict() if len(df) > 0 else {}
+            row['IdEstimate'] = i + 1
             row['Results_Table'] = result['table']
-            row['Results_Inflation'] = str(result['value'])
+            row['Results_Inflation'] = result['value']
             row['Results_Inflation_Assumption'] = result['assumption']
             new_rows.append(row)
         
         if new_rows:
-            return pd.DataFrame(new_rows)
+            return apply_schema(pd.DataFrame(new_rows))
         return df
     
     def post_process_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """Post-processing a validace dat"""
         
-        # Konverze datových typů
-        numeric_columns = [
-            'Households_discount_factor', 'Consumption_curvature_parameter',
-            'Disutility_of_labor', 'Inverse_of_labor_supply_elasticity',
-            'Money_curvature_parameter', 'Loan_to_value_ratio',
-            'Labor_share_of_output', 'Depositors_discount_factor',
-            'Price_adjustment_cost', 'Elasticity_of_substitution_between_goods',
-            'AR1_coefficient_of_TFP', 'Std_dev_to_TFP_shock',
-            'Results_Inflation', 'Std_Dev_Inflation', 'Interest_Rate'
-        ]
-        
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-                df[col] = df[col].fillna('NA')
+        # Konverze datových typů (chybějící hodnoty jsou pd.NA, 'NA' až při exportu)
+        df = apply_schema(df)
         
         # Validace rozsahů
         validations = {
@@ -1707,72 +2716,165 @@ Use NA for any missing values.
         
         for col, (min_val, max_val) in validations.items():
             if col in df.columns:
-                mask = pd.to_numeric(df[col], errors='coerce').between(min_val, max_val)
-                invalid_count = (~mask).sum()
+                invalid_count = (~df[col].between(min_val, max_val)).sum()
                 if invalid_count > 0:
                     logger.warning(f"⚠️ {col}: {invalid_count} hodnot mimo očekávaný rozsah {min_val}-{max_val}")
         
         return df
     
-    def process_folder_optimized(self, folder_path: str, max_workers: int = 2) -> pd.DataFrame:
-        """Zpracuje složku s optimalizovaným workflow"""
+    def verify_evidence(self, df: pd.DataFrame, pdf_content: Dict, doc_name: str) -> List[Dict[str, Any]]:
+        """Ověří číselné hodnoty proti indexu čísel v textu článku (bez API volání)"""
+        evidence = pdf_content.get('evidence')
+        if evidence is None:
+            # Obsah bez indexu (prázdná extrakce); PaperDocument si ho staví sám
+            evidence = pdf_content['evidence'] = EvidenceIndex.from_pages(pdf_content.get('pages') or [])
+        
+        records = []
+        counts = defaultdict(int)
+        for column in FLOAT_COLUMNS:
+            if column not in df.columns:
+                continue
+            for row_idx in df.index[df[column].notna()]:
+                value = df.at[row_idx, column]
+                flag, found = evidence.lookup(value)
+                counts[flag] += 1
+                records.append({
+                    'File': doc_name,
+                    'Idstudy': df.at[row_idx, 'Idstudy'],
+                    'IdEstimate': df.at[row_idx, 'IdEstimate'],
+                    'Column': column,
+                    'Value': float(value),
+                    'Evidence': flag,
+                    'Page': found.page if found else None,
+                    'Line': found.line if found else None,
+                    'Source_Text': found.raw if found else None,
+                    'Context': found.context if found else None,
+                })
+        
+        with self._lock:
+            self.document_stats['evidence'].extend(records)
+            for flag, count in counts.items():
+                self.extraction_stats[f"evidence_{flag}"] += count
+        if counts.get(NOT_FOUND):
+            logger.warning(f"🔎 {doc_name}: {counts[NOT_FOUND]} z {len(records)} hodnot nenalezeno v textu "
+                           f"(přesně {counts.get(VERBATIM, 0)}, po přepočtu {counts.get(SCALED, 0)})")
+        return records
+    
+    def process_folder_optimized(self, folder_path: str, max_workers: int = 2,
+                                 extract_workers: int = 0,
+                                 sink: Optional[ResultsSink] = None) -> Optional[pd.DataFrame]:
+        """Zpracuje složku s optimalizovaným workflow
+        
+        extract_workers > 0 zapne pipeline: procesy předextrahují PDF do cache
+        a max_workers vláken současně volá API nad připravenými dokumenty.
+        Se `sink` se řádky každé studie hned zapisují na disk a vrací se None,
+        jinak se vrátí spojený DataFrame.
+        """
         
         pdf_files = list(Path(folder_path).glob("*.pdf"))
         
         if not pdf_files:
             logger.warning("Nebyly nalezeny žádné PDF soubory")
-            return pd.DataFrame(columns=META_ANALYSIS_COLUMNS)
+            return empty_frame() if sink is None else None
         
         logger.info(f"📚 Nalezeno {len(pdf_files)} PDF souborů")
         
+        # Kopie a verze téže studie se odhalí před prvním API voláním
+        if self.dedup != "off":
+            pdf_files = self.skip_duplicates(pdf_files, extract_workers)
+        
         # Inicializace progress trackingu
         self.extraction_stats['total_files'] = len(pdf_files)
         
-        all_results = []
-        
-        # Sekvenční zpracování (paralelní by mohlo překročit rate limits)
-        for idx, pdf_path in enumerate(pdf_files, 1):
-            print(f"\n{'='*80}")
-            print(f"📄 Zpracovávám {idx}/{len(pdf_files)}: {pdf_path.name}")
-            print(f"💰 Dosavadní náklady: ${self.cost_tracker.calculate_cost():.2f}")
-            print(f"{'='*80}")
-            
-            try:
-                # Rate limiting
-                if idx > 1:
-                    time.sleep(3)
+        # Seznam v paměti, nebo průběžné úložiště na disku (obojí má append)
+        all_results = [] if sink is None else sink
+        
+        if extract_workers > 0:
+            from meta_pipeline import run_pipeline
+            done = 0
+            for pdf_path, df_study in run_pipeline(self, pdf_files, extract_workers=extract_workers,
+                                                   api_workers=max_workers):
+                self._record_study_result(pdf_path, df_study, all_results)
+                done += 1
+                self.check_budget(done, len(pdf_files))
+                if self.is_paused():
+                    print(f"⏸️ Rozpočet vyčerpán - zpracování pozastaveno po {done}/{len(pdf_files)} článcích")
+                    break
+        else:
+            # Sekvenční zpracování (rate limit hlídá RequestRateLimiter)
+            projected = None
+            for idx, pdf_path in enumerate(pdf_files, 1):
+                if self.is_paused():
+                    print(f"⏸️ Rozpočet vyčerpán - zpracování pozastaveno před {idx}/{len(pdf_files)}")
+                    break
                 
-                # Analýza
-                df_study = self.analyze_pdf_optimized(str(pdf_path))
+                print(f"\n{'='*80}")
+                print(f"📄 Zpracovávám {idx}/{len(pdf_files)}: {pdf_path.name}")
+                print(f"💰 Dosavadní náklady: ${self.cost_tracker.calculate_cost():.2f}"
+                      + (f" (projekce ${projected:.2f} / limit ${self.budget_governor.cap_usd:.2f})"
+                         if projected is not None else ""))
+                print(f"{'='*80}")
                 
-                if not df_study.empty and not (len(df_study) == 1 and all(df_study.iloc[0] == 'NA')):
-                    all_results.append(df_study)
-                    self.extraction_stats['successful'] += 1
+                try:
+                    # Analýza
+                    df_study = self.analyze_pdf_optimized(str(pdf_path))
+                    self._record_study_result(pdf_path, df_study, all_results)
+                    self.current_study_id += 1
                     
-                    # Zobrazit krátkého summary pro tento soubor
-                    inflation_results = df_study[df_study['Results_Inflation'] != 'NA']
-                    print(f"✅ Úspěch: {len(inflation_results)} inflačních výsledků extrahováno")
-                else:
-                    self.extraction_stats['failed'] += 1
-                    print(f"❌ Selhání: žádné validní inflační výsledky")
+                except Exception as e:
+                    logger.error(f"❌ Chyba při zpracování {pdf_path.name}: {e}")
+                    self._record_study_result(pdf_path, None, all_results)
+                    print(f"❌ Kritická chyba: {e}")
                 
-                self.current_study_id += 1
-                
-            except Exception as e:
-                logger.error(f"❌ Chyba při zpracování {pdf_path.name}: {e}")
-                self.extraction_stats['failed'] += 1
-                print(f"❌ Kritická chyba: {e}")
-                continue
+                projected = self.check_budget(idx, len(pdf_files))
         
         # Finální statistiky
         self._print_final_statistics()
         
-        # Spojení výsledků
-        if all_results:
-            final_df = pd.concat(all_results, ignore_index=True)
-            return final_df
-        else:
-            return pd.DataFrame(columns=META_ANALYSIS_COLUMNS)
+        # Spojení výsledků (úložiště už je na disku)
+        return concat_frames(all_results) if sink is None else None
+    
+    def detect_duplicates(self, pdf_files: List[Path], extract_workers: int = 0) -> List[DuplicateLink]:
+        """Extrahuje celou složku do cache (procesy, pokud extract_workers > 0) a najde kopie a verze"""
+        if extract_workers > 0:
+            from meta_pipeline import extract_pool, prefetch_pdf
+            with extract_pool(self.export_folder, extract_workers) as pool:
+                list(pool.map(prefetch_pdf, map(str, pdf_files)))
+        fingerprints = [fingerprint(Path(pdf_path).name, self.extract_pdf_content_enhanced(str(pdf_path)))
+                        for pdf_path in pdf_files]
+        return find_duplicates(fingerprints)
+    
+    def skip_duplicates(self, pdf_files: List[Path], extract_workers: int = 0) -> List[Path]:
+        """Vyřadí ze zpracování kopie (režim link) nebo kopie i jiné verze (režim skip)"""
+        self.duplicates = self.detect_duplicates(pdf_files, extract_workers)
+        if not self.duplicates:
+            return pdf_files
+        skipped = {link.file for link in self.duplicates
+                   if self.dedup == "skip" or link.relation == "duplicate"}
+        for link in self.duplicates:
+            action = "přeskočeno" if link.file in skipped else "zpracuje se, propojeno"
+            logger.info(f"🪞 {link.file} = {link.relation} {link.canonical} "
+                        f"({link.reason}, podobnost {link.similarity:.2f}) - {action}")
+        self.extraction_stats['dedup_skipped'] += len(skipped)
+        self.extraction_stats['dedup_linked'] += len(self.duplicates) - len(skipped)
+        print(f"🪞 Duplicity: {len(self.duplicates)} kopií/verzí, {len(skipped)} PDF se nebude platit")
+        return [pdf_path for pdf_path in pdf_files if Path(pdf_path).name not in skipped]
+    
+    def _record_study_result(self, pdf_path: Path, df_study: Optional[pd.DataFrame], all_results) -> bool:
+        """Zaznamená výsledek jedné studie do statistik a seznamu výsledků (nebo ResultsSink)"""
+        if df_study is not None and not df_study.empty and not (len(df_study) == 1 and df_study.iloc[0].isna().all()):
+            all_results.append(df_study)
+            self.extraction_stats['successful'] += 1
+            
+            # Zobrazit krátkého summary pro tento soubor
+            inflation_results = df_study[df_study['Results_Inflation'].notna()]
+            print(f"✅ {Path(pdf_path).name}: {len(inflation_results)} inflačních výsledků extrahováno")
+            return True
+        
+        self.extraction_stats['failed'] += 1
+        if df_study is not None:
+            print(f"❌ {Path(pdf_path).name}: žádné validní inflační výsledky")
+        return False
     
     def _print_final_statistics(self):
         """Zobrazí finální statistiky včetně detailního debuggingu všech dokumentů"""
@@ -1785,6 +2887,13 @@ Use NA for any missing values.
         for key, value in self.extraction_stats.items():
             print(f"  • {key}: {value}")
         
+        # Lokální metadata místo Document 1
+        savings = self.metadata_savings()
+        if savings['skipped'] or savings['reduced']:
+            print(f"\n📋 Lokální metadata: Document 1 přeskočen {savings['skipped']}×, zúžen {savings['reduced']}×, "
+                  f"celý {savings['full']}× - ušetřeno {savings['doc1_avoided_pct']:.1f} % volání Document 1 "
+                  f"({savings['api_avoided_pct']:.1f} % všech API volání)")
+        
         # Document 0 vs Document 3 analýza
         if self.document_stats['doc0_expected'] and self.document_stats['doc3_actual']:
             print(f"\n🔍 Document 0 vs Document 3 analýza:")
@@ -1860,6 +2969,10 @@ Use NA for any missing values.
         print(f"  • Cache write tokens: {self.cost_tracker.cache_write_tokens:,}")
         print(f"  • Cache read tokens: {self.cost_tracker.cache_read_tokens:,}")
         print(f"  • Celkové náklady: ${cost:.2f}")
+        for model, usage in sorted(self.cost_tracker.model_usage.items()):
+            print(f"    - {model}: ${usage.calculate_cost(model):.2f}")
+        if self.budget_governor:
+            print(f"  • Rozpočet: ${self.budget_governor.cap_usd:.2f} (úroveň opatření {self.budget_governor.level})")
         
         if self.extraction_stats.get('successful', 0) > 0:
             cost_per_file = cost / self.extraction_stats['successful']
@@ -1895,7 +3008,7 @@ Use NA for any missing values.
     def _get_pdf_cache_key(self, pdf_path: str) -> str:
         """Generuje cache klíč pro PDF"""
         stat = os.stat(pdf_path)
-        key = f"{os.path.basename(pdf_path)}_{stat.st_size}_{stat.st_mtime}"
+        key = f"{os.path.basename(pdf_path)}_{stat.st_size}_{stat.st_mtime}_v{EXTRACTION_VERSION}"
         return hashlib.md5(key.encode()).hexdigest()
     
     def _load_from_cache(self, cache_key: str) -> Optional[Dict]:
@@ -1920,10 +3033,279 @@ Use NA for any missing values.
     
     def _create_empty_dataframe(self, study_id: int) -> pd.DataFrame:
         """Vytvoří prázdný DataFrame"""
-        empty_row = {col: 'NA' for col in META_ANALYSIS_COLUMNS}
-        empty_row['Idstudy'] = str(study_id)
-        empty_row['IdEstimate'] = '1'
-        return pd.DataFrame([empty_row])
+        return apply_schema(pd.DataFrame([{'Idstudy': study_id, 'IdEstimate': 1}]))
+
+
+def save_results(analyzer: OptimizedPDFAnalyzer, results, export_folder: str) -> str:
+    """Uloží výsledky do Excelu a debug CSV, vypíše dashboard a vrátí cestu k Excelu
+    
+    `results` je ResultsSink (řádky se čtou z disku po dávkách) nebo DataFrame.
+    """
+    # Uložení výsledků
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_path = os.path.join(export_folder, f"meta_analysis_v8_{timestamp}.csv")
+    if isinstance(results, ResultsSink):
+        sink = results
+    else:
+        # DataFrame v paměti: CSV úložiště je zároveň CSV záloha
+        sink = ResultsSink(csv_path, fmt="csv")
+        sink.append(results)
+    total_studies = len(sink.studies)
+    
+    # Excel s detaily a kompletním debuggingem (listy se sbírají a zapisují write_only)
+    excel_path = os.path.join(export_folder, f"meta_analysis_v8_{timestamp}.xlsx")
+    sheets = {}
+    # Základní statistiky
+    sheets['Statistics'] = pd.DataFrame([{
+        'Total Studies': total_studies,
+        'Total Estimates': len(sink),
+        'Total Cost': f"${analyzer.cost_tracker.calculate_cost():.2f}",
+        'Cost per Study': f"${analyzer.cost_tracker.calculate_cost() / max(total_studies, 1):.2f}",
+        'Success Rate': f"{analyzer.extraction_stats.get('successful', 0) / analyzer.extraction_stats.get('total_files', 1) * 100:.1f}%",
+        'API Calls Avoided (Local Metadata)': f"{analyzer.metadata_savings()['api_avoided_pct']:.1f}%"
+    }])
+    
+    # Document 0 vs Document 3 porovnání
+    if analyzer.document_stats['doc0_expected'] and analyzer.document_stats['doc3_actual']:
+        comparison_data = []
+        for i, (expected, actual) in enumerate(zip(analyzer.document_stats['doc0_expected'], 
+                                                 analyzer.document_stats['doc3_actual'])):
+            comparison_data.append({
+                'File': expected['file'],
+                'Doc0_Expected': expected['count'],
+                'Doc0_Source': expected.get('source'),
+                'Local_Count': expected.get('local_count'),
+                'Local_Confidence': expected.get('local_confidence'),
+                'API_Count': expected.get('api_count'),
+                'Doc3_Actual': actual['count'],
+                'Match': '✅' if actual['match'] else '❌',
+                'Difference': actual['count'] - expected['count'],
+                'Extraction_Rate': f"{(actual['count']/expected['count'])*100:.1f}%" if expected['count'] > 0 else "N/A"
+            })
+        
+        sheets['Doc0_vs_Doc3_Comparison'] = pd.DataFrame(comparison_data)
+    
+    # Idstudy -> PDF (podle něj překódování sloupce najde článek v cache)
+    if analyzer.study_ids:
+        sheets[STUDIES_SHEET] = studies_frame(analyzer.study_ids)
+    
+    # Úspora tokenů normalizací textu
+    if analyzer.document_stats['text_normalization']:
+        sheets['Text_Normalization'] = pd.DataFrame(analyzer.document_stats['text_normalization'])
+    
+    # Lokální metadata - které články obešly Document 1
+    if analyzer.document_stats['local_metadata']:
+        sheets['Local_Metadata'] = pd.DataFrame(analyzer.document_stats['local_metadata'])
+    
+    # Kopie a verze téže studie (Idstudy prázdné u přeskočených PDF)
+    if analyzer.duplicates:
+        sheets['Duplicates'] = pd.DataFrame([{
+            'File': link.file,
+            'Canonical': link.canonical,
+            'Relation': link.relation,
+            'Reason': link.reason,
+            'Similarity': link.similarity,
+            'Idstudy': analyzer.study_ids.get(link.file),
+            'Canonical_Idstudy': analyzer.study_ids.get(link.canonical),
+        } for link in analyzer.duplicates])
+    
+    # Ověření hodnot proti textu článku
+    if analyzer.document_stats['evidence']:
+        sheets['Evidence'] = pd.DataFrame(analyzer.document_stats['evidence'])
+    
+    # Debug sheety pro každý dokument
+    doc_debug_info = [
+        ('doc1_results', 'Document_1_Debug', 'Document 1 (Metadata)'),
+        ('doc2_results', 'Document_2_Debug', 'Document 2 (Structure)'),
+        ('doc3_results', 'Document_3_Debug', 'Document 3 (Results)')
+    ]
+    
+    for doc_key, sheet_name, doc_name in doc_debug_info:
+        if doc_key in analyzer.document_stats and analyzer.document_stats[doc_key]:
+            debug_data = []
+            for result in analyzer.document_stats[doc_key]:
+                debug_data.append({
+                    'File': result['file'],
+                    'Success_Rate': f"{result['success_rate']:.1f}%",
+                    'Valid_Fields': result['valid_fields'],
+                    'Total_Fields': result['total_fields'],
+                    'Error': '❌' if result['error'] else '✅',
+                    'Missing_Critical': ', '.join(result.get('missing_critical', [])),
+                    'Extracted_Fields': ', '.join(result.get('extracted_fields', [])[:10]),  # Max 10 pro čitelnost
+                    'Empty_Fields': ', '.join(result.get('empty_fields', [])[:10])
+                })
+            
+            sheets[sheet_name] = pd.DataFrame(debug_data)
+            
+        print(f"📊 {doc_name} debug uložen do sheet '{sheet_name}'")
+    
+    # Hlavní list se čte z úložiště po dávkách, paměť neroste s počtem studií
+    sink.write_excel(excel_path, sheets)
+    
+    # CSV backup (u DataFrame je jím přímo CSV úložiště)
+    if sink.path != Path(csv_path):
+        sink.write_csv(csv_path)
+    for results_path in {sink.path, Path(csv_path)}:
+        write_studies(results_path, analyzer.study_ids)
+    
+    # Debug CSV soubory pro všechny dokumenty
+    debug_csvs = []
+    
+    # Document 0 vs Document 3 porovnání
+    if analyzer.document_stats['doc0_expected'] and analyzer.document_stats['doc3_actual']:
+        debug_data = []
+        for expected, actual in zip(analyzer.document_stats['doc0_expected'], 
+                                  analyzer.document_stats['doc3_actual']):
+            debug_data.append({
+                'File': expected['file'],
+                'Doc0_Expected': expected['count'],
+                'Doc3_Actual': actual['count'],
+                'Match': actual['match'],
+                'Difference': actual['count'] - expected['count'],
+                'Extraction_Rate': (actual['count']/expected['count']) if expected['count'] > 0 else 0
+            })
+        
+        debug_df = pd.DataFrame(debug_data)
+        debug_csv_path = os.path.join(export_folder, f"doc0_vs_doc3_debug_{timestamp}.csv")
+        debug_df.to_csv(debug_csv_path, index=False, encoding='utf-8-sig')
+        debug_csvs.append(debug_csv_path)
+    
+    # Kompletní kvalita debug pro všechny dokumenty
+    all_quality_data = []
+    for doc_key, doc_name in [('doc1_results', 'Document_1'), ('doc2_results', 'Document_2'), ('doc3_results', 'Document_3')]:
+        if doc_key in analyzer.document_stats:
+            for result in analyzer.document_stats[doc_key]:
+                all_quality_data.append({
+                    'Document': doc_name,
+                    'File': result['file'],
+                    'Success_Rate': result['success_rate'],
+                    'Valid_Fields': result['valid_fields'],
+                    'Total_Fields': result['total_fields'],
+                    'Error': result['error'],
+                    'Missing_Critical_Count': len(result.get('missing_critical', [])),
+                    'Missing_Critical_Fields': '; '.join(result.get('missing_critical', [])),
+                    'Extracted_Fields_Count': len(result.get('extracted_fields', [])),
+                    'Empty_Fields_Count': len(result.get('empty_fields', []))
+                })
+    
+    if all_quality_data:
+        quality_df = pd.DataFrame(all_quality_data)
+        quality_csv_path = os.path.join(export_folder, f"all_documents_quality_{timestamp}.csv")
+        quality_df.to_csv(quality_csv_path, index=False, encoding='utf-8-sig')
+        debug_csvs.append(quality_csv_path)
+    
+    if debug_csvs:
+        print(f"🔍 Debug CSV soubory vytvořeny: {len(debug_csvs)} souborů")
+    
+    print(f"\n✅ Hlavní výsledky uloženy: {excel_path}")
+    
+    print("\n🎉 Zpracování dokončeno!")
+    print(f"💰 Celkové náklady: ${analyzer.cost_tracker.calculate_cost():.2f}")
+    
+    # Kompletní doporučení pro ladění
+    print(f"\n🔧 DEBUGGING DASHBOARD:")
+    print(f"{'='*50}")
+    
+    # Průměrné kvality jednotlivých dokumentů
+    doc_qualities = {}
+    for doc_key, doc_name in [('doc1_results', 'Document 1'), ('doc2_results', 'Document 2'), ('doc3_results', 'Document 3')]:
+        if doc_key in analyzer.document_stats and analyzer.document_stats[doc_key]:
+            results = analyzer.document_stats[doc_key]
+            avg_quality = sum(r['success_rate'] for r in results) / len(results)
+            error_rate = sum(1 for r in results if r['error']) / len(results) * 100
+            doc_qualities[doc_name] = {'quality': avg_quality, 'errors': error_rate}
+            
+            status = "🟢 OK" if avg_quality > 70 else "🟡 NEEDS WORK" if avg_quality > 50 else "🔴 CRITICAL"
+            print(f"{doc_name}: {avg_quality:.1f}% kvalita, {error_rate:.1f}% chyb {status}")
+    
+    # Document 0 vs 3 shoda
+    if analyzer.document_stats['doc0_expected'] and analyzer.document_stats['doc3_actual']:
+        matches = sum(1 for stat in analyzer.document_stats['doc3_actual'] if stat['match'])
+        total = len(analyzer.document_stats['doc3_actual'])
+        match_rate = (matches / total) * 100
+        
+        status = "🟢 OK" if match_rate > 80 else "🟡 NEEDS WORK" if match_rate > 60 else "🔴 CRITICAL"
+        print(f"Doc 0 vs 3: {match_rate:.1f}% shoda {status}")
+    
+    print(f"\n📁 Podrobné výsledky:")
+    print(f"  • Excel: {os.path.basename(excel_path)}")
+    print(f"  • Sheets: Meta-Analysis, Statistics, Doc0_vs_Doc3_Comparison")
+    print(f"  • Debug Sheets: Document_1_Debug, Document_2_Debug, Document_3_Debug")
+    print(f"  • CSV debug soubory: {len(debug_csvs) if 'debug_csvs' in locals() else 0}")
+    
+    print(f"\n🎯 PRIORITNÍ AKCE:")
+    priority_actions = []
+    
+    if 'Document 1' in doc_qualities and doc_qualities['Document 1']['quality'] < 70:
+        priority_actions.append("1. Vyladit Document 1 prompt (metadata extrakce)")
+    if 'Document 2' in doc_qualities and doc_qualities['Document 2']['quality'] < 60:
+        priority_actions.append("2. Vyladit Document 2 prompt (struktura modelu)")
+    if 'Document 3' in doc_qualities and doc_qualities['Document 3']['quality'] < 50:
+        priority_actions.append("3. Vyladit Document 3 prompt (výsledky/parametry)")
+    
+    if analyzer.document_stats.get('doc0_expected') and analyzer.document_stats.get('doc3_actual'):
+        mismatches = sum(1 for stat in analyzer.document_stats['doc3_actual'] if not stat['match'])
+        if mismatches > len(analyzer.document_stats['doc3_actual']) * 0.3:
+            priority_actions.append("4. Synchronizovat Document 0 a Document 3 prompty")
+    
+    if priority_actions:
+        for action in priority_actions:
+            print(f"  {action}")
+    else:
+        print("  🎉 Všechny dokumenty fungují dobře!")
+    
+    return excel_path
+
+
+def run_analysis(pdf_folder: str, export_folder: str, api_key: str,
+                 model_config: Optional[Dict[str, str]] = None,
+                 extract_workers: int = 0, api_workers: int = 1,
+                 budget_usd: Optional[float] = None, output_mode: str = "tsv",
+                 fan_out_tables: bool = False, local_tables: bool = False,
+                 pre_scan_confidence: float = PRE_SCAN_CONFIDENCE,
+                 results_format: str = "auto", dedup: str = "link",
+                 response_cache: bool = False) -> Optional[str]:
+    """Zpracuje složku PDF bez GUI a vrátí cestu k výslednému Excelu
+    
+    Řádky studií se průběžně zapisují do results_<čas>.parquet/.csv v exportní složce.
+    """
+    os.makedirs(export_folder, exist_ok=True)
+    
+    # Logging
+    log_file = os.path.join(export_folder, f"log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(file_handler)
+    
+    # Inicializace analyzátoru
+    analyzer = OptimizedPDFAnalyzer(api_key, export_folder, model_config=model_config,
+                                    budget_usd=budget_usd, output_mode=output_mode,
+                                    fan_out_tables=fan_out_tables, local_tables=local_tables,
+                                    pre_scan_confidence=pre_scan_confidence, dedup=dedup,
+                                    response_cache=response_cache)
+    
+    try:
+        # Zpracování
+        print("\n🚀 Spouštím zpracování s kompletním debug systémem...")
+        sink = ResultsSink(os.path.join(export_folder, f"results_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"),
+                           fmt=results_format)
+        logger.info(f"💾 Výsledky se průběžně ukládají do {sink.path}")
+        analyzer.process_folder_optimized(pdf_folder, max_workers=api_workers,
+                                          extract_workers=extract_workers, sink=sink)
+        
+        if sink.empty:
+            print("\n❌ Žádné výsledky k uložení")
+            return None
+        
+        return save_results(analyzer, sink, export_folder)
+        
+    except Exception as e:
+        logger.error(f"Kritická chyba: {e}")
+        print(f"❌ Chyba: {e}")
+        return None
+    finally:
+        logger.removeHandler(file_handler)
+        file_handler.close()
 
 
 def main():
@@ -1946,6 +3328,21 @@ def main():
     print("📦 Lokální cache pro opakované zpracování")
     print("✅ Validace a error recovery\n")
     
+    # Načtení konfigurace (config.py má přednost kvůli zpětné kompatibilitě)
+    try:
+        from config import CLAUDE_API_KEY
+    except ImportError:
+        CLAUDE_API_KEY = load_config().get("CLAUDE_API_KEY")
+    if not CLAUDE_API_KEY:
+        logger.error("❌ Chyba: Chybí CLAUDE_API_KEY!")
+        print("Vytvořte soubor config.py s:")
+        print("CLAUDE_API_KEY = 'your_api_key_here'")
+        print("nebo nastavte proměnnou prostředí CLAUDE_API_KEY (headless: python meta_cli.py run --help)")
+        sys.exit(1)
+    
+    import tkinter as tk
+    from tkinter import filedialog
+    
     # GUI pro výběr složek
     root = tk.Tk()
     root.withdraw()
@@ -1971,201 +3368,7 @@ def main():
     if not export_folder:
         export_folder = os.path.join(script_dir, "AI_export_v8_new_structure")
     
-    os.makedirs(export_folder, exist_ok=True)
-    
-    # Logging
-    log_file = os.path.join(export_folder, f"log_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(file_handler)
-    
-    # Inicializace analyzátoru
-    analyzer = OptimizedPDFAnalyzer(CLAUDE_API_KEY, export_folder)
-    
-    try:
-        # Zpracování
-        print("\n🚀 Spouštím zpracování s kompletním debug systémem...")
-        final_df = analyzer.process_folder_optimized(pdf_folder)
-        
-        if final_df.empty:
-            print("\n❌ Žádné výsledky k uložení")
-            return
-        
-        # Uložení výsledků
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # Excel s detaily a kompletním debuggingem
-        excel_path = os.path.join(export_folder, f"meta_analysis_v8_{timestamp}.xlsx")
-        with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-            final_df.to_excel(writer, sheet_name='Meta-Analysis', index=False)
-            
-            # Základní statistiky
-            stats_df = pd.DataFrame([{
-                'Total Studies': final_df['Idstudy'].nunique(),
-                'Total Estimates': len(final_df),
-                'Total Cost': f"${analyzer.cost_tracker.calculate_cost():.2f}",
-                'Cost per Study': f"${analyzer.cost_tracker.calculate_cost() / final_df['Idstudy'].nunique():.2f}",
-                'Success Rate': f"{analyzer.extraction_stats.get('successful', 0) / analyzer.extraction_stats.get('total_files', 1) * 100:.1f}%"
-            }])
-            stats_df.to_excel(writer, sheet_name='Statistics', index=False)
-            
-            # Document 0 vs Document 3 porovnání
-            if analyzer.document_stats['doc0_expected'] and analyzer.document_stats['doc3_actual']:
-                comparison_data = []
-                for i, (expected, actual) in enumerate(zip(analyzer.document_stats['doc0_expected'], 
-                                                         analyzer.document_stats['doc3_actual'])):
-                    comparison_data.append({
-                        'File': expected['file'],
-                        'Doc0_Expected': expected['count'],
-                        'Doc3_Actual': actual['count'],
-                        'Match': '✅' if actual['match'] else '❌',
-                        'Difference': actual['count'] - expected['count'],
-                        'Extraction_Rate': f"{(actual['count']/expected['count'])*100:.1f}%" if expected['count'] > 0 else "N/A"
-                    })
-                
-                comparison_df = pd.DataFrame(comparison_data)
-                comparison_df.to_excel(writer, sheet_name='Doc0_vs_Doc3_Comparison', index=False)
-            
-            # Debug sheety pro každý dokument
-            doc_debug_info = [
-                ('doc1_results', 'Document_1_Debug', 'Document 1 (Metadata)'),
-                ('doc2_results', 'Document_2_Debug', 'Document 2 (Structure)'),
-                ('doc3_results', 'Document_3_Debug', 'Document 3 (Results)')
-            ]
-            
-            for doc_key, sheet_name, doc_name in doc_debug_info:
-                if doc_key in analyzer.document_stats and analyzer.document_stats[doc_key]:
-                    debug_data = []
-                    for result in analyzer.document_stats[doc_key]:
-                        debug_data.append({
-                            'File': result['file'],
-                            'Success_Rate': f"{result['success_rate']:.1f}%",
-                            'Valid_Fields': result['valid_fields'],
-                            'Total_Fields': result['total_fields'],
-                            'Error': '❌' if result['error'] else '✅',
-                            'Missing_Critical': ', '.join(result.get('missing_critical', [])),
-                            'Extracted_Fields': ', '.join(result.get('extracted_fields', [])[:10]),  # Max 10 pro čitelnost
-                            'Empty_Fields': ', '.join(result.get('empty_fields', [])[:10])
-                        })
-                    
-                    debug_df = pd.DataFrame(debug_data)
-                    debug_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                    
-                print(f"📊 {doc_name} debug uložen do sheet '{sheet_name}'")
-        
-        # CSV backup
-        csv_path = os.path.join(export_folder, f"meta_analysis_v8_{timestamp}.csv")
-        final_df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-        
-        # Debug CSV soubory pro všechny dokumenty
-        debug_csvs = []
-        
-        # Document 0 vs Document 3 porovnání
-        if analyzer.document_stats['doc0_expected'] and analyzer.document_stats['doc3_actual']:
-            debug_data = []
-            for expected, actual in zip(analyzer.document_stats['doc0_expected'], 
-                                      analyzer.document_stats['doc3_actual']):
-                debug_data.append({
-                    'File': expected['file'],
-                    'Doc0_Expected': expected['count'],
-                    'Doc3_Actual': actual['count'],
-                    'Match': actual['match'],
-                    'Difference': actual['count'] - expected['count'],
-                    'Extraction_Rate': (actual['count']/expected['count']) if expected['count'] > 0 else 0
-                })
-            
-            debug_df = pd.DataFrame(debug_data)
-            debug_csv_path = os.path.join(export_folder, f"doc0_vs_doc3_debug_{timestamp}.csv")
-            debug_df.to_csv(debug_csv_path, index=False, encoding='utf-8-sig')
-            debug_csvs.append(debug_csv_path)
-        
-        # Kompletní kvalita debug pro všechny dokumenty
-        all_quality_data = []
-        for doc_key, doc_name in [('doc1_results', 'Document_1'), ('doc2_results', 'Document_2'), ('doc3_results', 'Document_3')]:
-            if doc_key in analyzer.document_stats:
-                for result in analyzer.document_stats[doc_key]:
-                    all_quality_data.append({
-                        'Document': doc_name,
-                        'File': result['file'],
-                        'Success_Rate': result['success_rate'],
-                        'Valid_Fields': result['valid_fields'],
-                        'Total_Fields': result['total_fields'],
-                        'Error': result['error'],
-                        'Missing_Critical_Count': len(result.get('missing_critical', [])),
-                        'Missing_Critical_Fields': '; '.join(result.get('missing_critical', [])),
-                        'Extracted_Fields_Count': len(result.get('extracted_fields', [])),
-                        'Empty_Fields_Count': len(result.get('empty_fields', []))
-                    })
-        
-        if all_quality_data:
-            quality_df = pd.DataFrame(all_quality_data)
-            quality_csv_path = os.path.join(export_folder, f"all_documents_quality_{timestamp}.csv")
-            quality_df.to_csv(quality_csv_path, index=False, encoding='utf-8-sig')
-            debug_csvs.append(quality_csv_path)
-        
-        if debug_csvs:
-            print(f"🔍 Debug CSV soubory vytvořeny: {len(debug_csvs)} souborů")
-        
-        print(f"\n✅ Hlavní výsledky uloženy: {excel_path}")
-        
-        print("\n🎉 Zpracování dokončeno!")
-        print(f"💰 Celkové náklady: ${analyzer.cost_tracker.calculate_cost():.2f}")
-        
-        # Kompletní doporučení pro ladění
-        print(f"\n🔧 DEBUGGING DASHBOARD:")
-        print(f"{'='*50}")
-        
-        # Průměrné kvality jednotlivých dokumentů
-        doc_qualities = {}
-        for doc_key, doc_name in [('doc1_results', 'Document 1'), ('doc2_results', 'Document 2'), ('doc3_results', 'Document 3')]:
-            if doc_key in analyzer.document_stats and analyzer.document_stats[doc_key]:
-                results = analyzer.document_stats[doc_key]
-                avg_quality = sum(r['success_rate'] for r in results) / len(results)
-                error_rate = sum(1 for r in results if r['error']) / len(results) * 100
-                doc_qualities[doc_name] = {'quality': avg_quality, 'errors': error_rate}
-                
-                status = "🟢 OK" if avg_quality > 70 else "🟡 NEEDS WORK" if avg_quality > 50 else "🔴 CRITICAL"
-                print(f"{doc_name}: {avg_quality:.1f}% kvalita, {error_rate:.1f}% chyb {status}")
-        
-        # Document 0 vs 3 shoda
-        if analyzer.document_stats['doc0_expected'] and analyzer.document_stats['doc3_actual']:
-            matches = sum(1 for stat in analyzer.document_stats['doc3_actual'] if stat['match'])
-            total = len(analyzer.document_stats['doc3_actual'])
-            match_rate = (matches / total) * 100
-            
-            status = "🟢 OK" if match_rate > 80 else "🟡 NEEDS WORK" if match_rate > 60 else "🔴 CRITICAL"
-            print(f"Doc 0 vs 3: {match_rate:.1f}% shoda {status}")
-        
-        print(f"\n📁 Podrobné výsledky:")
-        print(f"  • Excel: {os.path.basename(excel_path)}")
-        print(f"  • Sheets: Meta-Analysis, Statistics, Doc0_vs_Doc3_Comparison")
-        print(f"  • Debug Sheets: Document_1_Debug, Document_2_Debug, Document_3_Debug")
-        print(f"  • CSV debug soubory: {len(debug_csvs) if 'debug_csvs' in locals() else 0}")
-        
-        print(f"\n🎯 PRIORITNÍ AKCE:")
-        priority_actions = []
-        
-        if 'Document 1' in doc_qualities and doc_qualities['Document 1']['quality'] < 70:
-            priority_actions.append("1. Vyladit Document 1 prompt (metadata extrakce)")
-        if 'Document 2' in doc_qualities and doc_qualities['Document 2']['quality'] < 60:
-            priority_actions.append("2. Vyladit Document 2 prompt (struktura modelu)")
-        if 'Document 3' in doc_qualities and doc_qualities['Document 3']['quality'] < 50:
-            priority_actions.append("3. Vyladit Document 3 prompt (výsledky/parametry)")
-        
-        if analyzer.document_stats.get('doc0_expected') and analyzer.document_stats.get('doc3_actual'):
-            mismatches = sum(1 for stat in analyzer.document_stats['doc3_actual'] if not stat['match'])
-            if mismatches > len(analyzer.document_stats['doc3_actual']) * 0.3:
-                priority_actions.append("4. Synchronizovat Document 0 a Document 3 prompty")
-        
-        if priority_actions:
-            for action in priority_actions:
-                print(f"  {action}")
-        else:
-            print("  🎉 Všechny dokumenty fungují dobře!")
-        
-    except Exception as e:
-        logger.error(f"Kritická chyba: {e}")
-        print(f"❌ Chyba: {e}")
+    run_analysis(pdf_folder, export_folder, CLAUDE_API_KEY)
 
 
 if __name__ == "__main__":
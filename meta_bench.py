@@ -0,0 +1,499 @@
+# -*- coding: utf-8 -*-
+
+"""
+Výkonnostní benchmarky pro meta-analýzu.
+
+Spouští se přes CLI: python meta_cli.py bench <název>
+Každý benchmark vrací návratový kód 0 (OK) nebo 1 (překročený limit).
+"""
+
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+
+
+def _time_command(cmd, runs: int) -> float:
+    """Vrátí medián doby běhu příkazu v sekundách"""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=REPO_DIR, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def bench_startup(runs: int = 5, limit: float = 0.5) -> int:
+    """Měří dobu startu CLI příkazů, které nesmí načítat těžké knihovny"""
+    python = sys.executable
+    with tempfile.TemporaryDirectory() as tmp:
+        commands = {
+            "python (baseline)": [python, "-c", "pass"],
+            "meta_cli.py --help": [python, "meta_cli.py", "--help"],
+            "meta_cli.py cache stats": [python, "meta_cli.py", "cache", "stats", "-o", tmp],
+            "import analyzátoru": [python, "-c",
+                                   "import meta_common; meta_common.load_analyzer_module()"],
+        }
+
+        print(f"⏱️ Startup benchmark ({runs} běhů, limit {limit:.2f} s)")
+        failed = False
+        for name, cmd in commands.items():
+            median = _time_command(cmd, runs)
+            ok = median <= limit
+            failed = failed or not ok
+            print(f"  {'✅' if ok else '❌'} {name:<28} {median * 1000:8.1f} ms")
+
+    return 1 if failed else 0
+
+
+def _legacy_merge(module, results1, results2, results3, study_id, expected_results):
+    """Původní sloučení (buňka po buňce přes df.loc) - jen pro srovnání v benchmarku"""
+    import pandas as pd
+
+    num_rows = expected_results
+    if 'table_rows' in results3 and results3['table_rows']:
+        num_rows = len(results3['table_rows'])
+
+    df = pd.DataFrame(index=range(num_rows), columns=module.META_ANALYSIS_COLUMNS)
+    df.fillna('NA', inplace=True)
+
+    def apply_mapping(row_data, mapping, broadcast=False, row_idx=None):
+        if row_data is None or not isinstance(row_data, list):
+            return
+        for idx, col_name in mapping.items():
+            if idx < len(row_data) and row_data[idx] not in ['NA', '', None]:
+                value = str(row_data[idx]).strip()
+                if col_name in ['Year', 'Num_Citations'] and not value.isdigit():
+                    continue
+                if col_name in ['HH_Included', 'Firms_Included', 'Banks_Included',
+                                'Government_Included', 'Empirical_Research',
+                                'Flexible_Price_Assumption', 'Exogenous_Inflation',
+                                'Zero_Lower_Bound', 'Preferred_Estimate'] and value not in ['0', '1']:
+                    continue
+                if broadcast:
+                    df[col_name] = value
+                elif row_idx is not None:
+                    df.loc[row_idx, col_name] = value
+
+    if results1 is not None and 'table_rows' in results1 and results1['table_rows']:
+        apply_mapping(results1['table_rows'][0], module.DOC1_MAPPING, broadcast=True)
+    if results2 is not None and 'table_rows' in results2 and results2['table_rows']:
+        apply_mapping(results2['table_rows'][0], module.DOC2_MAPPING, broadcast=True)
+    if results3 is not None and 'table_rows' in results3 and results3['table_rows']:
+        for row_idx, row_data in enumerate(results3['table_rows']):
+            if row_idx < num_rows:
+                apply_mapping(row_data, module.DOC3_MAPPING, row_idx=row_idx)
+
+    df['Idstudy'] = str(study_id)
+    if df['IdEstimate'].eq('NA').all():
+        df['IdEstimate'] = range(1, num_rows + 1)
+    return df
+
+
+def _synthetic_results(columns, num_rows: int):
+    """Odpovědi Document 1-3 s realistickou směsí platných a neplatných hodnot"""
+    import random
+    rng = random.Random(42)
+    width = len(columns)
+
+    def row(i):
+        values = []
+        for j in range(width):
+            pick = rng.random()
+            if pick < 0.2:
+                values.append('NA')
+            elif pick < 0.3:
+                values.append(rng.choice(['', ' 1 ', 'yes', '2']))
+            elif pick < 0.6:
+                values.append(rng.choice(['0', '1']))
+            else:
+                values.append(f"{rng.uniform(-0.05, 1):.4f}")
+        values[1] = str(i + 1)
+        values[7] = '2011'
+        return values
+
+    results1 = {'table_rows': [row(0)]}
+    results2 = {'table_rows': [row(0)]}
+    results3 = {'table_rows': [row(i) for i in range(num_rows)]}
+    return results1, results2, results3
+
+
+def bench_merge(runs: int = 20, rows: int = 60) -> int:
+    """Porovná vektorové sloučení výsledků s původním (df.loc po buňkách)"""
+    import pandas as pd
+    from meta_common import load_analyzer_module
+    from meta_schema import apply_schema
+
+    module = load_analyzer_module()
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = module.OptimizedPDFAnalyzer(None, tmp)
+        module.logger.disabled = True
+
+        print(f"⏱️ Merge benchmark ({runs} běhů)")
+        failed = False
+        for num_rows in sorted({1, 10, rows}):
+            results = _synthetic_results(module.META_ANALYSIS_COLUMNS, num_rows)
+            # Původní cesta vrací řetězce, typy jí dodá až schéma
+            legacy = apply_schema(_legacy_merge(module, *results, 1, num_rows))
+            current = analyzer.merge_results_new_structure(*results, 1, num_rows)
+            try:
+                pd.testing.assert_frame_equal(legacy, current)
+            except AssertionError as e:
+                print(f"  ❌ {num_rows} řádků: výsledek se liší od původní implementace\n{e}")
+                failed = True
+                continue
+
+            timings = {}
+            for name, merge in (("původní", lambda: _legacy_merge(module, *results, 1, num_rows)),
+                                ("nový", lambda: analyzer.merge_results_new_structure(*results, 1, num_rows))):
+                durations = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    merge()
+                    durations.append(time.perf_counter() - start)
+                timings[name] = statistics.median(durations)
+            print(f"  ✅ {num_rows:>3} řádků: původní {timings['původní'] * 1000:7.2f} ms | "
+                  f"nový {timings['nový'] * 1000:6.2f} ms | "
+                  f"zrychlení {timings['původní'] / timings['nový']:.1f}×")
+
+    return 1 if failed else 0
+
+
+def _legacy_parse(text: str, width: int):
+    """Původní parsování TSV z _parse_response - jen pro srovnání v benchmarku"""
+    lines = text.strip().split('\n')
+    table_start = -1
+    for i, line in enumerate(lines):
+        if 'Idstudy\t' in line or (line.startswith('Idstudy') and '\t' in line):
+            table_start = i
+            break
+    if table_start < 0:
+        return []
+    table_rows = []
+    for line in lines[table_start + 1:]:
+        if '\t' in line:
+            cols = line.split('\t')
+            while len(cols) < width:
+                cols.append('NA')
+            table_rows.append(cols[:width])
+    return table_rows
+
+
+def _synthetic_responses(columns, count: int):
+    """Odpovědi s typickými vadami: próza, ``` bloky, dvě hlavičky, věta s tabulátorem, useknutý řádek"""
+    import random
+    rng = random.Random(7)
+    header = '\t'.join(columns)
+    responses = []
+    for n in range(count):
+        rows = rng.randint(1, 60)
+        lines = ["Here is the extracted table:", ""]
+        fenced = rng.random() < 0.5
+        if fenced:
+            lines.append("```tsv")
+        lines.append(header)
+        expected = 0
+        for i in range(rows):
+            if rows > 10 and i == rows // 2 and rng.random() < 0.3:
+                # Druhý blok se stejnou hlavičkou
+                lines.append(header)
+            cells = [str(i + 1) if j == 1 else f"{rng.uniform(0, 1):.3f}" for j in range(len(columns))]
+            if rng.random() < 0.05:
+                cells = cells[:len(columns) - 3]   # useknutý řádek
+            else:
+                expected += 1
+            lines.append('\t'.join(cells))
+        if fenced:
+            lines.append("```")
+        lines.append("")
+        lines.append("Note:\tvalues in Table 3 are annualised.")
+        responses.append(('\n'.join(lines), expected))
+    return responses
+
+
+# Nový parser smí být nejvýš o tolik pomalejší než původní (šum měření)
+PARSE_TOLERANCE = 1.1
+
+
+def _time_parsers(parsers: dict, texts, runs: int) -> dict:
+    """Nejkratší doba zpracování všech odpovědí; parsery se v bězích střídají, aby je šum zasáhl stejně"""
+    timings = {name: float('inf') for name in parsers}
+    for _ in range(runs):
+        for name, parse in parsers.items():
+            start = time.perf_counter()
+            for text in texts:
+                parse(text)
+            timings[name] = min(timings[name], time.perf_counter() - start)
+    return timings
+
+
+def bench_parse(runs: int = 5, responses_dir: str = None, count: int = 200) -> int:
+    """Porovná sdílený TSV parser s původním na nahraných nebo syntetických odpovědích"""
+    import random
+    from meta_common import load_analyzer_module
+    from meta_parsing import parse_tsv
+
+    module = load_analyzer_module()
+    columns = module.META_ANALYSIS_COLUMNS
+    if responses_dir:
+        files = sorted(Path(responses_dir).glob("*.txt"))
+        samples = [(f.read_text(encoding='utf-8'), None) for f in files]
+        categories = {"nahrané": samples}
+        source = f"{len(samples)} nahraných odpovědí z {responses_dir}"
+    else:
+        # Fáze se ptají jen na své sloupce, proto i odpovědi s podmnožinou hlavičky
+        stage = module.STAGE_COLUMNS['results']
+        rng = random.Random(7)
+        projected = []
+        for seed in range(count):
+            num_rows = rng.randint(1, 60)
+            projected.append((_stage_table(stage, stage, num_rows, seed), num_rows))
+        categories = {"plné": _synthetic_responses(columns, count), "projekce": projected}
+        samples = [sample for group in categories.values() for sample in group]
+        source = f"{len(samples)} syntetických odpovědí"
+    if not samples:
+        print(f"❌ Žádné odpovědi (*.txt) v {responses_dir}")
+        return 1
+
+    print(f"⏱️ Parse benchmark ({source}, {runs} běhů)")
+    failed = False
+    for category, group in categories.items():
+        texts = [text for text, _ in group]
+        timings = _time_parsers({"původní": lambda t: _legacy_parse(t, len(columns)),
+                                 "nový": lambda t: parse_tsv(t, columns)}, texts, runs)
+        legacy, current = timings["původní"], timings["nový"]
+        slower = current > legacy * PARSE_TOLERANCE
+        failed = failed or slower
+        print(f"  {'❌' if slower else '✅'} {category}: původní {legacy * 1000:7.2f} ms | "
+              f"nový {current * 1000:7.2f} ms | zrychlení {legacy / current:.2f}×")
+
+    legacy_rows = sum(len(_legacy_parse(text, len(columns))) for text, _ in samples)
+    parsed = [parse_tsv(text, columns) for text, _ in samples]
+    new_rows = sum(len(p.rows) for p in parsed)
+    rejected = sum(len(p.rejected) for p in parsed)
+    needs_repair = sum(1 for p in parsed if not p.ok)
+    print(f"  • původní: {legacy_rows} řádků")
+    print(f"  • nový:    {new_rows} řádků, {rejected} odmítnutých, {needs_repair} odpovědí k opravě")
+
+    expected = [e for _, e in samples]
+    if None not in expected:
+        # U syntetických odpovědí známe správný počet řádků
+        wrong = new_rows != sum(expected)
+        failed = failed or wrong
+        print(f"  {'✅' if not wrong else '❌'} očekáváno {sum(expected)} řádků "
+              f"(původní parser: {legacy_rows - sum(expected):+d} navíc)")
+    return 1 if failed else 0
+
+
+def _stage_table(columns, stage_columns, num_rows: int, seed: int) -> str:
+    """TSV odpověď fáze se sloupci `columns`; hodnoty mají jen sloupce fáze, ostatní NA"""
+    import random
+    rng = random.Random(seed)
+    assigned = set(stage_columns)
+    lines = ['\t'.join(columns)]
+    for i in range(num_rows):
+        cells = []
+        for name in columns:
+            if name == 'Idstudy':
+                cells.append('1')
+            elif name not in assigned:
+                cells.append('NA')
+            elif name == 'IdEstimate':
+                cells.append(str(i + 1))
+            else:
+                cells.append(rng.choice(['0', '1', 'NA', f"{rng.uniform(-0.05, 1):.3f}", 'Table 2']))
+        lines.append('\t'.join(cells))
+    return '\n'.join(lines)
+
+
+def _compact_results(stage_columns, row_columns, num_rows: int, seed: int):
+    """Document 3 s kalibrací společnou pro článek: (kompaktní tvar, stejná data jako plná tabulka)"""
+    import random
+    rng = random.Random(seed)
+    defaults = [c for c in stage_columns if c not in row_columns]
+    shared = {name: '1' if name == 'Idstudy' else f"{rng.uniform(0, 1):.3f}" for name in defaults}
+    full_rows, compact_rows = [], []
+    for i in range(num_rows):
+        varying = {name: str(i + 1) if name == 'IdEstimate' else f"{rng.uniform(-0.05, 0.05):.4f}"
+                   for name in row_columns}
+        full_rows.append('\t'.join({**shared, **varying}[name] for name in stage_columns))
+        compact_rows.append('\t'.join(varying[name] for name in row_columns))
+    compact = '\n'.join(['@DEFAULTS', '\t'.join(defaults), '\t'.join(shared[n] for n in defaults),
+                         '@ROWS', '\t'.join(row_columns)] + compact_rows)
+    full = '\n'.join(['\t'.join(stage_columns)] + full_rows)
+    return compact, full
+
+
+def bench_projection(rows: int = 60) -> int:
+    """Výstupní tokeny fází: plných 47 sloupců vs. jen sloupce fáze (STAGE_COLUMNS)"""
+    from meta_common import count_tokens, load_analyzer_module
+    from meta_parsing import parse_compact, parse_tsv
+
+    module = load_analyzer_module()
+    columns = module.META_ANALYSIS_COLUMNS
+    print(f"⏱️ Projekce sloupců (Document 3: {rows} řádků)")
+    failed = False
+    total_before = total_after = 0
+    for seed, (doc_type, stage_columns) in enumerate(module.STAGE_COLUMNS.items()):
+        num_rows = rows if doc_type == "results" else 1
+        full = _stage_table(columns, stage_columns, num_rows, seed)
+        projected = _stage_table(stage_columns, stage_columns, num_rows, seed)
+        # Obě podoby se musí naparsovat na stejné kanonické řádky
+        if parse_tsv(full, columns).rows != parse_tsv(projected, columns).rows:
+            print(f"  ❌ {doc_type}: projekce mění naparsované hodnoty")
+            failed = True
+            continue
+        before, after = count_tokens(full), count_tokens(projected)
+        total_before += before
+        total_after += after
+        print(f"  ✅ {doc_type:<9} {len(columns)} → {len(stage_columns):>2} sloupců: "
+              f"{before:6,} → {after:6,} tokenů ({1 - after / before:.0%} méně)")
+    if total_before:
+        print(f"  • celkem: {total_before:,} → {total_after:,} výstupních tokenů na článek")
+
+    # Kompaktní tvar Document 3: kalibrace jednou v @DEFAULTS
+    compact, full = _compact_results(module.STAGE_COLUMNS["results"], module.COMPACT_ROW_COLUMNS, rows, 99)
+    if parse_compact(compact, columns).rows != parse_tsv(full, columns).rows:
+        print("  ❌ results kompaktně: rozbalené řádky se liší od plné tabulky")
+        return 1
+    before, after = count_tokens(full), count_tokens(compact)
+    print(f"  ✅ results kompaktně (@DEFAULTS/@ROWS): {before:6,} → {after:6,} tokenů "
+          f"({1 - after / before:.0%} méně)")
+    return 1 if failed else 0
+
+
+_PROSE = ("the optimal inflation rate depends on nominal rigidities and the zero lower bound while "
+          "households value real money balances and firms face price adjustment costs in the model ").split()
+
+
+def _synthetic_pages(seed: int, pages: int):
+    """Strany syntetického článku: próza se sekcemi a každá čtvrtá strana s tabulkou"""
+    import random
+    rng = random.Random(seed)
+    result = []
+    for page in range(pages):
+        lines = []
+        if page == 0:
+            lines += ["Abstract: " + ' '.join(rng.choices(_PROSE, k=80)), "Introduction"]
+        if page == pages // 3:
+            lines.append("Calibration: we set beta = 0.99, sigma = 2 and the Rotemberg cost to 58.")
+        lines += [' '.join(rng.choices(_PROSE, k=14)) for _ in range(30)]
+        if page % 4 == 2:
+            lines.append(f"Table {page // 4 + 1} Optimal inflation under alternative calibrations")
+            lines += [f"Case {r}      {rng.uniform(-5, 5):.2f}    {rng.uniform(0, 3):.2f}    {rng.uniform(0, 1):.3f}"
+                      for r in range(8)]
+            lines.append("Notes: annualised percent.")
+        result.append('\n'.join(lines))
+    return result
+
+
+def _legacy_content(analyzer, pages):
+    """Původní obsah: seznam stran + full_text přes += + kopie sekcí a tabulek + index čísel"""
+    from meta_evidence import EvidenceIndex
+    content = {"full_text": "", "pages": [], "metadata": {}}
+    for page_text in pages:
+        content["pages"].append(page_text)
+        content["full_text"] += page_text + "\n"
+    text = content["full_text"]
+    content["sections"] = {name: text[start:end] for name, (start, end) in analyzer._detect_sections(text).items()}
+    content["tables"] = [text[start:end] for start, end in analyzer._extract_tables(text)]
+    content["evidence"] = EvidenceIndex.from_pages(content["pages"])
+    return content
+
+
+def _compact_content(analyzer, pages):
+    """PaperDocument: jeden buffer, offsety stran a rozsahy sekcí/tabulek"""
+    from meta_document import PaperDocument
+    content = PaperDocument.from_pages(pages)
+    content.set_spans(analyzer._detect_sections(content.full_text), analyzer._extract_tables(content.full_text))
+    return content
+
+
+def _memory_worker(variant: str, papers: int, pages: int):
+    """Běží v samostatném procesu: drží obsah všech článků a vypíše nárůst peak RSS a velikost pickle"""
+    import json
+    import pickle
+    import resource
+    from meta_common import load_analyzer_module
+
+    module = load_analyzer_module()
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = module.OptimizedPDFAnalyzer(None, tmp)
+    build = _legacy_content if variant == "legacy" else _compact_content
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    contents = []
+    pickle_bytes = 0
+    for seed in range(papers):
+        content = build(analyzer, _synthetic_pages(seed, pages))
+        pickle_bytes += len(pickle.dumps(content))
+        contents.append(content)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    # ru_maxrss je na Linuxu v KiB, na macOS v bajtech
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    print(json.dumps({"peak_mb": peak_mb, "pickle_mb": pickle_bytes / (1024 * 1024)}))
+
+
+def bench_memory(papers: int = 500, pages: int = 20) -> int:
+    """Peak RSS a velikost cache: původní slovník obsahu vs. PaperDocument nad syntetickou složkou"""
+    import json
+    from meta_common import load_analyzer_module
+
+    # Oba tvary musí dávat stejné strany, text, sekce a tabulky
+    module = load_analyzer_module()
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = module.OptimizedPDFAnalyzer(None, tmp)
+    sample = _synthetic_pages(0, pages)
+    legacy, compact = _legacy_content(analyzer, sample), _compact_content(analyzer, sample)
+    if (list(compact["pages"]) != legacy["pages"] or compact["sections"] != legacy["sections"]
+            or compact["tables"] != legacy["tables"] or compact["full_text"] != legacy["full_text"].rstrip("\n")):
+        print("❌ PaperDocument vrací jiný obsah než původní slovník")
+        return 1
+
+    print(f"⏱️ Paměť obsahu článků ({papers} článků × {pages} stran, každá varianta v samostatném procesu)")
+    measured = {}
+    for variant in ("legacy", "compact"):
+        output = subprocess.run(
+            [sys.executable, "-c", f"import meta_bench; meta_bench._memory_worker({variant!r}, {papers}, {pages})"],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+        measured[variant] = json.loads(output.strip().splitlines()[-1])
+        print(f"  • {variant:<8} peak RSS +{measured[variant]['peak_mb']:8.1f} MB, "
+              f"pickle {measured[variant]['pickle_mb']:8.1f} MB")
+
+    legacy, compact = measured["legacy"], measured["compact"]
+    ok = compact["peak_mb"] < legacy["peak_mb"]
+    print(f"  {'✅' if ok else '❌'} PaperDocument: {1 - compact['peak_mb'] / legacy['peak_mb']:.0%} méně paměti, "
+          f"{1 - compact['pickle_mb'] / legacy['pickle_mb']:.0%} menší cache")
+    return 0 if ok else 1
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "merge": bench_merge,
+    "parse": bench_parse,
+    "projection": bench_projection,
+    "memory": bench_memory,
+}
+
+
+def run(name: str, args) -> int:
+    """Spustí benchmark podle názvu s argumenty z CLI"""
+    if name == "startup":
+        return bench_startup(runs=args.runs, limit=args.limit)
+    if name == "merge":
+        return bench_merge(runs=args.runs, rows=args.rows)
+    if name == "parse":
+        return bench_parse(runs=args.runs, responses_dir=args.responses)
+    if name == "projection":
+        return bench_projection(rows=args.rows)
+    if name == "memory":
+        return bench_memory(papers=args.papers)
+    raise ValueError(f"Neznámý benchmark: {name}")
+
+
+if __name__ == "__main__":
+    sys.exit(bench_startup())
@@ -0,0 +1,604 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Headless CLI pro meta-analýzu inflace.
+
+Příklady:
+    python meta_cli.py run ./pdfs -o ./export
+    python meta_cli.py run ./pdfs -o ./export --dry-run
+    python meta_cli.py cache stats -o ./export
+    python meta_cli.py cache clear -o ./export --older-than 30
+    python meta_cli.py search "zero lower bound" -o ./export
+    python meta_cli.py search --rebuild -o ./export
+    python meta_cli.py dedup ./pdfs -o ./export
+    python meta_cli.py recode ./export/meta_analysis_v8_<čas>.xlsx --column Interest_Rate \
+        --instruction "Policy rate in percent per annum, NA if not reported" -o ./export
+    python meta_cli.py bench startup
+    python meta_cli.py bench merge --rows 60
+    python meta_cli.py bench parse --responses ./responses
+    python meta_cli.py bench projection
+    python meta_cli.py bench memory --papers 500
+    python meta_cli.py queue init ./pdfs -o ./export  # jednou, na sdíleném disku
+    python meta_cli.py worker ./pdfs -o ./export  # na každém stroji
+    python meta_cli.py queue merge ./pdfs -o ./export
+
+Konfigurace se čte z proměnných prostředí (CLAUDE_API_KEY, SCOPUS_API_KEY,
+CLAUDE_MODEL, MODELS, BUDGET_USD, OUTPUT_MODE, FAN_OUT_TABLES,
+LOCAL_TABLES, PRE_SCAN_CONFIDENCE, RESULTS_FORMAT, DEDUP, RESPONSE_CACHE) nebo z JSON souboru
+(--config / META_CONFIG).
+Těžké knihovny se importují až v příkazech, které je potřebují.
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+from meta_common import CONFIG_ENV_VAR, load_analyzer_module, load_config
+
+DEFAULT_EXPORT_FOLDER = "AI_export_v8_new_structure"
+
+
+def _cache_dir(export_folder: str) -> Path:
+    """Složka s pickle cache extrahovaných PDF"""
+    return Path(export_folder) / "cache"
+
+
+def _budget(args, config) -> float:
+    """Limit rozpočtu z CLI nebo konfigurace (None = bez limitu)"""
+    budget = args.budget if args.budget is not None else config.get("BUDGET_USD")
+    return float(budget) if budget not in (None, "") else None
+
+
+def _pre_scan_confidence(args, config) -> float:
+    """Práh jistoty lokálního pre-scanu z CLI nebo konfigurace (nad 1 = vždy API)"""
+    value = args.pre_scan_confidence if args.pre_scan_confidence is not None else config.get("PRE_SCAN_CONFIDENCE")
+    return float(value) if value not in (None, "") else 0.8
+
+
+def _output_mode(args, config) -> str:
+    """Režim výstupu modelu z CLI nebo konfigurace"""
+    return args.output_mode or config.get("OUTPUT_MODE") or "tsv"
+
+
+def _flag(cli_value: bool, config_value) -> bool:
+    """Zapínací volba z CLI nebo konfigurace (v prostředí jako 1/true)"""
+    return cli_value or config_value is True or str(config_value).lower() in ("1", "true", "yes")
+
+
+def cmd_run(args) -> int:
+    """Zpracuje složku PDF bez GUI"""
+    config = load_config(args.config)
+    if args.dry_run:
+        return cmd_run_dry(args, config)
+    if not config.get("CLAUDE_API_KEY"):
+        print("❌ Chybí CLAUDE_API_KEY (proměnná prostředí nebo --config)", file=sys.stderr)
+        return 2
+
+    if not os.path.isdir(args.pdf_folder):
+        print(f"❌ Složka neexistuje: {args.pdf_folder}", file=sys.stderr)
+        return 2
+
+    analyzer_module = load_analyzer_module()
+    excel_path = analyzer_module.run_analysis(
+        args.pdf_folder,
+        args.export_folder,
+        config["CLAUDE_API_KEY"],
+        model_config=config.get("MODELS") or None,
+        extract_workers=args.extract_workers,
+        api_workers=args.api_workers,
+        budget_usd=_budget(args, config),
+        output_mode=_output_mode(args, config),
+        fan_out_tables=_flag(args.fan_out_tables, config.get("FAN_OUT_TABLES")),
+        local_tables=_flag(args.local_tables, config.get("LOCAL_TABLES")),
+        pre_scan_confidence=_pre_scan_confidence(args, config),
+        results_format=args.results_format or config.get("RESULTS_FORMAT") or "auto",
+        dedup=args.dedup or config.get("DEDUP") or "link",
+        response_cache=_flag(args.response_cache, config.get("RESPONSE_CACHE")),
+    )
+    return 0 if excel_path else 1
+
+
+def cmd_run_dry(args, config) -> int:
+    """Odhad tokenů, nákladů a doby běhu bez API volání"""
+    if not os.path.isdir(args.pdf_folder):
+        print(f"❌ Složka neexistuje: {args.pdf_folder}", file=sys.stderr)
+        return 2
+
+    import meta_dryrun
+    excel_path = meta_dryrun.dry_run(
+        args.pdf_folder,
+        args.export_folder,
+        model_config=config.get("MODELS") or None,
+        extract_workers=args.extract_workers,
+        api_workers=args.api_workers,
+        result_rows=args.dry_run_rows,
+        output_mode=_output_mode(args, config),
+        budget_usd=_budget(args, config),
+        pre_scan_confidence=_pre_scan_confidence(args, config),
+        fan_out_tables=_flag(args.fan_out_tables, config.get("FAN_OUT_TABLES")),
+        local_tables=_flag(args.local_tables, config.get("LOCAL_TABLES")),
+    )
+    return 0 if excel_path else 1
+
+
+def _queue_db(args) -> str:
+    """Cesta k SQLite frontě (výchozí: uvnitř složky s PDF)"""
+    import meta_workqueue
+    return args.db or os.path.join(args.pdf_folder, meta_workqueue.DEFAULT_DB_NAME)
+
+
+def cmd_queue_init(args) -> int:
+    """Zařadí PDF ze složky do sdílené fronty a vyřadí kopie dřív, než je někdo zaplatí"""
+    import meta_workqueue
+    config = load_config(args.config)
+    queue = meta_workqueue.WorkQueue(_queue_db(args))
+    added = queue.enqueue_folder(args.pdf_folder)
+    print(f"📥 Zařazeno {added} nových PDF do {queue.db_path}")
+
+    # Extrakce jde do sdílené cache, workery ji pak jen načtou
+    dedup = args.dedup or config.get("DEDUP") or "link"
+    pdf_files = sorted(Path(args.pdf_folder).glob("*.pdf"))
+    if dedup != "off" and pdf_files:
+        os.makedirs(args.export_folder, exist_ok=True)
+        analyzer_module = load_analyzer_module()
+        analyzer = analyzer_module.OptimizedPDFAnalyzer(None, args.export_folder, dedup=dedup)
+        remaining = {pdf_path.name for pdf_path in analyzer.skip_duplicates(pdf_files, args.extract_workers)}
+        skipped = {pdf_path.name for pdf_path in pdf_files} - remaining
+        queue.mark_duplicates(analyzer.duplicates, skipped)
+    print(f"📊 Stav fronty: {queue.status_counts()}")
+    return 0
+
+
+def cmd_queue_status(args) -> int:
+    """Vypíše stav sdílené fronty"""
+    import meta_workqueue
+    queue = meta_workqueue.WorkQueue(_queue_db(args))
+    for status, count in sorted(queue.status_counts().items()):
+        print(f"  • {status}: {count}")
+    return 0
+
+
+def cmd_worker(args) -> int:
+    """Spustí workera nad sdílenou frontou"""
+    import meta_workqueue
+    config = load_config(args.config)
+    if not config.get("CLAUDE_API_KEY"):
+        print("❌ Chybí CLAUDE_API_KEY (proměnná prostředí nebo --config)", file=sys.stderr)
+        return 2
+
+    queue = meta_workqueue.WorkQueue(_queue_db(args), lease_seconds=args.lease)
+    analyzer_module = load_analyzer_module()
+    os.makedirs(args.export_folder, exist_ok=True)
+    analyzer = analyzer_module.OptimizedPDFAnalyzer(
+        config["CLAUDE_API_KEY"], args.export_folder, model_config=config.get("MODELS") or None,
+        budget_usd=_budget(args, config), output_mode=_output_mode(args, config),
+        fan_out_tables=_flag(args.fan_out_tables, config.get("FAN_OUT_TABLES")),
+        local_tables=_flag(args.local_tables, config.get("LOCAL_TABLES")),
+        pre_scan_confidence=_pre_scan_confidence(args, config),
+        dedup=config.get("DEDUP") or "link",
+        response_cache=_flag(args.response_cache, config.get("RESPONSE_CACHE")))
+    meta_workqueue.run_worker(analyzer, queue, args.pdf_folder, args.export_folder,
+                              analyzer_module.META_ANALYSIS_COLUMNS, worker_id=args.worker_id)
+    return 0
+
+
+def cmd_queue_merge(args) -> int:
+    """Sloučí shardy workerů do finálního Excelu"""
+    import datetime
+    import pandas as pd
+    import meta_workqueue
+    from meta_sink import STUDIES_SHEET, ResultsSink, studies_frame, write_studies
+
+    config = load_config(args.config)
+    queue = meta_workqueue.WorkQueue(_queue_db(args))
+    analyzer_module = load_analyzer_module()
+    merged = meta_workqueue.merge_shards(queue, args.export_folder,
+                                         analyzer_module.META_ANALYSIS_COLUMNS)
+    if merged.empty:
+        print("❌ Žádné shardy k sloučení")
+        return 1
+
+    worker_stats = meta_workqueue.load_worker_stats(args.export_folder)
+    total_cost = sum(st['cost'] for st in worker_stats)
+    counts = queue.status_counts()
+    stats_df = pd.DataFrame([{
+        'Total Studies': merged['Idstudy'].nunique(),
+        'Total Estimates': len(merged),
+        'Total Cost': f"${total_cost:.2f}",
+        'Workers': len(worker_stats),
+        'Done': counts.get('done', 0),
+        'Failed': counts.get('failed', 0),
+        'Pending/Running': counts.get('pending', 0) + counts.get('running', 0),
+    }])
+
+    study_files = queue.study_files()
+    sheets = {'Statistics': stats_df, STUDIES_SHEET: studies_frame(study_files)}
+    if worker_stats:
+        sheets['Workers'] = pd.DataFrame(worker_stats)
+    duplicates = queue.duplicate_links()
+    if duplicates:
+        sheets['Duplicates'] = pd.DataFrame([{
+            'File': link['pdf_name'],
+            'Canonical': link['canonical'],
+            'Relation': link['relation'],
+            'Reason': link['reason'],
+            'Similarity': link['similarity'],
+            'Idstudy': study_files.get(link['pdf_name']),
+            'Canonical_Idstudy': study_files.get(link['canonical']),
+        } for link in duplicates])
+
+    # Sloučený dataset jde do úložiště výsledků (CSV/Parquet s přiřazením studií) i do Excelu
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(args.export_folder, f"meta_analysis_v8_merged_{timestamp}")
+    sink = ResultsSink(base, fmt=args.results_format or config.get("RESULTS_FORMAT") or "auto")
+    sink.append(merged)
+    write_studies(sink.path, study_files)
+    excel_path = base + ".xlsx"
+    sink.write_excel(excel_path, sheets)
+    print(f"✅ Sloučeno {merged['Idstudy'].nunique()} studií ({len(merged)} odhadů): {excel_path}")
+    return 0
+
+
+def cmd_cache_stats(args) -> int:
+    """Vypíše velikost a stáří cache"""
+    files = list(_cache_dir(args.export_folder).glob("*.pkl"))
+    if not files:
+        print("📦 Cache je prázdná")
+        return 0
+
+    stats = [f.stat() for f in files]
+    total_mb = sum(st.st_size for st in stats) / (1024 * 1024)
+    oldest = min(st.st_mtime for st in stats)
+    newest = max(st.st_mtime for st in stats)
+    print(f"📦 Cache: {_cache_dir(args.export_folder)}")
+    print(f"  • Souborů: {len(files)}")
+    print(f"  • Velikost: {total_mb:.1f} MB")
+    print(f"  • Nejstarší: {time.strftime('%Y-%m-%d %H:%M', time.localtime(oldest))}")
+    print(f"  • Nejnovější: {time.strftime('%Y-%m-%d %H:%M', time.localtime(newest))}")
+
+    response_path = _cache_dir(args.export_folder) / "response_cache.sqlite"
+    if response_path.exists():
+        from meta_responses import ResponseCache
+        stats = ResponseCache(response_path).stats()
+        print(f"  • Odpovědi API: {stats['responses']} ({stats['size_mb']:.1f} MB)")
+    return 0
+
+
+def cmd_cache_clear(args) -> int:
+    """Smaže položky cache (volitelně jen starší než N dní)"""
+    cutoff = time.time() - args.older_than * 86400 if args.older_than is not None else None
+    removed = 0
+    for cache_file in _cache_dir(args.export_folder).glob("*.pkl"):
+        if cutoff is not None and cache_file.stat().st_mtime >= cutoff:
+            continue
+        cache_file.unlink()
+        removed += 1
+    print(f"🗑️ Smazáno {removed} položek cache")
+
+    # Z indexu stran zmizí i články, jejichž cache byla smazána
+    index_path = _cache_dir(args.export_folder) / "search_index.sqlite"
+    if removed and index_path.exists():
+        from meta_search import SearchIndex
+        pruned = SearchIndex(index_path).prune(f.stem for f in _cache_dir(args.export_folder).glob("*.pkl"))
+        print(f"🗑️ Z indexu stran odebráno {pruned} článků")
+
+    response_path = _cache_dir(args.export_folder) / "response_cache.sqlite"
+    if response_path.exists():
+        from meta_responses import ResponseCache
+        print(f"🗑️ Smazáno {ResponseCache(response_path).prune(cutoff)} odpovědí API")
+    return 0
+
+
+def _rebuild_search_index(index, cache_dir: Path) -> int:
+    """Zaindexuje všechny položky cache, které v indexu chybí"""
+    import pickle
+    added = 0
+    cache_files = sorted(cache_dir.glob("*.pkl"))
+    for cache_file in cache_files:
+        if index.has(cache_file.stem):
+            continue
+        try:
+            with open(cache_file, "rb") as f:
+                content = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ {cache_file.name}: {e}")
+            continue
+        if not content.get("pages"):
+            continue
+        index.add_document(cache_file.stem, content.get("file") or cache_file.stem, list(content["pages"]))
+        added += 1
+    index.prune(f.stem for f in cache_files)
+    return added
+
+
+def cmd_search(args) -> int:
+    """Fulltextové hledání ve stranách extrahovaných článků"""
+    from meta_search import DEFAULT_INDEX_NAME, SearchIndex, fts5_available
+    if not fts5_available():
+        print("❌ SQLite v tomto Pythonu nepodporuje FTS5", file=sys.stderr)
+        return 1
+    cache_dir = _cache_dir(args.export_folder)
+    if not args.rebuild and not (cache_dir / DEFAULT_INDEX_NAME).exists():
+        print(f"❌ Index stran neexistuje: {cache_dir / DEFAULT_INDEX_NAME} (spusťte search --rebuild)",
+              file=sys.stderr)
+        return 1
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    index = SearchIndex(cache_dir / DEFAULT_INDEX_NAME)
+    if args.rebuild:
+        added = _rebuild_search_index(index, cache_dir)
+        stats = index.stats()
+        print(f"🔎 Index stran: +{added} článků, celkem {stats['papers']} článků / {stats['pages']} stran "
+              f"({stats['size_mb']:.1f} MB)")
+    if not args.query:
+        return 0
+
+    try:
+        hits = index.search(args.query, limit=args.limit, file=args.file)
+    except Exception as e:
+        print(f"❌ Neplatný dotaz: {e}", file=sys.stderr)
+        return 2
+    if not hits:
+        print("🔎 Nic nenalezeno")
+        return 0
+    for hit in hits:
+        study = f"Idstudy {hit.idstudy}" if hit.idstudy is not None else "Idstudy -"
+        print(f"{hit.file}  s. {hit.page}  ({study}, bm25 {hit.score:.2f})")
+        print(f"    {' '.join(hit.snippet.split())}")
+    return 0
+
+
+def cmd_dedup(args) -> int:
+    """Najde kopie a verze téže studie ve složce (extrahuje do cache, bez API)"""
+    pdf_files = sorted(Path(args.pdf_folder).glob("*.pdf"))
+    if not pdf_files:
+        print(f"❌ Ve složce nejsou PDF: {args.pdf_folder}", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.export_folder, exist_ok=True)
+    analyzer_module = load_analyzer_module()
+    analyzer = analyzer_module.OptimizedPDFAnalyzer(None, args.export_folder)
+    links = analyzer.detect_duplicates(pdf_files, args.extract_workers)
+    if not links:
+        print(f"🪞 Žádné duplicity mezi {len(pdf_files)} PDF")
+        return 0
+
+    canonical = None
+    for link in links:
+        if link.canonical != canonical:
+            canonical = link.canonical
+            print(f"📄 {canonical}")
+        print(f"    ↳ {link.file}  {link.relation} ({link.reason}, podobnost {link.similarity:.2f})")
+    copies = sum(link.relation == "duplicate" for link in links)
+    print(f"🪞 {len(links)} z {len(pdf_files)} PDF jsou kopie ({copies}) nebo jiné verze ({len(links) - copies})")
+    return 0
+
+
+def cmd_recode(args) -> int:
+    """Překóduje jeden sloupec v celém datasetu podle nové instrukce"""
+    config = load_config(args.config)
+    if not config.get("CLAUDE_API_KEY"):
+        print("❌ Chybí CLAUDE_API_KEY (proměnná prostředí nebo --config)", file=sys.stderr)
+        return 2
+    if not os.path.isfile(args.dataset):
+        print(f"❌ Dataset neexistuje: {args.dataset}", file=sys.stderr)
+        return 2
+    if args.instruction_file:
+        with open(args.instruction_file, encoding="utf-8") as f:
+            instruction = f.read()
+    else:
+        instruction = args.instruction
+    if not instruction.strip():
+        print("❌ Prázdná instrukce", file=sys.stderr)
+        return 2
+
+    import meta_recode
+    try:
+        meta_recode.check_column(args.column)
+        df, study_files = meta_recode.load_dataset(args.dataset)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    analyzer_module = load_analyzer_module()
+    os.makedirs(args.export_folder, exist_ok=True)
+    analyzer = analyzer_module.OptimizedPDFAnalyzer(
+        config["CLAUDE_API_KEY"], args.export_folder, model_config=config.get("MODELS") or None,
+        response_cache=not args.no_response_cache)
+    try:
+        recoded, changes = meta_recode.recode_dataset(analyzer, df, study_files, args.column, instruction,
+                                                      workers=args.workers, studies=args.study)
+    except RuntimeError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    if changes.empty:
+        print("❌ Žádné studie k překódování")
+        return 1
+
+    excel_path = meta_recode.save_recoded(analyzer, recoded, changes, study_files, args.export_folder,
+                                          args.column, instruction)
+    counts = changes['Status'].value_counts()
+    print(f"🔁 {args.column}: změněno {counts.get('changed', 0)} z {len(changes)} odhadů "
+          f"({changes['Idstudy'].nunique()} studií, bez článku {counts.get('no document', 0)}, "
+          f"bez odpovědi {counts.get('no answer', 0)})")
+    print(f"💰 Náklady: ${analyzer.cost_tracker.calculate_cost():.2f} "
+          f"({analyzer.extraction_stats.get('api_requests', 0)} požadavků, "
+          f"{analyzer.extraction_stats.get('response_cache_hits', 0)} z cache odpovědí)")
+    print(f"✅ Uloženo: {excel_path}")
+    return 0
+
+
+def cmd_bench(args) -> int:
+    """Spustí benchmark"""
+    import meta_bench
+    return meta_bench.run(args.name, args)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Sestaví argparse parser se všemi příkazy"""
+    parser = argparse.ArgumentParser(
+        prog="meta_cli.py",
+        description="Headless meta-analýza optimální inflace z PDF článků",
+    )
+    parser.add_argument("--config", help=f"JSON konfigurace (jinak ${CONFIG_ENV_VAR} / proměnné prostředí)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # run
+    run_parser = subparsers.add_parser("run", help="Zpracovat složku PDF")
+    run_parser.add_argument("pdf_folder", help="Složka s PDF soubory")
+    run_parser.add_argument("-o", "--export-folder", default=DEFAULT_EXPORT_FOLDER,
+                            help="Složka pro výsledky, log a cache")
+    run_parser.add_argument("--extract-workers", type=int, default=2,
+                            help="Procesy pro předextrakci PDF (0 = sekvenčně bez pipeline)")
+    run_parser.add_argument("--api-workers", type=int, default=1,
+                            help="Souběžná vlákna volající API")
+    run_parser.add_argument("--budget", type=float, metavar="USD",
+                            help="Limit nákladů běhu (jinak BUDGET_USD z konfigurace)")
+    run_parser.add_argument("--output-mode", choices=["tsv", "tool"],
+                            help="Formát odpovědí: TSV text, nebo typované řádky přes tool use (jinak OUTPUT_MODE)")
+    run_parser.add_argument("--fan-out-tables", action="store_true",
+                            help="Document 3 souběžně po skupinách tabulek (jinak FAN_OUT_TABLES)")
+    run_parser.add_argument("--local-tables", action="store_true",
+                            help="Hodnoty z lokálně parsovaných tabulek, model jen označí buňky (jinak LOCAL_TABLES)")
+    run_parser.add_argument("--pre-scan-confidence", type=float, metavar="0-1",
+                            help="Jistota lokálního pre-scanu, od které se API pre-scan přeskočí "
+                                 "(jinak PRE_SCAN_CONFIDENCE, výchozí 0.8; nad 1 = vždy API)")
+    run_parser.add_argument("--results-format", choices=["auto", "csv", "parquet"],
+                            help="Průběžné úložiště výsledků (auto = parquet s pyarrow, jinak CSV; "
+                                 "jinak RESULTS_FORMAT)")
+    run_parser.add_argument("--dedup", choices=["off", "link", "skip"],
+                            help="Kopie téže studie: link = kopie přeskočit, verze zpracovat a propojit "
+                                 "(výchozí), skip = zpracovat jen kanonickou verzi (jinak DEDUP)")
+    run_parser.add_argument("--response-cache", action="store_true",
+                            help="Odpovědi API ukládat do cache a stejné požadavky neopakovat "
+                                 "(jinak RESPONSE_CACHE)")
+    run_parser.add_argument("--dry-run", action="store_true",
+                            help="Jen odhadnout tokeny, náklady a dobu běhu (žádná API volání)")
+    run_parser.add_argument("--dry-run-rows", type=int, default=6, metavar="N",
+                            help="Předpokládaný počet výsledků na článek pro --dry-run")
+    run_parser.set_defaults(func=cmd_run)
+
+    # cache
+    cache_parser = subparsers.add_parser("cache", help="Údržba cache extrahovaných PDF")
+    cache_sub = cache_parser.add_subparsers(dest="cache_command", required=True)
+
+    stats_parser = cache_sub.add_parser("stats", help="Velikost a stáří cache")
+    stats_parser.add_argument("-o", "--export-folder", default=DEFAULT_EXPORT_FOLDER)
+    stats_parser.set_defaults(func=cmd_cache_stats)
+
+    clear_parser = cache_sub.add_parser("clear", help="Smazat cache")
+    clear_parser.add_argument("-o", "--export-folder", default=DEFAULT_EXPORT_FOLDER)
+    clear_parser.add_argument("--older-than", type=float, metavar="DAYS",
+                              help="Smazat jen položky starší než DAYS dní")
+    clear_parser.set_defaults(func=cmd_cache_clear)
+
+    # dedup
+    dedup_parser = subparsers.add_parser("dedup", help="Najít kopie a verze téže studie (bez API)")
+    dedup_parser.add_argument("pdf_folder", help="Složka s PDF soubory")
+    dedup_parser.add_argument("-o", "--export-folder", default=DEFAULT_EXPORT_FOLDER,
+                              help="Složka s cache extrahovaných PDF")
+    dedup_parser.add_argument("--extract-workers", type=int, default=2,
+                              help="Procesy pro extrakci PDF (0 = sekvenčně)")
+    dedup_parser.set_defaults(func=cmd_dedup)
+
+    # recode
+    recode_parser = subparsers.add_parser("recode", help="Překódovat jeden sloupec v celém datasetu")
+    recode_parser.add_argument("dataset", help="Výsledky běhu (.xlsx, .csv nebo results_*.parquet)")
+    recode_parser.add_argument("-o", "--export-folder", default=DEFAULT_EXPORT_FOLDER,
+                               help="Exportní složka běhu (cache článků a index stran)")
+    recode_parser.add_argument("--column", required=True, help="Sloupec k překódování (např. Interest_Rate)")
+    instruction_group = recode_parser.add_mutually_exclusive_group(required=True)
+    instruction_group.add_argument("--instruction", help="Nová instrukce pro sloupec")
+    instruction_group.add_argument("--instruction-file", metavar="PATH", help="Instrukce ze souboru")
+    recode_parser.add_argument("--workers", type=int, default=4, help="Souběžné požadavky")
+    recode_parser.add_argument("--study", type=int, action="append", metavar="IDSTUDY",
+                               help="Jen vybrané studie (lze opakovat)")
+    recode_parser.add_argument("--no-response-cache", action="store_true",
+                               help="Bez cache odpovědí API (vynutí nové požadavky)")
+    recode_parser.set_defaults(func=cmd_recode)
+
+    # search
+    search_parser = subparsers.add_parser("search", help="Fulltextové hledání ve stranách článků z cache")
+    search_parser.add_argument("query", nargs="?",
+                               help="Slova (všechna musí být na straně) nebo dotaz v syntaxi FTS5")
+    search_parser.add_argument("-o", "--export-folder", default=DEFAULT_EXPORT_FOLDER)
+    search_parser.add_argument("--limit", type=int, default=20, help="Počet vrácených stran")
+    search_parser.add_argument("--file", help="Hledat jen v jednom PDF (jméno souboru)")
+    search_parser.add_argument("--rebuild", action="store_true",
+                               help="Doplnit do indexu položky cache, které v něm chybí")
+    search_parser.set_defaults(func=cmd_search)
+
+    # queue
+    queue_parser = subparsers.add_parser("queue", help="Sdílená fronta pro více strojů")
+    queue_sub = queue_parser.add_subparsers(dest="queue_command", required=True)
+
+    init_parser = queue_sub.add_parser("init", help="Zařadit PDF ze složky do fronty")
+    init_parser.add_argument("pdf_folder")
+    init_parser.add_argument("-o", "--export-folder", default=DEFAULT_EXPORT_FOLDER,
+                             help="Sdílená složka workerů (cache extrahovaných PDF)")
+    init_parser.add_argument("--db", help="Cesta k SQLite frontě (výchozí: <pdf_folder>/work_queue.sqlite)")
+    init_parser.add_argument("--dedup", choices=["off", "link", "skip"],
+                             help="Kopie téže studie: link = kopie vyřadit, verze zpracovat (výchozí), "
+                                  "skip = zpracovat jen kanonickou verzi (jinak DEDUP)")
+    init_parser.add_argument("--extract-workers", type=int, default=2,
+                             help="Procesy pro extrakci PDF při hledání duplicit (0 = sekvenčně)")
+    init_parser.set_defaults(func=cmd_queue_init)
+
+    status_parser = queue_sub.add_parser("status", help="Stav fronty")
+    status_parser.add_argument("pdf_folder")
+    status_parser.add_argument("--db")
+    status_parser.set_defaults(func=cmd_queue_status)
+
+    merge_parser = queue_sub.add_parser("merge", help="Sloučit shardy workerů do Excelu")
+    merge_parser.add_argument("pdf_folder")
+    merge_parser.add_argument("-o", "--export-folder", default=DEFAULT_EXPORT_FOLDER)
+    merge_parser.add_argument("--db")
+    merge_parser.add_argument("--results-format", choices=["auto", "csv", "parquet"],
+                              help="Úložiště sloučených výsledků vedle Excelu (jinak RESULTS_FORMAT)")
+    merge_parser.set_defaults(func=cmd_queue_merge)
+
+    # worker
+    worker_parser = subparsers.add_parser("worker", help="Zpracovávat PDF ze sdílené fronty")
+    worker_parser.add_argument("pdf_folder", help="Složka s PDF (lokální cesta k sdílenému disku)")
+    worker_parser.add_argument("-o", "--export-folder", default=DEFAULT_EXPORT_FOLDER,
+                               help="Sdílená složka pro shardy a cache")
+    worker_parser.add_argument("--db")
+    worker_parser.add_argument("--worker-id", help="Výchozí: <hostname>-<pid>")
+    worker_parser.add_argument("--lease", type=float, default=600,
+                               help="Délka lease v sekundách (heartbeat každou třetinu)")
+    worker_parser.add_argument("--budget", type=float, metavar="USD",
+                               help="Limit nákladů tohoto workera")
+    worker_parser.add_argument("--output-mode", choices=["tsv", "tool"])
+    worker_parser.add_argument("--fan-out-tables", action="store_true")
+    worker_parser.add_argument("--local-tables", action="store_true")
+    worker_parser.add_argument("--pre-scan-confidence", type=float, metavar="0-1")
+    worker_parser.add_argument("--response-cache", action="store_true")
+    worker_parser.set_defaults(func=cmd_worker)
+
+    # bench
+    bench_parser = subparsers.add_parser("bench", help="Výkonnostní benchmarky")
+    bench_parser.add_argument("name", choices=["startup", "merge", "parse", "projection", "memory"], help="Název benchmarku")
+    bench_parser.add_argument("--runs", type=int, default=5, help="Počet opakování")
+    bench_parser.add_argument("--limit", type=float, default=0.5,
+                              help="Maximální povolený medián v sekundách")
+    bench_parser.add_argument("--rows", type=int, default=60,
+                              help="Počet odhadů na studii (merge, projection)")
+    bench_parser.add_argument("--responses", metavar="DIR",
+                              help="Složka s nahranými odpověďmi *.txt (parse; jinak syntetické)")
+    bench_parser.add_argument("--papers", type=int, default=500,
+                              help="Počet syntetických článků (memory)")
+    bench_parser.set_defaults(func=cmd_bench)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    """Vstupní bod CLI"""
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
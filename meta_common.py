@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sdílené pomocné funkce pro headless spouštění meta-analýzy.
+
+Modul záměrně importuje jen standardní knihovnu, aby `meta_cli.py --help`
+a údržba cache startovaly bez načítání pandas/PyPDF2/anthropic.
+"""
+
+import importlib
+import importlib.util
+import json
+import math
+import os
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Aktuální verze analyzátoru, kterou používá CLI
+ANALYZER_SCRIPT = Path(__file__).resolve().parent / "INFLATION_1_6-PDF_all-CACHE.py"
+ANALYZER_MODULE_NAME = "inflation_analyzer"
+
+# Klíče konfigurace a jejich výchozí hodnoty
+CONFIG_DEFAULTS: Dict[str, Any] = {
+    "CLAUDE_API_KEY": None,
+    "SCOPUS_API_KEY": None,
+    "CLAUDE_MODEL": "claude-opus-4-20250514",
+    "MODELS": {},
+    "BUDGET_USD": None,
+    "OUTPUT_MODE": "tsv",
+    "FAN_OUT_TABLES": False,
+    "LOCAL_TABLES": False,
+    "PRE_SCAN_CONFIDENCE": 0.8,
+    "RESULTS_FORMAT": "auto",
+    "DEDUP": "link",
+    "RESPONSE_CACHE": False,
+}
+
+# Proměnná prostředí s cestou ke konfiguračnímu souboru
+CONFIG_ENV_VAR = "META_CONFIG"
+
+# Slova, čísla a jednotlivé ostatní znaky (interpunkce, řecká písmena, ...)
+_TOKEN_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def load_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """Načte konfiguraci: výchozí hodnoty < JSON soubor < proměnné prostředí"""
+    config = dict(CONFIG_DEFAULTS)
+
+    path = config_path or os.environ.get(CONFIG_ENV_VAR)
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"Konfigurační soubor {path} musí obsahovat JSON objekt")
+        config.update(data)
+
+    for key in CONFIG_DEFAULTS:
+        value = os.environ.get(key)
+        if value is None:
+            continue
+        if isinstance(CONFIG_DEFAULTS[key], dict):
+            # Slovníkové hodnoty (např. MODELS) se v prostředí předávají jako JSON
+            value = json.loads(value)
+        config[key] = value
+
+    return config
+
+
+class _LazyModule:
+    """Zástupce modulu, který se naimportuje až při prvním přístupu k atributu
+
+    Na rozdíl od importlib.util.LazyLoader je bezpečný při souběžném prvním
+    přístupu z více vláken (API workery v pipeline).
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name: str):
+    """Vrátí modul, který se skutečně načte až při prvním přístupu k atributu"""
+    if name in sys.modules:
+        return sys.modules[name]
+    return _LazyModule(name)
+
+
+def count_tokens(text: str) -> int:
+    """Lokální odhad počtu tokenů (BPE dělí dlouhá slova a čísla zhruba po 4 znacích)"""
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PIECES.findall(text))
+
+
+def load_analyzer_module():
+    """Načte skript analyzátoru (název souboru není platný název modulu)"""
+    if ANALYZER_MODULE_NAME in sys.modules:
+        return sys.modules[ANALYZER_MODULE_NAME]
+
+    script_dir = str(ANALYZER_SCRIPT.parent)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+
+    spec = importlib.util.spec_from_file_location(ANALYZER_MODULE_NAME, ANALYZER_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[ANALYZER_MODULE_NAME] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class RunJournal:
+    """Append-only JSONL deník rozhodnutí během běhu (thread-safe)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def log(self, event: str, **fields):
+        """Zapíše jednu událost s časovým razítkem"""
+        import datetime
+        record = {"time": datetime.datetime.now().isoformat(timespec='seconds'), "event": event}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""
+Detekce duplicitních článků a verzí téže studie před voláním API.
+
+Korpusy ze Scopusu a Google Scholar často obsahují stejný PDF pod jiným
+jménem nebo working paper i časopiseckou verzi téže studie. Každá kopie by
+prošla všemi čtyřmi fázemi a dostala vlastní Idstudy.
+
+Otisk článku:
+- MinHash podpis prvních slov normalizovaného textu (shingly po několika slovech),
+- DOI z metadat PDF nebo z první strany,
+- normalizovaný titulek z metadat PDF (pokud nevypadá jako jméno souboru).
+
+Dvojice se stejným DOI, stejným titulkem nebo podobným textem tvoří skupinu;
+kanonickým článkem je verze s DOI (typicky časopisecká), jinak první podle
+jména. Ostatní členové skupiny jsou `duplicate` (prakticky stejný text) nebo
+`version` (jiná verze téže studie).
+"""
+
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from meta_common import lazy_import
+from meta_metadata import find_doi
+
+np = lazy_import("numpy")
+
+# Kolik slov ze začátku článku tvoří otisk a po kolika slovech jsou shingly
+FINGERPRINT_WORDS = 2000
+SHINGLE_WORDS = 4
+
+# MinHash: počet permutací, Mersennovo prvočíslo 2^31-1 (součin se vejde do uint64)
+NUM_PERM = 64
+MINHASH_PRIME = (1 << 31) - 1
+MINHASH_SEED = 20240501
+
+# Odhad Jaccardovy podobnosti textu: kopie / jiná verze téže studie
+DUPLICATE_SIMILARITY = 0.9
+VERSION_SIMILARITY = 0.5
+
+DEDUP_MODES = ("off", "link", "skip")
+
+WORD = re.compile(r'[^\W_]+', re.UNICODE)
+
+# Titulky z metadat, které nic neříkají ("Microsoft Word - paper.docx", "untitled")
+BOGUS_TITLE = re.compile(r'microsoft word|\.docx?\b|\.pdf\b|\.tex\b|untitled|^\s*title\s*$', re.IGNORECASE)
+MIN_TITLE_WORDS = 4
+
+
+@dataclass
+class Fingerprint:
+    """Otisk jednoho článku"""
+    file: str
+    doi: Optional[str]
+    title: Optional[str]
+    pages: int
+    signature: Any      # np.ndarray NUM_PERM, None bez textu
+
+
+@dataclass
+class DuplicateLink:
+    """Článek, který je kopií nebo jinou verzí kanonického článku"""
+    file: str
+    canonical: str
+    relation: str       # 'duplicate' | 'version'
+    reason: str         # 'doi' | 'title' | 'text'
+    similarity: float
+
+
+def normalize_title(title: Any) -> Optional[str]:
+    """Titulek pro porovnání: malá písmena a slova, prázdné pro nic neříkající titulky"""
+    title = str(title or '')
+    if BOGUS_TITLE.search(title):
+        return None
+    words = WORD.findall(title.lower())
+    return ' '.join(words) if len(words) >= MIN_TITLE_WORDS else None
+
+
+def _permutations():
+    """Koeficienty (a, b) univerzálních hashů - pevný seed, podpisy jsou porovnatelné mezi běhy"""
+    rng = np.random.RandomState(MINHASH_SEED)
+    return (rng.randint(1, MINHASH_PRIME, NUM_PERM).astype(np.uint64),
+            rng.randint(0, MINHASH_PRIME, NUM_PERM).astype(np.uint64))
+
+
+def minhash(text: str):
+    """MinHash podpis začátku textu (None, pokud text nemá ani jeden shingle)"""
+    words = WORD.findall(text.lower())[:FINGERPRINT_WORDS]
+    shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(max(len(words) - SHINGLE_WORDS + 1, 0))}
+    if not shingles:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+    a, b = _permutations()
+    return ((hashes[:, None] * a + b) % MINHASH_PRIME).min(axis=0)
+
+
+def similarity(first: Fingerprint, second: Fingerprint) -> float:
+    """Odhad Jaccardovy podobnosti textů z MinHash podpisů"""
+    if first.signature is None or second.signature is None:
+        return 0.0
+    return float((first.signature == second.signature).mean())
+
+
+def fingerprint(file: str, content: Dict[str, Any]) -> Fingerprint:
+    """Otisk z extrahovaného obsahu (PaperDocument nebo slovník)"""
+    metadata = content.get('metadata') or {}
+    pages = content.get('pages') or []
+    doi = next(filter(None, (find_doi(str(value)) for value in metadata.values())), None)
+    if doi is None and pages:
+        doi = find_doi(pages[0])
+    return Fingerprint(file, doi, normalize_title(metadata.get('title')), len(pages),
+                       minhash(content.get('full_text') or ''))
+
+
+def _canonical_order(fp: Fingerprint):
+    """Kanonický je článek s DOI, pak první podle jména souboru"""
+    return (fp.doi is None, fp.file)
+
+
+def find_duplicates(fingerprints: Sequence[Fingerprint],
+                    duplicate_similarity: float = DUPLICATE_SIMILARITY,
+                    version_similarity: float = VERSION_SIMILARITY) -> List[DuplicateLink]:
+    """Seskupí kopie a verze; vrátí odkazy nekanonických článků na kanonický"""
+    fps = [fp for fp in fingerprints if fp.signature is not None or fp.doi or fp.title]
+    parent = list(range(len(fps)))
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Stejné DOI / titulek
+    for attr in ('doi', 'title'):
+        first_with = {}
+        for i, fp in enumerate(fps):
+            value = getattr(fp, attr)
+            if value:
+                parent[root(i)] = root(first_with.setdefault(value, i))
+
+    # Podobný text: všechny dvojice po řádcích matice podpisů
+    with_text = [i for i, fp in enumerate(fps) if fp.signature is not None]
+    if len(with_text) > 1:
+        signatures = np.vstack([fps[i].signature for i in with_text])
+        for row, i in enumerate(with_text[:-1]):
+            similar = np.nonzero((signatures[row + 1:] == signatures[row]).mean(axis=1) >= version_similarity)[0]
+            for j in similar:
+                parent[root(with_text[row + 1 + j])] = root(i)
+
+    groups: Dict[int, List[Fingerprint]] = {}
+    for i, fp in enumerate(fps):
+        groups.setdefault(root(i), []).append(fp)
+
+    links = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        members.sort(key=_canonical_order)
+        canonical = members[0]
+        for fp in members[1:]:
+            score = similarity(fp, canonical)
+            if fp.doi and fp.doi == canonical.doi:
+                reason = 'doi'
+            elif fp.title and fp.title == canonical.title:
+                reason = 'title'
+            else:
+                reason = 'text'
+            relation = 'duplicate' if score >= duplicate_similarity else 'version'
+            links.append(DuplicateLink(fp.file, canonical.file, relation, reason, round(score, 3)))
+    return sorted(links, key=lambda link: (link.canonical, link.file))
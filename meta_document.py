@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+Kompaktní reprezentace extrahovaného článku.
+
+Text všech stran je uložen jednou v jednom řetězci (strany oddělené '\\n')
+a pole offsetů určuje začátky stran. `full_text` je přímo tento buffer,
+strany, sekce a tabulky jsou řezy počítané až při přístupu (sekce a tabulky
+se ukládají jen jako rozsahy). Index čísel (evidence) se staví líně a do
+pickle cache se neukládá.
+
+Objekt se chová jako dřívější slovník obsahu: `doc['pages']`, `doc.get(...)`,
+`'evidence' in doc`, takže kód analyzátoru se nemusí měnit.
+"""
+
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from meta_evidence import EvidenceIndex
+
+# Klíče, které dokument poskytuje jako slovník
+FIELDS = ("full_text", "pages", "metadata", "sections", "tables", "references",
+          "appendix_page", "appendix_offset", "text_stats", "evidence")
+
+
+class PageView(Sequence):
+    """Strany dokumentu jako řezy bufferu (list-kompatibilní, bez kopie při uložení)"""
+    __slots__ = ("_doc",)
+
+    def __init__(self, doc: "PaperDocument"):
+        self._doc = doc
+
+    def __len__(self) -> int:
+        return len(self._doc._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("page index out of range")
+        offsets = self._doc._offsets
+        return self._doc._buffer[offsets[index]:offsets[index + 1] - 1]
+
+    def __repr__(self) -> str:
+        return f"<PageView {len(self)} stran>"
+
+
+class PaperDocument:
+    """Text článku v jednom bufferu + offsety stran, ostatní pohledy na vyžádání"""
+    __slots__ = ("_buffer", "_offsets", "_section_spans", "_table_spans", "_evidence", "_extras",
+                 "metadata", "references", "appendix_page", "appendix_offset", "text_stats")
+
+    def __init__(self, buffer: str, offsets: array, metadata: Optional[Dict] = None,
+                 section_spans: Optional[Dict[str, Tuple[int, int]]] = None,
+                 table_spans: Optional[List[Tuple[int, int]]] = None,
+                 references: str = '', appendix_page: Optional[int] = None,
+                 appendix_offset: Optional[int] = None, text_stats: Optional[Dict] = None):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._section_spans = dict(section_spans or {})
+        self._table_spans = list(table_spans or [])
+        self._evidence = None
+        self._extras: Dict[str, Any] = {}
+        self.metadata = metadata or {}
+        self.references = references
+        self.appendix_page = appendix_page
+        self.appendix_offset = appendix_offset
+        self.text_stats = text_stats or {}
+
+    @classmethod
+    def from_pages(cls, pages: List[str], **fields) -> "PaperDocument":
+        """Dokument ze seznamu stran (buffer = strany spojené '\\n')"""
+        offsets = array('q', [0])
+        for page in pages:
+            offsets.append(offsets[-1] + len(page) + 1)
+        return cls('\n'.join(pages), offsets, **fields)
+
+    # --- pohledy ---
+
+    @property
+    def full_text(self) -> str:
+        return self._buffer
+
+    @property
+    def pages(self) -> PageView:
+        return PageView(self)
+
+    @property
+    def sections(self) -> Dict[str, str]:
+        return {name: self._buffer[start:end] for name, (start, end) in self._section_spans.items()}
+
+    @property
+    def tables(self) -> List[str]:
+        return [self._buffer[start:end] for start, end in self._table_spans]
+
+    @property
+    def evidence(self) -> EvidenceIndex:
+        if self._evidence is None:
+            self._evidence = EvidenceIndex.from_pages(self.pages)
+        return self._evidence
+
+    def set_spans(self, section_spans: Dict[str, Tuple[int, int]], table_spans: List[Tuple[int, int]]):
+        """Rozsahy sekcí a tabulek v bufferu (počítá je analyzátor nad hotovým textem)"""
+        self._section_spans = dict(section_spans)
+        self._table_spans = list(table_spans)
+
+    # --- slovníkové rozhraní ---
+
+    def __getitem__(self, key: str):
+        if key in FIELDS:
+            return getattr(self, key)
+        return self._extras[key]
+
+    def __setitem__(self, key: str, value):
+        if key == "evidence":
+            self._evidence = value
+        elif key in FIELDS and key not in ("full_text", "pages", "sections", "tables"):
+            setattr(self, key, value)
+        elif key in FIELDS:
+            raise KeyError(f"{key} je pohled na buffer, nelze přepsat")
+        else:
+            self._extras[key] = value
+
+    def __contains__(self, key) -> bool:
+        return key in FIELDS or key in self._extras
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def keys(self) -> List[str]:
+        return list(FIELDS) + list(self._extras)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    # --- pickle: jen buffer, offsety a rozsahy ---
+
+    def __getstate__(self):
+        return {
+            "buffer": self._buffer,
+            "offsets": self._offsets.tobytes(),
+            "section_spans": self._section_spans,
+            "table_spans": self._table_spans,
+            "extras": self._extras,
+            "metadata": self.metadata,
+            "references": self.references,
+            "appendix_page": self.appendix_page,
+            "appendix_offset": self.appendix_offset,
+            "text_stats": self.text_stats,
+        }
+
+    def __setstate__(self, state):
+        offsets = array('q')
+        offsets.frombytes(state["offsets"])
+        self.__init__(state["buffer"], offsets, metadata=state["metadata"],
+                      section_spans=state["section_spans"], table_spans=state["table_spans"],
+                      references=state["references"], appendix_page=state["appendix_page"],
+                      appendix_offset=state["appendix_offset"], text_stats=state["text_stats"])
+        self._extras = state["extras"]
+
+    def __repr__(self) -> str:
+        return f"<PaperDocument {len(self.pages)} stran, {len(self._buffer):,} znaků>"
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+"""
+Odhad nákladů a doby běhu bez jediného API volání (--dry-run).
+
+Každé PDF se extrahuje (nebo načte z cache), pro každou fázi se sestaví
+přesně ty parametry požadavku, které by odešla analýza, a tokeny se
+spočítají lokálně. Document 3 jde stejnou cestou jako běh: příloha podle
+lokálního pre-scanu, mřížky (--local-tables) i fan-out po skupinách tabulek.
+Výsledek je odhad per článek i celkem: vstupní/výstupní tokeny, dolary
+a doba běhu při nastaveném rate limitu; cesty závislé na odpovědích modelu
+(NOT_MODELLED) se jen vypíšou.
+"""
+
+import datetime
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from meta_common import count_tokens, lazy_import, load_analyzer_module
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# Fáze v pořadí, v jakém je volá analyze_pdf_optimized
+STAGES = ("pre_scan", "metadata", "structure", "results")
+
+# Předpokládaný počet řádků Document 3 (skutečný počet zná až pre-scan)
+DEFAULT_RESULT_ROWS = 6
+
+# Prefix kratší než tohle API necachuje (platí pro Sonnet i Opus)
+MIN_CACHEABLE_TOKENS = 1024
+
+# Cesty skutečného běhu, které odhad nepočítá (závisí na odpovědích modelu)
+NOT_MODELLED = ("fallback na jiný model", "pokračování useknuté odpovědi", "opravný prompt",
+                "doplnění chybějících lokací", "návrat z mřížek k běžné extrakci")
+
+# Přibližná rychlost generování a fixní režie jednoho požadavku
+OUTPUT_TOKENS_PER_SECOND = {
+    "claude-opus-4-20250514": 30.0,
+    "claude-3-opus-20240229": 25.0,
+    "claude-3-5-sonnet-20241022": 60.0,
+}
+DEFAULT_OUTPUT_TOKENS_PER_SECOND = 30.0
+INPUT_TOKENS_PER_SECOND = 5000.0
+REQUEST_OVERHEAD_SECONDS = 2.0
+
+
+def _prompt_tokens(params: Dict[str, Any]) -> Dict[str, int]:
+    """Rozdělí vstup požadavku na cachovaný prefix (system) a zbytek"""
+    system_tokens = sum(count_tokens(block["text"]) for block in params["system"])
+    message_tokens = sum(count_tokens(m["content"]) for m in params["messages"])
+    # Definice nástrojů (režim tool) se posílají jako součást vstupu
+    message_tokens += sum(count_tokens(json.dumps(tool)) for tool in params.get("tools", []))
+    if system_tokens >= MIN_CACHEABLE_TOKENS:
+        return {"input": message_tokens, "cache_write": system_tokens}
+    return {"input": system_tokens + message_tokens, "cache_write": 0}
+
+
+def _table_tokens(columns: List[str], rows: int) -> int:
+    """TSV hlavička + řádky s typickými číselnými hodnotami"""
+    return count_tokens("\t".join(columns)) + rows * count_tokens("\t".join(["0.99"] * len(columns)))
+
+
+def _expected_output_tokens(columns: List[str], doc_type: str, result_rows: int,
+                            row_columns: Optional[List[str]] = None) -> int:
+    """Odhad výstupu (pre-scan vrací jen krátkou větu)
+
+    S `row_columns` jde o kompaktní tvar: ostatní sloupce jednou v @DEFAULTS,
+    v @ROWS jen `row_columns`.
+    """
+    if doc_type == "pre_scan":
+        return 50
+    if doc_type != "results":
+        return 50 + _table_tokens(columns, 1)
+    if row_columns:
+        defaults = [c for c in columns if c not in row_columns]
+        return 50 + _table_tokens(defaults, 1) + _table_tokens(row_columns, result_rows)
+    return 50 + _table_tokens(columns, result_rows)
+
+
+def _request_seconds(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Odhad doby jednoho požadavku"""
+    speed = OUTPUT_TOKENS_PER_SECOND.get(model, DEFAULT_OUTPUT_TOKENS_PER_SECOND)
+    return REQUEST_OVERHEAD_SECONDS + input_tokens / INPUT_TOKENS_PER_SECOND + output_tokens / speed
+
+
+def _results_requests(analyzer, analyzer_module, pdf_content: Dict,
+                      locations: Optional[Dict[str, int]], result_rows: int) -> Dict[str, Any]:
+    """Požadavky Document 3 stejnou cestou jako analyze_pdf_optimized
+
+    Příloha se posílá, když na ni ukazuje lokální pre-scan. Vrací režim
+    (single / grids / fan-out), přílohu a seznam (params, výstupní tokeny);
+    u fan-outu první požadavek zapíše system prompt do cache, ostatní z ní čtou.
+    """
+    include_appendix = bool(analyzer.appendix_locations(pdf_content, locations))
+    system_prompt, user_prompt = analyzer.create_optimized_prompts(pdf_content, "results", include_appendix)
+    columns = analyzer_module.STAGE_COLUMNS["results"]
+    # Kompaktní tvar Document 3 platí jen pro TSV, tool mode vrací plné řádky
+    row_columns = analyzer_module.COMPACT_ROW_COLUMNS if analyzer.output_mode == "tsv" else None
+    plan = {"mode": "single", "appendix": include_appendix}
+
+    if analyzer.local_tables and analyzer.output_mode == "tsv":
+        grids = analyzer.results_grids(pdf_content, include_appendix)
+        if grids:
+            grid_columns = analyzer_module.GRID_COLUMNS
+            prompt = analyzer_module.grid_label_prompt(user_prompt, grids)
+            output_tokens = _expected_output_tokens(columns + grid_columns, "results", result_rows,
+                                                    row_columns + grid_columns)
+            plan.update(mode="grids", requests=[
+                (analyzer.build_request_params(system_prompt, prompt, "results"), output_tokens)])
+            return plan
+
+    groups = analyzer.table_groups(pdf_content, include_appendix) if analyzer.fan_out_tables else []
+    if groups:
+        # Výsledky se rozdělí mezi skupiny tabulek, textový požadavek vrátí jen hlavičku
+        group_rows = -(-result_rows // len(groups))
+        fan_system, prompts = analyzer.fan_out_prompts(pdf_content, groups, include_appendix)
+        plan.update(mode=f"fan-out {len(prompts)}", requests=[
+            (analyzer.build_request_params(fan_system, prompt, "results"),
+             _expected_output_tokens(columns, "results", group_rows if i < len(groups) else 0, row_columns))
+            for i, prompt in enumerate(prompts)])
+        return plan
+
+    output_tokens = _expected_output_tokens(columns, "results", result_rows, row_columns)
+    plan["requests"] = [(analyzer.build_request_params(system_prompt, user_prompt, "results"), output_tokens)]
+    return plan
+
+
+def _add_request(row: Dict[str, Any], analyzer_module, doc_type: str, params: Dict[str, Any],
+                 output_tokens: int, cache_read: bool = False) -> float:
+    """Přičte jeden požadavek k odhadu článku, vrací jeho odhadovanou dobu"""
+    tokens = _prompt_tokens(params)
+    cache_read_tokens = tokens["cache_write"] if cache_read else 0
+    cache_write_tokens = 0 if cache_read else tokens["cache_write"]
+
+    cost = analyzer_module.CostEstimate()
+    cost.add_usage(params["model"], input_tokens=tokens["input"], output_tokens=output_tokens,
+                   cache_write_tokens=cache_write_tokens, cache_read_tokens=cache_read_tokens)
+
+    row[f"{doc_type} Tokens"] = row.get(f"{doc_type} Tokens", 0) + tokens["input"] + tokens["cache_write"]
+    row[f"{doc_type} Output Tokens"] = row.get(f"{doc_type} Output Tokens", 0) + output_tokens
+    row["Input Tokens"] += tokens["input"]
+    row["Cache Write Tokens"] += cache_write_tokens
+    row["Cache Read Tokens"] += cache_read_tokens
+    row["Output Tokens"] += output_tokens
+    row["Requests"] += 1
+    row["Cost USD"] += cost.calculate_cost()
+    return _request_seconds(params["model"], tokens["input"] + tokens["cache_write"], output_tokens)
+
+
+def estimate_paper(analyzer, analyzer_module, pdf_path: str,
+                   result_rows: int = DEFAULT_RESULT_ROWS) -> Dict[str, Any]:
+    """Odhad jednoho článku - prompty sestaví analyzátor, nic se neodesílá"""
+    pdf_content = analyzer.extract_pdf_content_enhanced(pdf_path)
+    row: Dict[str, Any] = {
+        "File": os.path.basename(pdf_path),
+        "Pages": len(pdf_content.get("pages", [])),
+        "Chars": len(pdf_content.get("full_text", "")),
+        "Removed Tokens": pdf_content.get("text_stats", {}).get("saved_tokens", 0),
+        "Input Tokens": 0,
+        "Cache Write Tokens": 0,
+        "Cache Read Tokens": 0,
+        "Output Tokens": 0,
+        "Requests": 0,
+        "Cost USD": 0.0,
+        "API Seconds": 0.0,
+        "Document 3": "",
+        "Appendix": False,
+    }
+    if not pdf_content.get("full_text"):
+        # Analýza by skončila prázdným řádkem bez API volání
+        return row
+
+    local = analyzer_module.local_pre_scan(pdf_content.get("pages") or [])
+    row["Local Pre-scan Count"] = local.count
+    row["Local Pre-scan Confidence"] = local.confidence
+    for doc_type in STAGES[:-1]:
+        # Jistý lokální pre-scan nahradí API volání Document 0
+        if doc_type == "pre_scan" and local.count and local.confidence >= analyzer.pre_scan_confidence:
+            continue
+        # Lokální autor, rok, DOI a časopis nahradí Document 1 (zbytek jde do Document 2)
+        if doc_type == "metadata":
+            plan = analyzer.metadata_plan(pdf_content)
+            row["Document 1"] = plan.mode
+            if plan.skip:
+                continue
+        system_prompt, user_prompt = analyzer.create_optimized_prompts(pdf_content, doc_type)
+        params = analyzer.build_request_params(system_prompt, user_prompt, doc_type)
+        # Každá fáze vypisuje jen své sloupce (STAGE_COLUMNS)
+        columns = analyzer_module.STAGE_COLUMNS.get(doc_type, analyzer_module.META_ANALYSIS_COLUMNS)
+        output_tokens = _expected_output_tokens(columns, doc_type, result_rows)
+        row["API Seconds"] += _add_request(row, analyzer_module, doc_type, params, output_tokens)
+
+    plan = _results_requests(analyzer, analyzer_module, pdf_content, local.locations, result_rows)
+    row["Document 3"] = plan["mode"]
+    row["Appendix"] = plan["appendix"]
+    seconds = [_add_request(row, analyzer_module, "results", params, output_tokens, cache_read=i > 0)
+               for i, (params, output_tokens) in enumerate(plan["requests"])]
+    # Fan-out: první požadavek běží sám, ostatní souběžně (TABLE_FAN_OUT_WORKERS)
+    parallel = min(analyzer_module.TABLE_FAN_OUT_WORKERS, max(len(seconds) - 1, 1))
+    row["API Seconds"] += seconds[0] + sum(seconds[1:]) / parallel
+    return row
+
+
+def _prefetch(pdf_files: List[Path], export_folder: str, extract_workers: int):
+    """Paralelně naplní cache extrakce (stejně jako pipeline)"""
+    from meta_pipeline import extract_pool, prefetch_pdf
+    with extract_pool(export_folder, extract_workers) as pool:
+        futures = [pool.submit(prefetch_pdf, str(p)) for p in pdf_files]
+        for future, pdf_path in zip(futures, pdf_files):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"❌ Předextrakce {pdf_path.name} selhala: {e}")
+
+
+def dry_run(pdf_folder: str, export_folder: str, model_config: Optional[Dict[str, str]] = None,
+            extract_workers: int = 0, api_workers: int = 1,
+            result_rows: int = DEFAULT_RESULT_ROWS,
+            budget_usd: Optional[float] = None, output_mode: str = "tsv",
+            pre_scan_confidence: Optional[float] = None,
+            fan_out_tables: bool = False, local_tables: bool = False) -> Optional[str]:
+    """Odhadne celý běh nad složkou a uloží Excel s odhadem; vrací jeho cestu"""
+    analyzer_module = load_analyzer_module()
+    os.makedirs(export_folder, exist_ok=True)
+    # Bez API klíče - jakýkoli pokus o volání API by selhal
+    analyzer = analyzer_module.OptimizedPDFAnalyzer(None, export_folder, model_config=model_config,
+                                                    output_mode=output_mode, fan_out_tables=fan_out_tables,
+                                                    local_tables=local_tables)
+    if pre_scan_confidence is not None:
+        analyzer.pre_scan_confidence = pre_scan_confidence
+
+    pdf_files = sorted(Path(pdf_folder).glob("*.pdf"))
+    if not pdf_files:
+        print(f"❌ Žádné PDF v {pdf_folder}")
+        return None
+
+    start = time.perf_counter()
+    if extract_workers > 0:
+        _prefetch(pdf_files, export_folder, extract_workers)
+
+    rows = []
+    for pdf_path in pdf_files:
+        try:
+            rows.append(estimate_paper(analyzer, analyzer_module, str(pdf_path), result_rows))
+        except Exception as e:
+            logger.error(f"❌ Odhad {pdf_path.name} selhal: {e}")
+    extract_seconds = time.perf_counter() - start
+
+    per_paper = pd.DataFrame(rows)
+    requests = int(per_paper["Requests"].sum())
+    rpm = analyzer.rate_limiter.requests_per_minute
+    # Fáze jednoho článku běží za sebou, články paralelně přes API workery;
+    # rate limit dává spodní hranici celé doby
+    wall_seconds = max(per_paper["API Seconds"].sum() / max(api_workers, 1), requests * 60 / rpm)
+    total_cost = float(per_paper["Cost USD"].sum())
+
+    total = pd.DataFrame([{
+        "Papers": len(per_paper),
+        "Requests": requests,
+        "Input Tokens": int(per_paper["Input Tokens"].sum()),
+        "Cache Write Tokens": int(per_paper["Cache Write Tokens"].sum()),
+        "Cache Read Tokens": int(per_paper["Cache Read Tokens"].sum()),
+        "Output Tokens": int(per_paper["Output Tokens"].sum()),
+        "Cost USD": round(total_cost, 4),
+        "Wall Time (min)": round(wall_seconds / 60, 1),
+        "API Workers": api_workers,
+        "Requests per Minute": rpm,
+        "Assumed Result Rows": result_rows,
+        "Fan-out Papers": int(per_paper["Document 3"].str.startswith("fan-out").sum()),
+        "Grid Papers": int((per_paper["Document 3"] == "grids").sum()),
+        "Appendix Papers": int(per_paper["Appendix"].sum()),
+        "Not Modelled": ", ".join(NOT_MODELLED),
+        "Extraction Seconds": round(extract_seconds, 1),
+    }])
+    per_paper["Cost USD"] = per_paper["Cost USD"].round(4)
+    per_paper["API Seconds"] = per_paper["API Seconds"].round(1)
+
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    excel_path = os.path.join(export_folder, f"dry_run_estimate_{timestamp}.xlsx")
+    with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
+        total.to_excel(writer, sheet_name='Total', index=False)
+        per_paper.to_excel(writer, sheet_name='Per Paper', index=False)
+
+    print(f"\n🧮 DRY RUN - odhad bez API volání ({len(per_paper)} článků)")
+    print(f"  • Požadavky: {requests} (Document 3: fan-out {total.at[0, 'Fan-out Papers']}, "
+          f"mřížky {total.at[0, 'Grid Papers']}, s přílohou {total.at[0, 'Appendix Papers']} článků)")
+    print(f"  • Input tokens: {int(per_paper['Input Tokens'].sum()):,} "
+          f"(+ cache write {int(per_paper['Cache Write Tokens'].sum()):,}, "
+          f"cache read {int(per_paper['Cache Read Tokens'].sum()):,})")
+    print(f"  • Output tokens: {int(per_paper['Output Tokens'].sum()):,} "
+          f"(předpoklad {result_rows} výsledků na článek)")
+    print(f"  • Náklady: ${total_cost:.2f}")
+    print(f"  • Nemodelováno: {', '.join(NOT_MODELLED)}")
+    print(f"  • Doba běhu: ~{wall_seconds / 60:.1f} min ({api_workers} API vláken, {rpm} req/min)")
+    if budget_usd is not None and total_cost > budget_usd:
+        print(f"  ⚠️ Odhad překračuje rozpočet ${budget_usd:.2f} - budget governor bude šetřit")
+    print(f"  • Odhad uložen: {excel_path}")
+    return excel_path
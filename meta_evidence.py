@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lokální index čísel v textu článku pro ověření extrahovaných hodnot.
+
+Při extrakci PDF se každé číslo v textu uloží pod normalizovaným klíčem
+(Unicode minus, desetinná čárka, procenta) spolu se stranou, řádkem
+a okolím. Ověření hodnoty je pak jen vyhledání ve slovníku, bez API volání:
+
+- verbatim:  hodnota je v textu přesně tak, jak ji model vrátil,
+- scaled:    hodnota je v textu po přepočtu (procenta, čtvrtletí -> rok),
+- not_found: hodnota v textu není - kandidát na ruční kontrolu.
+"""
+
+import re
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Výsledky ověření
+VERBATIM = 'verbatim'
+SCALED = 'scaled'
+NOT_FOUND = 'not_found'
+
+# Přepočty mezi zápisem v textu a extrahovanou hodnotou:
+# procenta <-> desetinné číslo, čtvrtletní <-> roční míra
+SCALE_FACTORS = (Decimal(100), Decimal('0.01'), Decimal(4), Decimal('0.25'), Decimal(400), Decimal('0.0025'))
+
+# Varianty minus a pomlček, které PDF extrakce vrací místo '-'
+_MINUS_CHARS = str.maketrans({'−': '-', '–': '-', '—': '-', '‐': '-', '‑': '-',
+                              '﹣': '-', '－': '-'})
+
+# Číslo s volitelným znaménkem, desetinnou tečkou/čárkou a procentem
+_NUMBER = re.compile(r'(?<![\w.,])(-?)(\d+(?:[.,]\d+)*|[.,]\d+)(\s?%)?')
+
+# Kolik znaků okolí se ukládá k výskytu
+CONTEXT_CHARS = 40
+
+
+@dataclass(frozen=True)
+class Evidence:
+    """Jeden výskyt čísla v textu článku"""
+    page: int
+    line: int
+    raw: str
+    context: str
+
+
+def _normalize_number(digits: str) -> Optional[str]:
+    """Zápis čísla na tečkovou notaci; '1,000' je tisíc, '0,99' je desetinná čárka"""
+    if ',' in digits and '.' in digits:
+        digits = digits.replace(',', '')                       # 1,234.5
+    elif ',' in digits:
+        parts = digits.split(',')
+        if len(parts) > 2 or (len(parts[-1]) == 3 and parts[0] not in ('', '0')):
+            digits = digits.replace(',', '')                   # 1,000 / 12,345,678
+        else:
+            digits = digits.replace(',', '.')                  # 0,99
+    if digits.count('.') > 1:
+        return None                                            # datum, číslo sekce
+    return digits
+
+
+def parse_number(token: str) -> Optional[str]:
+    """Buňka tabulky jako číslo v tečkové notaci ('−4,5%' -> '-4.5'), jinak None"""
+    text = token.strip().translate(_MINUS_CHARS).strip('()[]*†‡').rstrip('%').strip()
+    match = _NUMBER.fullmatch(text)
+    if not match or match.group(3):
+        return None
+    digits = _normalize_number(match.group(2))
+    return None if digits is None else match.group(1) + digits
+
+
+def number_key(value) -> Optional[str]:
+    """Kanonický klíč čísla (bez koncových nul, '-0' == '0'); None pro ne-čísla"""
+    if isinstance(value, Decimal):
+        number = value
+    else:
+        text = str(value).strip().translate(_MINUS_CHARS).rstrip('%').strip()
+        try:
+            number = Decimal(text)
+        except InvalidOperation:
+            return None
+    if not number.is_finite():
+        return None
+    if number == 0:
+        return '0'
+    return format(number.normalize(), 'f')
+
+
+class EvidenceIndex:
+    """Číslo (normalizovaný klíč) -> výskyty v textu; vyhledání je O(1)"""
+
+    def __init__(self):
+        self._entries: Dict[str, List[Evidence]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _add(self, key: Optional[str], evidence: Evidence):
+        if key is not None:
+            self._entries.setdefault(key, []).append(evidence)
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[str]) -> "EvidenceIndex":
+        """Index ze stran článku (čísla stran od 1)"""
+        index = cls()
+        for page_num, page_text in enumerate(pages, 1):
+            for line_num, line in enumerate(page_text.translate(_MINUS_CHARS).split('\n'), 1):
+                for match in _NUMBER.finditer(line):
+                    digits = _normalize_number(match.group(2))
+                    if digits is None:
+                        continue
+                    start, end = match.span()
+                    evidence = Evidence(page_num, line_num, match.group(0).strip(),
+                                        line[max(0, start - CONTEXT_CHARS):end + CONTEXT_CHARS].strip())
+                    index._add(number_key(match.group(1) + digits), evidence)
+        return index
+
+    def find(self, value) -> List[Evidence]:
+        """Výskyty přesně této hodnoty"""
+        key = number_key(value)
+        return self._entries.get(key, []) if key is not None else []
+
+    def lookup(self, value) -> Tuple[str, Optional[Evidence]]:
+        """Ověří hodnotu: (verbatim|scaled|not_found, první nalezený výskyt)"""
+        key = number_key(value)
+        if key is None:
+            return NOT_FOUND, None
+        if key in self._entries:
+            return VERBATIM, self._entries[key][0]
+        number = Decimal(key)
+        for factor in SCALE_FACTORS:
+            scaled = self._entries.get(number_key(number * factor))
+            if scaled:
+                return SCALED, scaled[0]
+        return NOT_FOUND, None
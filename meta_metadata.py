@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lokální extrakce bibliografických metadat (Document 1 bez API).
+
+Zdroje, od nejspolehlivějšího:
+- XMP metadata PDF (prism:doi, prism:publicationName, prism:coverDate, dc:creator),
+- informační slovník PDF (/Author, /doi, /Subject s citací časopisu),
+- DOI na prvních stranách,
+- citační řádek časopisu v záhlaví ("Journal of Monetary Economics 58 (2011) 123-145")
+  a copyright řádek pro rok.
+
+Čte se ze surových stran (před normalizací), protože záhlaví a copyright
+řádky normalizace zahazuje. Výsledek se ukládá do cache spolu s metadaty PDF.
+
+Když jsou Author, Year, DOI a Journal_Name známé lokálně, volání Document 1
+se přeskočí a zbylé studijní sloupce (afiliace, typ modelu, země) se přidají
+do požadavku Document 2. Jinak se Document 1 ptá jen na chybějící sloupce.
+"""
+
+import datetime
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+# Sloupce Document 1, které jde najít lokálně
+LOCAL_METADATA_COLUMNS = ("Author", "DOI", "Journal_Name", "Year")
+
+# Sloupce Document 1, které potřebují text článku - při přeskočení jdou do Document 2
+FOLDED_METADATA_COLUMNS = ("Author_Affiliation", "Base_Model_Type", "Country")
+
+# Kolik prvních stran se prohledává (DOI, citační řádek, copyright)
+FIRST_PAGES = 2
+
+# Kolik řádků na začátku a konci každé strany je záhlaví/zápatí
+EDGE_LINES = 3
+
+DOI_PATTERN = re.compile(r'\b(10\.\d{4,9}/[^\s"<>]+)', re.IGNORECASE)
+
+# Slovo, které má název časopisu obsahovat
+JOURNAL_WORD = re.compile(r'\b(?:Journal|Review|Econometrica|Economica|Economics|Economy|Quarterly|Letters|'
+                          r'Studies|Bulletin|Finance|Policy|Dynamics|Macroeconomics|Annals|Proceedings)\b')
+
+# Název časopisu: slova s velkým písmenem a spojky, nejvýš 10 slov
+_JOURNAL_NAME = r'((?:The\s+)?[A-Z][A-Za-z&.\-]*(?:\s+(?:[A-Z][A-Za-z&.\-]*|of|and|for|in|on|the|&)){0,9})'
+_YEAR = r'((?:19|20)\d\d)'
+
+# "Journal of Monetary Economics 58 (2011) 123-145", "Econometrica, Vol. 79, No. 3 (May, 2011)"
+JOURNAL_VOLUME_YEAR = re.compile(
+    _JOURNAL_NAME + r'\s*,?\s*(?:Vol(?:ume)?\.?\s*)?\d{1,4}(?:\s*\(\d{1,2}\))?(?:\s*,?\s*No\.?\s*\d{1,3})?'
+    r'\s*,?\s*\(\s*(?:[A-Z][a-z]+\.?,?\s*)?' + _YEAR + r'\s*\)')
+
+# "American Economic Review 2011, 101(4): 1-30", "The Review of Economic Studies (2008) 75, 1101-1130"
+JOURNAL_YEAR_VOLUME = re.compile(
+    _JOURNAL_NAME + r'\s*,?\s*(?:' + _YEAR + r'\s*,|\(' + _YEAR + r'\))\s*(?:Vol(?:ume)?\.?\s*)?\d{1,4}\b')
+
+COPYRIGHT_YEAR = re.compile(r'(?:©|\(c\)|copyright)\D{0,40}?' + _YEAR, re.IGNORECASE)
+
+# XMP: jednoduché elementy i atributy ("<prism:doi>..." nebo prism:doi="...")
+XMP_FIELDS = {
+    'doi': ('prism:doi', 'pdfx:doi', 'dc:identifier'),
+    'journal': ('prism:publicationName',),
+    'date': ('prism:coverDate', 'prism:publicationDate', 'prism:coverDisplayDate'),
+}
+XMP_CREATORS = re.compile(r'<dc:creator>(.*?)</dc:creator>', re.DOTALL)
+XMP_LIST_ITEM = re.compile(r'<rdf:li[^>]*>(.*?)</rdf:li>', re.DOTALL)
+
+# Autoři z metadat, kteří nejsou autoři ("Elsevier", "admin", "Microsoft Office User")
+BOGUS_AUTHOR = re.compile(r'elsevier|springer|wiley|oxford|press|admin|user|owner|author|unknown|microsoft|'
+                          r'adobe|\d', re.IGNORECASE)
+
+# Sloupec, kterého se týká blok "### Task" v promptu Document 1
+TASK_COLUMN = re.compile(r'\*\*Column\*\*:\s*`([^`]+)`')
+
+# Oddělovače jmen v /Author ("A; B", "A and B", "A & B")
+NAME_SPLIT = re.compile(r'\s*;\s*|\s+and\s+|\s*&\s*', re.IGNORECASE)
+
+
+@dataclass
+class MetadataPlan:
+    """Jak naložit s Document 1 u jednoho článku"""
+    local: Dict[str, str] = field(default_factory=dict)
+    sources: Dict[str, str] = field(default_factory=dict)
+    api_columns: List[str] = field(default_factory=list)
+    skip: bool = False
+
+    @property
+    def mode(self) -> str:
+        if self.skip:
+            return 'skipped'
+        return 'reduced' if self.local else 'full'
+
+
+def find_doi(text: str) -> Optional[str]:
+    """První DOI v textu (malými písmeny, bez koncové interpunkce)"""
+    match = DOI_PATTERN.search(text or '')
+    return match.group(1).rstrip('.,;:)]}').lower() if match else None
+
+
+def _xmp_value(raw: str, name: str) -> Optional[str]:
+    """Hodnota XMP elementu nebo atributu (u seznamů první položka)"""
+    match = re.search(rf'<{name}[^>]*>(.*?)</{name}>', raw, re.DOTALL) or re.search(rf'{name}="([^"]*)"', raw)
+    if not match:
+        return None
+    items = XMP_LIST_ITEM.findall(match.group(1))
+    value = re.sub(r'<[^>]+>', '', items[0] if items else match.group(1)).strip()
+    return value or None
+
+
+def read_xmp(pdf_reader) -> Dict[str, Any]:
+    """DOI, časopis, datum a autoři z XMP metadat PDF (prázdné, pokud je PDF nemá)"""
+    try:
+        raw = pdf_reader.trailer['/Root']['/Metadata'].get_object().get_data().decode('utf-8', 'ignore')
+    except Exception:
+        return {}
+    xmp = {}
+    for key, names in XMP_FIELDS.items():
+        value = next(filter(None, (_xmp_value(raw, name) for name in names)), None)
+        if value:
+            xmp[key] = value
+    creators = XMP_CREATORS.search(raw)
+    if creators:
+        xmp['creators'] = [re.sub(r'<[^>]+>', '', item).strip() for item in XMP_LIST_ITEM.findall(creators.group(1))]
+    return xmp
+
+
+def _plausible_year(year: Any) -> Optional[str]:
+    """Rok publikace jako text, pokud dává smysl"""
+    try:
+        year = int(str(year)[:4])
+    except ValueError:
+        return None
+    return str(year) if 1950 <= year <= datetime.date.today().year + 1 else None
+
+
+def _split_names(authors: Any) -> List[str]:
+    """Jména autorů ze seznamu nebo z řetězce /Author"""
+    if isinstance(authors, (list, tuple)):
+        parts = [str(a) for a in authors]
+    else:
+        parts = NAME_SPLIT.split(str(authors or ''))
+        # "John Smith, Jane Doe" je seznam, "Smith, John" jedno jméno
+        if len(parts) == 1 and ',' in parts[0]:
+            pieces = [p.strip() for p in parts[0].split(',')]
+            if all(len(p.split()) >= 2 for p in pieces):
+                parts = pieces
+    return [' '.join(p.split()) for p in parts if p.strip()]
+
+
+def _apa_name(name: str) -> Optional[str]:
+    """"John A. Smith" / "Smith, John A." -> "Smith, J." """
+    if BOGUS_AUTHOR.search(name):
+        return None
+    if ',' in name:
+        last, first = (s.strip() for s in name.split(',', 1))
+    else:
+        words = name.split()
+        if len(words) < 2:
+            return None
+        last, first = words[-1], words[0]
+    if not re.match(r'^[^\W\d_]', last) or not re.match(r'^[^\W\d_]', first):
+        return None
+    return f"{last}, {first[0].upper()}."
+
+
+def format_author(authors: Any, year: Optional[str]) -> Optional[str]:
+    """Autor ve tvaru z promptu Document 1: "Smith, J., & Doe, J. (2011)" (bez roku nic)"""
+    if not year:
+        return None
+    names = [_apa_name(name) for name in _split_names(authors)]
+    if not names or None in names:
+        return None
+    listed = names[0] if len(names) == 1 else ', '.join(names[:-1]) + ', & ' + names[-1]
+    return f"{listed} ({year})"
+
+
+def _edge_lines(pages: Iterable[str]) -> List[str]:
+    """Řádky záhlaví a zápatí všech stran"""
+    lines = []
+    for page in pages:
+        filled = [line for line in page.split('\n') if line.strip()]
+        lines.extend(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+    return lines
+
+
+def find_journal(lines: Iterable[str]) -> Optional[Dict[str, str]]:
+    """Název časopisu a rok z citačního řádku"""
+    for line in lines:
+        line = ' '.join(line.split())
+        for pattern in (JOURNAL_VOLUME_YEAR, JOURNAL_YEAR_VOLUME):
+            match = pattern.search(line)
+            if match and JOURNAL_WORD.search(match.group(1)):
+                year = next(group for group in match.groups()[1:] if group)
+                return {'journal': match.group(1).strip(' ,.'), 'year': year}
+    return None
+
+
+def local_metadata(pdf_metadata: Dict[str, Any], raw_pages: List[str]) -> Dict[str, Dict[str, str]]:
+    """Lokálně nalezená pole Document 1: {'fields': {sloupec: hodnota}, 'sources': {sloupec: zdroj}}"""
+    fields: Dict[str, str] = {}
+    sources: Dict[str, str] = {}
+
+    def found(column: str, value: Optional[str], source: str):
+        if value and column not in fields:
+            fields[column] = value
+            sources[column] = source
+
+    xmp = pdf_metadata.get('xmp') or {}
+    first_pages = '\n'.join(raw_pages[:FIRST_PAGES])
+    lines = first_pages.split('\n') + _edge_lines(raw_pages)
+
+    # DOI
+    found('DOI', find_doi(xmp.get('doi', '')), 'xmp')
+    found('DOI', find_doi(pdf_metadata.get('doi', '')), 'info')
+    found('DOI', find_doi(pdf_metadata.get('subject', '')), 'info')
+    found('DOI', find_doi(first_pages), 'text')
+
+    # Časopis a rok
+    found('Journal_Name', xmp.get('journal'), 'xmp')
+    found('Year', _plausible_year(xmp.get('date')), 'xmp')
+    for source, citation_lines in (('info', [str(pdf_metadata.get('subject', ''))]), ('running head', lines)):
+        citation = find_journal(citation_lines)
+        if citation:
+            found('Journal_Name', citation['journal'], source)
+            found('Year', _plausible_year(citation['year']), source)
+    copyright_year = COPYRIGHT_YEAR.search(first_pages)
+    if copyright_year:
+        found('Year', _plausible_year(copyright_year.group(1)), 'copyright')
+
+    # Autor (formát s rokem, jako v promptu)
+    found('Author', format_author(xmp.get('creators'), fields.get('Year')), 'xmp')
+    found('Author', format_author(pdf_metadata.get('author'), fields.get('Year')), 'info')
+
+    return {'fields': fields, 'sources': sources}
+
+
+def plan_metadata(pdf_metadata: Dict[str, Any], stage_columns: List[str], allow_skip: bool = True) -> MetadataPlan:
+    """Přeskočit Document 1 (vše lokálně), zúžit ho na chybějící sloupce, nebo poslat celý"""
+    found = (pdf_metadata or {}).get('local') or {}
+    local = dict(found.get('fields') or {})
+    api_columns = [column for column in stage_columns if column != 'Idstudy' and column not in local]
+    skip = allow_skip and all(column in local for column in LOCAL_METADATA_COLUMNS)
+    return MetadataPlan(local, dict(found.get('sources') or {}), api_columns, skip)
+
+
+def prompt_tasks(prompt: str, columns: Iterable[str]) -> str:
+    """Bloky "### Task" z promptu Document 1, které se týkají daných sloupců"""
+    columns = set(columns)
+    body = prompt.split('## EXTRACTION INSTRUCTIONS', 1)[-1].split('\n## ', 1)[0]
+    selected = []
+    for block in re.split(r'\n(?=### Task )', body):
+        match = TASK_COLUMN.search(block)
+        if match and match.group(1) in columns:
+            selected.append(block.strip())
+    return '\n\n'.join(selected)
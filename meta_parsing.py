@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sdílený striktní parser TSV tabulek z odpovědí modelu.
+
+Jeden průchod přes řádky odpovědi:
+- hlavička se pozná podle názvů sloupců (Idstudy ...), bloků může být víc,
+- ohraničení ``` kódových bloků se přeskakuje,
+- sloupce se mapují podle názvu v hlavičce, ne podle pozice,
+- řádek s jiným počtem buněk než hlavička se nepřijme a zapíše se do diagnostiky,
+- prozaický řádek (bez tabulátoru) ukončí blok; řádek jiné šířky za prázdným
+  řádkem ("Note:\tvalues are annualised.") je próza, ne odmítnutý řádek dat,
+- markdown tabulky (| místo tabulátorů) se převedou a zapíšou do varování,
+- řádky dat se správným počtem buněk jdou rychlou cestou bez dalších testů;
+  u hlavičky s podmnožinou sloupců (projekce fází) se řádek skládá řezy
+  souvislých úseků místo přiřazení po buňkách; ASCII odpověď bez \\r se dělí
+  na řádky split('\\n') místo pomalejšího splitlines.
+
+Kompaktní tvar (Document 3) má dvě sekce: @DEFAULTS s jedním řádkem hodnot
+společných pro celý článek a @ROWS jen se sloupci, které se mezi odhady liší.
+Buňka "=" (nebo sloupec, který v @ROWS chybí) znamená výchozí hodnotu;
+parse_compact řádky rozbalí do plného tvaru.
+"""
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+NA_TOKEN = 'NA'
+
+# Sekce kompaktního tvaru a značka "výchozí hodnota" v buňce
+DEFAULTS_MARKER = '@DEFAULTS'
+ROWS_MARKER = '@ROWS'
+DEFAULT_CELL = '='
+
+# Znaky, které modely přidávají kolem názvů sloupců (markdown)
+_HEADER_STRIP = " \t*`|"
+
+# ASCII znaky, které str.splitlines bere jako konec řádku (kromě \n)
+_ASCII_BREAKS = "\r\x0b\x0c\x1c\x1d\x1e"
+
+
+@dataclass
+class ParseResult:
+    """Řádky v kanonickém pořadí sloupců a diagnostika parsování"""
+    rows: List[List[str]] = field(default_factory=list)
+    header_blocks: int = 0
+    rejected: List[str] = field(default_factory=list)    # odmítnuté řádky dat
+    warnings: List[str] = field(default_factory=list)    # hlavičky s neznámými/chybějícími sloupci
+    stray_tab_lines: int = 0                              # řádky s tabulátorem mimo tabulku
+
+    @property
+    def ok(self) -> bool:
+        """Tabulka nalezena a žádný řádek nebyl odmítnut"""
+        return self.header_blocks > 0 and bool(self.rows) and not self.rejected
+
+    def diagnostics(self) -> List[str]:
+        """Lidsky čitelný souhrn problémů"""
+        messages = list(self.warnings) + list(self.rejected)
+        if self.header_blocks == 0 and self.stray_tab_lines:
+            messages.append(f"nenalezena hlavička tabulky ({self.stray_tab_lines} řádků s tabulátorem)")
+        return messages
+
+    def to_result(self) -> Dict:
+        """Slovník ve formátu, který používá analyzátor ('table_rows' / 'error')"""
+        result: Dict = {'table_rows': self.rows}
+        if not self.rows:
+            result['error'] = 'No valid table rows found'
+        if self.rejected or (self.header_blocks == 0 and self.stray_tab_lines):
+            result['parse_errors'] = self.diagnostics()
+        return result
+
+
+@lru_cache(maxsize=64)
+def _column_index(columns: Tuple[str, ...]) -> Dict[str, int]:
+    """Název sloupce (malými písmeny) -> kanonický index"""
+    return {name.lower(): idx for idx, name in enumerate(columns)}
+
+
+@dataclass(frozen=True)
+class _Header:
+    """Rozpoznaná hlavička bloku"""
+    width: int                                   # počet buněk v řádku
+    unknown: Tuple[str, ...]                     # názvy mimo schéma
+    runs: Optional[Tuple[Tuple[int, int, int, int], ...]]
+    # Souvislé úseky (cíl od, cíl do, zdroj od, zdroj do) pro kopírování řezem;
+    # None = plná hlavička v kanonickém pořadí, řádek se použije beze změny
+
+
+@lru_cache(maxsize=64)
+def _header_cache(columns: Tuple[str, ...]) -> Dict[str, Optional[_Header]]:
+    """Rozpoznané hlavičky podle textu řádku (hlavičky se v odpovědích opakují doslova)"""
+    return {}
+
+
+def _parse_header(line: str, column_index: Dict[str, int]) -> Optional[_Header]:
+    """Hlavička bloku, nebo None, pokud řádek hlavičkou není"""
+    cells = [cell.strip(_HEADER_STRIP) for cell in line.split('\t')]
+    # Levný test na prvním sloupci - datové řádky začínají hodnotou, ne názvem
+    if cells[0].lower() not in column_index:
+        return None
+    names = [cell.lower() for cell in cells]
+    known = [name for name in names if name in column_index]
+    if len(known) < 2 or len(known) * 2 < len([n for n in names if n]):
+        return None
+    mapping = [(pos, column_index[name]) for pos, name in enumerate(names) if name in column_index]
+    unknown = tuple(cell for cell, name in zip(cells, names) if name and name not in column_index)
+    if len(cells) == len(column_index) and all(pos == idx for pos, idx in mapping):
+        return _Header(len(cells), unknown, None)
+    runs: List[List[int]] = []
+    for pos, idx in mapping:
+        if runs and runs[-1][1] == idx and runs[-1][3] == pos:
+            runs[-1][1] += 1
+            runs[-1][3] += 1
+        else:
+            runs.append([idx, idx + 1, pos, pos + 1])
+    return _Header(len(cells), unknown, tuple(tuple(run) for run in runs))
+
+
+def _is_separator(cells: List[str]) -> bool:
+    """Markdown oddělovač |---|---| mezi hlavičkou a daty"""
+    return all(set(cell.strip()) <= set("-:| ") for cell in cells)
+
+
+def _split_lines(text: str) -> List[str]:
+    """Řádky jako str.splitlines, u čistého ASCII s jen \\n rychlejší split('\\n')"""
+    if text.isascii() and not any(char in text for char in _ASCII_BREAKS):
+        return text.split('\n')
+    return text.splitlines()
+
+
+def _pipe_cells(stripped: str) -> Optional[str]:
+    """Řádek markdown tabulky "| a | b |" převedený na TSV (None, pokud to není řádek tabulky)"""
+    if not stripped.startswith('|') or stripped.count('|') < 3:
+        return None
+    return '\t'.join(cell.strip() for cell in stripped.strip('|').split('|'))
+
+
+def parse_tsv(text: str, columns: List[str], fill: Optional[str] = NA_TOKEN) -> ParseResult:
+    """Najde v odpovědi všechny TSV bloky a vrátí řádky namapované na `columns`
+
+    Sloupce, které hlavička neobsahuje, dostanou hodnotu `fill`. Markdown
+    tabulky (| místo tabulátorů) se převedou a zapíšou do varování.
+    """
+    columns = tuple(columns)
+    headers = _header_cache(columns)
+    result = ParseResult()
+    rows = result.rows
+    append_row = rows.append
+    template = [fill] * len(columns)
+    width = 0                   # 0 = žádný otevřený blok
+    runs = None
+    rows_at_gap = -1            # počet řádků při posledním prázdném řádku
+    pipe_lines = 0
+    # Číslo řádku pro diagnostiku: každý řádek rychlé cesty přidá jeden řádek dat,
+    # stačí proto počítat ostatní řádky (bez enumerate v rychlé cestě)
+    other_lines = 0
+    lines = iter(_split_lines(text))
+
+    while True:
+        cells = None
+        if width:
+            # Rychlá cesta: řádky dat se správným počtem buněk v otevřeném bloku
+            if runs is None:
+                for line in lines:
+                    cells = line.split('\t')
+                    if len(cells) != width or line[0] not in '0123456789':
+                        break
+                    append_row(cells)
+                else:
+                    break
+            else:
+                for line in lines:
+                    cells = line.split('\t')
+                    if len(cells) != width or line[0] not in '0123456789':
+                        break
+                    row = template.copy()
+                    for start, stop, source_start, source_stop in runs:
+                        row[start:stop] = cells[source_start:source_stop]
+                    append_row(row)
+                else:
+                    break
+        else:
+            line = next(lines, None)
+            if line is None:
+                break
+        other_lines += 1
+
+        stripped = line.strip()
+        if not stripped:
+            rows_at_gap = len(rows)
+            continue
+        if '\t' not in line:
+            converted = _pipe_cells(stripped) if stripped[0] == '|' else None
+            if converted is None:
+                # Próza i hranice ``` kódového bloku ukončí aktuální tabulku
+                width = 0
+                continue
+            line, cells = converted, None
+            pipe_lines += 1
+        elif stripped.startswith('```'):
+            width = 0
+            continue
+
+        # Datové řádky začínají číslem Idstudy, hlavičku má smysl zkoušet jen u textu
+        if stripped[0] not in '0123456789':
+            found = headers.get(line, False)
+            if found is False:
+                found = headers[line] = _parse_header(line, _column_index(columns))
+            if found is not None:
+                width, runs = found.width, found.runs
+                rows_at_gap = -1
+                result.header_blocks += 1
+                if found.unknown:
+                    result.warnings.append(f"řádek {other_lines + len(rows)}: neznámé sloupce v hlavičce: "
+                                           f"{', '.join(found.unknown)}")
+                continue
+
+        if not width:
+            result.stray_tab_lines += 1
+            continue
+        if cells is None:
+            cells = line.split('\t')
+        if cells[0].strip()[:1] in ('-', ':', '|') and _is_separator(cells):
+            continue
+
+        # Prázdné buňky za koncem řádku (tabulátor navíc) tolerujeme
+        while len(cells) > width and not cells[-1].strip():
+            cells.pop()
+        if len(cells) != width:
+            if rows_at_gap == len(rows):
+                # Po prázdném řádku je řádek jiné šířky próza s tabulátorem ("Note:\t..."), ne useknutá data
+                width = 0
+                result.stray_tab_lines += 1
+            else:
+                result.rejected.append(f"řádek {other_lines + len(rows)}: {len(cells)} sloupců místo {width}")
+            continue
+
+        other_lines -= 1
+        if runs is None:
+            # Plná hlavička v kanonickém pořadí - bez přemapování (hodnoty ořeže až merge)
+            append_row(cells)
+            continue
+        row = template.copy()
+        for start, stop, source_start, source_stop in runs:
+            row[start:stop] = cells[source_start:source_stop]
+        append_row(row)
+
+    if pipe_lines:
+        result.warnings.append(f"markdown tabulka místo TSV ({pipe_lines} řádků s | převedeno)")
+    return result
+
+
+def is_compact(text: str) -> bool:
+    """Odpověď v kompaktním tvaru @DEFAULTS/@ROWS"""
+    return any(line.strip().upper() == ROWS_MARKER for line in text.splitlines())
+
+
+def parse_compact(text: str, columns: List[str]) -> ParseResult:
+    """Rozbalí kompaktní tvar: výchozí hodnoty z @DEFAULTS doplní do řádků z @ROWS"""
+    sections: Dict[str, List[str]] = {DEFAULTS_MARKER: [], ROWS_MARKER: []}
+    current = ROWS_MARKER
+    for line in text.splitlines():
+        marker = line.strip().upper()
+        if marker in sections:
+            current = marker
+            continue
+        sections[current].append(line)
+
+    defaults = parse_tsv('\n'.join(sections[DEFAULTS_MARKER]), columns)
+    result = parse_tsv('\n'.join(sections[ROWS_MARKER]), columns, fill=None)
+    result.header_blocks += defaults.header_blocks
+    result.warnings.extend(defaults.warnings)
+    result.rejected.extend(f"@DEFAULTS {problem}" for problem in defaults.rejected)
+    if len(defaults.rows) > 1:
+        result.warnings.append(f"@DEFAULTS má {len(defaults.rows)} řádků, použit první")
+
+    default_row = defaults.rows[0] if defaults.rows else [NA_TOKEN] * len(columns)
+    for row in result.rows:
+        for idx, value in enumerate(row):
+            if value is None or value.strip() in (DEFAULT_CELL, ''):
+                row[idx] = default_row[idx]
+    return result
+
+
+REPAIR_PROMPT = """The following output was supposed to be a tab-separated table but could not be parsed.
+
+Problems found:
+{problems}
+
+Rewrite it as a valid TSV table. Rules:
+- First line is exactly this header (tab-separated):
+{header}
+- Every data row has exactly {width} tab-separated cells; use NA for missing values
+- If the output has an @DEFAULTS section, copy its values into every row where the cell is "=" or the column is absent
+- Keep every value exactly as in the original output, do not add or invent data
+- Output ONLY the table, no prose and no code fences
+
+ORIGINAL OUTPUT:
+{text}
+"""
+
+
+def build_repair_prompt(text: str, columns: List[str], problems: List[str]) -> str:
+    """Prompt pro levnou opravu formátu (bez obsahu PDF)"""
+    return REPAIR_PROMPT.format(
+        problems='\n'.join(f"- {p}" for p in problems[:20]) or "- unknown",
+        header='\t'.join(columns),
+        width=len(columns),
+        text=text,
+    )
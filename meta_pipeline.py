@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+Producer/consumer pipeline pro zpracování složky PDF.
+
+Procesy (CPU) předextrahují PyPDF2 text, sekce a tabulky do pickle cache,
+zatímco vlákna (I/O) volají API nad dokumenty, které už jsou připravené.
+API workery pak čtou obsah z cache a na extrakci nečekají.
+
+Každý extrakční proces si analyzátor vytvoří jednou (initializer poolu) a
+bez indexu stran - do SQLite indexu zapisuje jen hlavní proces, když
+dokument z cache načte.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from meta_common import load_analyzer_module
+
+logger = logging.getLogger(__name__)
+
+
+# Analyzátor extrakčního procesu (nastaví init_extract_worker)
+_extractor = None
+
+
+def init_extract_worker(export_folder: str):
+    """Initializer procesu: jeden analyzátor pro všechny PDF, bez indexu stran"""
+    global _extractor
+    analyzer_module = load_analyzer_module()
+    _extractor = analyzer_module.OptimizedPDFAnalyzer(None, export_folder, index_pages=False)
+
+
+def extract_pool(export_folder: str, extract_workers: int) -> ProcessPoolExecutor:
+    """Pool extrakčních procesů nad cache exportní složky"""
+    return ProcessPoolExecutor(max_workers=extract_workers, initializer=init_extract_worker,
+                               initargs=(export_folder,))
+
+
+def prefetch_pdf(pdf_path: str) -> Dict[str, Any]:
+    """Worker procesu: extrahuje PDF do cache a vrátí jen krátký souhrn"""
+    start = time.perf_counter()
+    content = _extractor.extract_pdf_content_enhanced(pdf_path)
+    return {
+        'chars': len(content.get('full_text', '')),
+        'pages': len(content.get('pages', [])),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+class PipelineStats:
+    """Hloubky front a vytížení obou stupňů pipeline"""
+
+    def __init__(self, total: int, extract_workers: int, api_workers: int):
+        self.total = total
+        self.extract_workers = extract_workers
+        self.api_workers = api_workers
+        self.extracting = 0   # odesláno do procesů (běží nebo čeká v poolu)
+        self.ready = 0        # extrahováno, čeká na API workera
+        self.in_api = 0       # právě se volá API
+        self.done = 0
+        self.extract_busy = 0.0
+        self.api_busy = 0.0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def extract_submitted(self):
+        """PDF odeslán do extrakčního procesu"""
+        with self._lock:
+            self.extracting += 1
+
+    def extract_finished(self, seconds: float):
+        """Extrakce doběhla, dokument čeká na API"""
+        with self._lock:
+            self.extracting -= 1
+            self.ready += 1
+            self.extract_busy += seconds
+
+    def api_started(self):
+        """API worker převzal dokument"""
+        with self._lock:
+            self.ready -= 1
+            self.in_api += 1
+
+    def api_finished(self, seconds: float):
+        """API worker dokončil dokument"""
+        with self._lock:
+            self.in_api -= 1
+            self.done += 1
+            self.api_busy += seconds
+
+    def utilisation(self) -> Tuple[float, float]:
+        """Vrátí vytížení extrakce a API v procentech"""
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        extract = self.extract_busy / (elapsed * max(self.extract_workers, 1)) * 100
+        api = self.api_busy / (elapsed * max(self.api_workers, 1)) * 100
+        return min(extract, 100.0), min(api, 100.0)
+
+    def format_progress(self) -> str:
+        """Jednořádkový stav pipeline pro výpis průběhu"""
+        extract_util, api_util = self.utilisation()
+        return (f"⚙️ [{self.done}/{self.total}] extrakce: {self.extracting} | "
+                f"připraveno: {self.ready} | API: {self.in_api}/{self.api_workers} | "
+                f"vytížení CPU {extract_util:.0f}% · API {api_util:.0f}%")
+
+
+def run_pipeline(analyzer, pdf_files: List[Path], extract_workers: int = 2,
+                 api_workers: int = 1, lookahead: Optional[int] = None
+                 ) -> Iterator[Tuple[Path, Optional[Any]]]:
+    """Zpracuje PDF dvoustupňově a průběžně vrací (pdf_path, DataFrame nebo None)
+
+    Idstudy se přiděluje podle pořadí souborů, takže nezávisí na tom,
+    v jakém pořadí API workery doběhnou.
+    """
+    pdf_files = [Path(p) for p in pdf_files]
+    lookahead = lookahead or extract_workers + 2 * api_workers
+    base_study_id = analyzer.current_study_id
+    stats = PipelineStats(len(pdf_files), extract_workers, api_workers)
+
+    def analyze(idx: int, pdf_path: Path):
+        stats.api_started()
+        start = time.perf_counter()
+        try:
+            if analyzer.is_paused():
+                return None
+            return analyzer.analyze_pdf_optimized(str(pdf_path), study_id=base_study_id + idx)
+        except Exception as e:
+            logger.error(f"❌ Chyba při zpracování {pdf_path.name}: {e}")
+            return None
+        finally:
+            stats.api_finished(time.perf_counter() - start)
+
+    logger.info(f"⚙️ Pipeline: {extract_workers} extrakčních procesů, {api_workers} API vláken")
+
+    extract_futures = {}
+    api_futures = {}
+    next_idx = 0
+    with extract_pool(analyzer.export_folder, extract_workers) as process_pool, \
+            ThreadPoolExecutor(max_workers=api_workers) as api_pool:
+        try:
+            while next_idx < len(pdf_files) or extract_futures or api_futures:
+                # Udržujeme omezený předstih extrakce před API
+                while next_idx < len(pdf_files) and stats.extracting + stats.ready < lookahead:
+                    future = process_pool.submit(prefetch_pdf, str(pdf_files[next_idx]))
+                    extract_futures[future] = next_idx
+                    stats.extract_submitted()
+                    next_idx += 1
+
+                done, _ = wait(list(extract_futures) + list(api_futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in extract_futures:
+                        idx = extract_futures.pop(future)
+                        try:
+                            seconds = future.result()['seconds']
+                        except Exception as e:
+                            # API worker zkusí extrakci znovu a chybu ošetří sám
+                            logger.error(f"❌ Předextrakce {pdf_files[idx].name} selhala: {e}")
+                            seconds = 0.0
+                        stats.extract_finished(seconds)
+                        api_futures[api_pool.submit(analyze, idx, pdf_files[idx])] = idx
+                    else:
+                        idx = api_futures.pop(future)
+                        yield pdf_files[idx], future.result()
+
+                print(stats.format_progress())
+        finally:
+            # Při předčasném ukončení (např. pauza rozpočtu) nespouštíme zbytek fronty
+            for future in list(extract_futures) + list(api_futures):
+                future.cancel()
+
+    analyzer.current_study_id = base_study_id + len(pdf_files)
+    extract_util, api_util = stats.utilisation()
+    logger.info(f"⚙️ Pipeline hotova: vytížení extrakce {extract_util:.0f}%, API {api_util:.0f}%")
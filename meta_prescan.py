@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lokální pre-scan: odhad počtu inflačních výsledků bez API volání.
+
+Signály:
+- tabulky s inflací v titulku, které jdou rozparsovat na mřížku (řádek = kandidát),
+- zmínky "optimal inflation", "π*", "inflation target" s hodnotou ve stejné
+  větě (procenta nebo desetinné číslo, holá celá čísla jsou čísla sekcí),
+- inflační tabulky a obrázky, které lokálně přečíst nejde.
+
+Jistota (0-1) říká, jak moc se dá počtu věřit. Vysoká je jen tehdy, když jsou
+všechny inflační tabulky čitelné mřížky a v textu není hodnota mimo ně;
+výsledky jen v textu nebo v obrázcích nechávají rozhodnutí na API pre-scanu.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from meta_evidence import number_key, parse_number
+from meta_tables import TABLE_CAPTION_PATTERN, parse_table_grids
+
+# Titulek nebo hlavička tabulky o inflaci
+INFLATION_CAPTION = re.compile(r'inflation|price\s+level|π|\bpi\b', re.IGNORECASE)
+
+# Titulek obrázku na začátku řádku (hodnoty z grafu lokálně nepřečteme)
+FIGURE_CAPTION_PATTERN = re.compile(r'^\s*fig(?:ure|\.)?\s*\d+', re.IGNORECASE)
+
+# Zmínka inflačního výsledku v textu
+INFLATION_MENTION = re.compile(
+    r'(?:optimal|steady[- ]state|long[- ]run|trend|target(?:ed)?)\s+(?:annual\s+)?(?:rate\s+of\s+)?inflation'
+    r'|inflation\s+target|π\s*\*|π\s*\^?\s*opt', re.IGNORECASE)
+
+# Kolik znaků za zmínkou se hledá číslo (nejvýš do konce řádku nebo věty)
+MENTION_WINDOW = 80
+MENTION_STOP = re.compile(r'\n|[.;!?](?=\s|$)')
+
+# Hodnota u zmínky: procenta ("2%", "-0.5 percent") nebo desetinné číslo ("0.02");
+# holé celé číslo je typicky číslo sekce, rovnice nebo ročníku
+MENTION_VALUE = re.compile(r'(?<![\w.])([-−–]?\d+(?:[.,]\d+)?)\s?(?:%|percent\b|per\s+cent\b)'
+                           r'|(?<![\w.])([-−–]?\d*\.\d+)(?![\w.])')
+
+# Letopočty a čísla rovnic/sekcí nejsou výsledky
+YEAR_PATTERN = re.compile(r'^(1[89]|20)\d\d$')
+
+# Váhy jistoty
+GRID_CONFIDENCE = 0.5           # aspoň jedna inflační mřížka
+ALL_TABLES_PARSED = 0.3         # žádná inflační tabulka nezůstala nečitelná
+TEXT_AGREES = 0.1               # číslo z textu je i v mřížce
+TEXT_ONLY_PENALTY = 0.3         # hodnoty z textu mimo mřížky počet jen odhadují
+FIGURE_PENALTY = 0.2            # výsledky mohou být v grafu
+TEXT_ONLY_CONFIDENCE = 0.2      # bez mřížek, jen zmínky v textu
+TEXT_ONLY_STEP = 0.1            # za každou další hodnotu z textu
+TEXT_ONLY_MAX = 0.5
+
+
+@dataclass
+class LocalPreScan:
+    """Lokální odhad Document 0"""
+    count: int
+    confidence: float
+    locations: Dict[str, int] = field(default_factory=dict)
+    signals: Dict[str, int] = field(default_factory=dict)
+
+    def to_result(self) -> Dict[str, Any]:
+        """Stejný tvar jako parsovaná odpověď API pre-scanu"""
+        result: Dict[str, Any] = {'count': self.count, 'source': 'local', 'confidence': self.confidence}
+        if self.locations:
+            result['locations'] = dict(self.locations)
+        return result
+
+
+def _mention_values(pages: List[str]) -> List[str]:
+    """Odlišné hodnoty (normalizované klíče) u inflačních zmínek v textu"""
+    values = []
+    for page_text in pages:
+        for match in INFLATION_MENTION.finditer(page_text):
+            window = page_text[match.end():match.end() + MENTION_WINDOW]
+            stop = MENTION_STOP.search(window)
+            if stop:
+                window = window[:stop.start()]
+            for value in MENTION_VALUE.finditer(window):
+                number = parse_number(value.group(1) or value.group(2))
+                if number is None or YEAR_PATTERN.match(number):
+                    continue
+                key = number_key(number)
+                if key is not None and key not in values:
+                    values.append(key)
+                break
+    return values
+
+
+def local_pre_scan(pages: List[str]) -> LocalPreScan:
+    """Spočítá kandidáty inflačních výsledků z mřížek tabulek a zmínek v textu"""
+    grids = [grid for grid in parse_table_grids(pages)
+             if INFLATION_CAPTION.search(grid.caption) or any(INFLATION_CAPTION.search(h) for h in grid.header)]
+    grid_labels = {grid.label.lower() for grid in grids}
+
+    unparsed_tables = set()
+    figures = 0
+    for page_text in pages:
+        for line in page_text.split('\n'):
+            match = TABLE_CAPTION_PATTERN.match(line)
+            if match and INFLATION_CAPTION.search(match.group(2)):
+                label = f"Table {match.group(1)}".lower()
+                if label not in grid_labels:
+                    unparsed_tables.add(label)
+            elif FIGURE_CAPTION_PATTERN.match(line) and INFLATION_CAPTION.search(line):
+                figures += 1
+
+    locations = {grid.label: len(grid.rows) for grid in grids}
+    grid_values = {number_key(value) for grid in grids for row in grid.rows for value in row}
+    text_values = _mention_values(pages)
+    text_only = [value for value in text_values if value not in grid_values]
+    if text_only:
+        locations['Text'] = len(text_only)
+    count = sum(locations.values())
+
+    if grids:
+        confidence = GRID_CONFIDENCE
+        if not unparsed_tables:
+            confidence += ALL_TABLES_PARSED
+        if len(text_only) < len(text_values):
+            confidence += TEXT_AGREES
+        if text_only:
+            confidence -= TEXT_ONLY_PENALTY
+    elif text_values:
+        confidence = min(TEXT_ONLY_CONFIDENCE + TEXT_ONLY_STEP * (len(text_values) - 1), TEXT_ONLY_MAX)
+    else:
+        confidence = 0.0
+    if figures:
+        confidence -= FIGURE_PENALTY
+
+    signals = {'grids': len(grids), 'grid_rows': sum(len(grid.rows) for grid in grids),
+               'unparsed_tables': len(unparsed_tables), 'figures': figures, 'text_values': len(text_values)}
+    return LocalPreScan(count, round(max(0.0, min(confidence, 1.0)), 2), locations, signals)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+Překódování jednoho sloupce v celém datasetu bez nového běhu všech fází.
+
+Když recenzenti změní pravidlo pro jeden sloupec (Interest_Rate,
+Preferred_Estimate), stačí pro každou studii jeden malý požadavek: kontext
+z extrakční cache (strany, které index najde ke sloupci a lokacím výsledků,
+jinak text původní fáze) a existující řádky studie. Model vrátí jen nový
+sloupec, ostatní hodnoty zůstanou beze změny.
+
+Každý běh čísluje Idstudy od 1, článek ke studii se proto hledá podle
+přiřazení Idstudy -> PDF uloženého s datasetem (list Studies v Excelu,
+soubor *_studies.csv vedle CSV/Parquet výsledků) a v indexu stran se pak
+dohledá jen klíč cache podle jména souboru. Požadavky běží souběžně přes
+sdílený rate limiter a cache odpovědí analyzátoru - přerušené překódování se
+stejnou instrukcí podruhé nic nestojí.
+"""
+
+import datetime
+import logging
+import os
+import pickle
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from meta_common import lazy_import
+from meta_schema import ID_COLUMNS, META_ANALYSIS_COLUMNS, NA_TOKEN, apply_schema, to_export
+from meta_sink import STUDIES_SHEET, ResultsSink, studies_frame, studies_path, write_studies
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# Výchozí počet souběžných požadavků (strop drží rate limiter analyzátoru)
+RECODE_WORKERS = 4
+
+DATASET_SHEET = 'Meta-Analysis'
+
+
+def load_dataset(path: str) -> Tuple[Any, Dict[int, str]]:
+    """Dataset z Excelu (list Meta-Analysis), CSV zálohy nebo úložiště výsledků (.parquet)
+    
+    Vrací i přiřazení Idstudy -> jméno PDF, které se ukládá s datasetem.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    studies = None
+    if suffix in ('.xlsx', '.xlsm'):
+        sheets = pd.read_excel(path, sheet_name=None, dtype=str, keep_default_na=False)
+        if DATASET_SHEET not in sheets:
+            raise ValueError(f"Dataset {path} nemá list {DATASET_SHEET}")
+        df, studies = sheets[DATASET_SHEET], sheets.get(STUDIES_SHEET)
+    elif suffix in ('.parquet', '.csv'):
+        df = (pd.read_parquet(path) if suffix == '.parquet'
+              else pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig'))
+        if studies_path(path).exists():
+            studies = pd.read_csv(studies_path(path), dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    else:
+        raise ValueError(f"Nepodporovaný formát datasetu: {path} (xlsx, csv, parquet)")
+    missing = [column for column in ('Idstudy', 'IdEstimate') if column not in df.columns]
+    if missing:
+        raise ValueError(f"Dataset {path} nemá sloupce {', '.join(missing)}")
+    if studies is None or studies.empty:
+        raise ValueError(f"Dataset {path} nemá přiřazení Idstudy -> PDF (list {STUDIES_SHEET} "
+                         f"nebo {studies_path(path).name}); vznikl starší verzí - spusťte run znovu")
+    return apply_schema(df), {int(idstudy): file for idstudy, file in zip(studies['Idstudy'], studies['File'])}
+
+
+def check_column(column: str):
+    """Překódovat jde každý sloupec schématu kromě identifikátorů"""
+    if column not in META_ANALYSIS_COLUMNS:
+        raise ValueError(f"Neznámý sloupec: {column}")
+    if column in ID_COLUMNS:
+        raise ValueError(f"Sloupec {column} je identifikátor, nepřekóduje se")
+
+
+def _same_value(old: Any, new: Any) -> bool:
+    """Shoda hodnot bez ohledu na zápis čísla ("0.5" vs 0.5)"""
+    try:
+        return float(old) == float(new)
+    except (TypeError, ValueError):
+        return str(old).strip() == str(new).strip()
+
+
+def _load_document(analyzer, cache_key: str) -> Optional[Any]:
+    """Extrahovaný článek z pickle cache (None, pokud položka zmizela)"""
+    cache_file = analyzer.cache_dir / f"{cache_key}.pkl"
+    if not cache_file.exists():
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        logger.warning(f"⚠️ {cache_file.name}: {e}")
+        return None
+
+
+def recode_dataset(analyzer, df, study_files: Dict[int, str], column: str, instruction: str,
+                   workers: int = RECODE_WORKERS, studies: Optional[Iterable[int]] = None) -> Tuple[Any, Any]:
+    """Překóduje sloupec ve všech (nebo vybraných) studiích; vrátí nový dataset a tabulku změn
+    
+    `study_files` je přiřazení Idstudy -> jméno PDF uložené s datasetem (viz load_dataset).
+    """
+    check_column(column)
+    if analyzer.search_index is None:
+        raise RuntimeError("Překódování potřebuje index stran (SQLite s FTS5)")
+
+    records = to_export(df).to_dict('records')
+    rows_by_study: Dict[int, List[int]] = defaultdict(list)
+    for position, record in enumerate(records):
+        if record['Idstudy'] != NA_TOKEN:
+            rows_by_study[int(record['Idstudy'])].append(position)
+    if studies is not None:
+        selected = set(studies)
+        rows_by_study = {study_id: rows for study_id, rows in rows_by_study.items() if study_id in selected}
+    cache_keys = analyzer.search_index.cache_keys(study_files.values())
+
+    def recode(study_id: int):
+        """Nové hodnoty jedné studie (None = článek není v cache)"""
+        file = study_files.get(study_id)
+        cache_key = cache_keys.get(file)
+        content = _load_document(analyzer, cache_key) if cache_key else None
+        if content is None:
+            return None
+        content['cache_key'], content['file'] = cache_key, file
+        rows = [records[position] for position in rows_by_study[study_id]]
+        return analyzer.recode_study(content, rows, column, instruction)
+
+    logger.info(f"🔁 Překódování {column}: {len(rows_by_study)} studií, {workers} souběžných požadavků")
+    values = [record[column] for record in records]
+    changes = []
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = {pool.submit(recode, study_id): study_id for study_id in rows_by_study}
+        for done, future in enumerate(as_completed(futures), 1):
+            study_id = futures[future]
+            try:
+                new_values = future.result()
+            except Exception as e:
+                logger.error(f"❌ Idstudy {study_id}: {e}")
+                new_values = None
+            changed = 0
+            for offset, position in enumerate(rows_by_study[study_id]):
+                old = records[position][column]
+                if new_values is None:
+                    new, status = old, 'no document'
+                elif new_values[offset] is None:
+                    new, status = old, 'no answer'
+                else:
+                    new = new_values[offset]
+                    status = 'unchanged' if _same_value(old, new) else 'changed'
+                values[position] = new
+                changed += status == 'changed'
+                changes.append({
+                    'Idstudy': study_id,
+                    'IdEstimate': records[position]['IdEstimate'],
+                    'File': study_files.get(study_id),
+                    'Old': old,
+                    'New': new,
+                    'Status': status,
+                })
+            outcome = (f"změněno {changed}/{len(rows_by_study[study_id])}" if new_values is not None
+                       else "článek není v cache")
+            logger.info(f"🔁 [{done}/{len(futures)}] Idstudy {study_id}: {outcome}")
+
+    recoded = df.copy()
+    recoded[column] = values
+    changes_df = pd.DataFrame(changes, columns=['Idstudy', 'IdEstimate', 'File', 'Old', 'New', 'Status'])
+    return apply_schema(recoded), changes_df.sort_values('Idstudy', kind='stable')
+
+
+def save_recoded(analyzer, df, changes, study_files: Dict[int, str], export_folder: str, column: str,
+                 instruction: str) -> str:
+    """Uloží překódovaný dataset (Excel + CSV záloha) s listy změn a statistik; vrátí cestu k Excelu"""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = os.path.join(export_folder, f"meta_analysis_v8_recode_{column}_{timestamp}")
+    # CSV úložiště je zároveň CSV záloha
+    sink = ResultsSink(base + ".csv", fmt="csv")
+    sink.append(df)
+    # Přiřazení Idstudy -> PDF jde s datasetem dál (i překódovaný dataset jde znovu překódovat)
+    file_ids = {file: idstudy for idstudy, file in study_files.items()}
+    write_studies(sink.path, file_ids)
+
+    counts = changes['Status'].value_counts()
+    stats = {
+        'Column': column,
+        'Instruction': instruction.strip(),
+        'Studies': changes['Idstudy'].nunique(),
+        'Estimates': len(changes),
+        **{status.replace(' ', '_').title(): int(counts.get(status, 0))
+           for status in ('changed', 'unchanged', 'no answer', 'no document')},
+        'API Requests': analyzer.extraction_stats.get('api_requests', 0),
+        'Response Cache Hits': analyzer.extraction_stats.get('response_cache_hits', 0),
+        'Total Cost': f"${analyzer.cost_tracker.calculate_cost():.2f}",
+    }
+    analyzer.journal.log("recode", **{key.lower().replace(' ', '_'): value for key, value in stats.items()})
+
+    excel_path = base + ".xlsx"
+    sink.write_excel(excel_path, {'Recode': changes, 'Statistics': pd.DataFrame([stats]),
+                                  STUDIES_SHEET: studies_frame(file_ids)})
+    return excel_path
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+Diskový cache odpovědí API.
+
+Klíčem je SHA-256 parametrů požadavku (model, system prompt s textem článku,
+zpráva, nástroje), hodnotou pickle odpovědi. Stejný požadavek se při
+opakovaném běhu (přerušené překódování sloupce, nový běh nad stejnými PDF)
+znovu neposílá a nic nestojí.
+
+Cache leží v cache složce vedle indexu stran a spojení se otevírá pro každou
+operaci, takže ho sdílejí API vlákna i souběžné běhy.
+"""
+
+import hashlib
+import json
+import logging
+import pickle
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSE_CACHE_NAME = "response_cache.sqlite"
+
+
+def request_key(params: Dict[str, Any]) -> str:
+    """Klíč požadavku - stejné parametry dávají stejný klíč bez ohledu na pořadí položek"""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """SQLite cache odpovědí API podle parametrů požadavku"""
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Nové spojení pro každou operaci (bezpečné napříč vlákny i procesy)"""
+        return sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+
+    def _init_schema(self):
+        """Vytvoří tabulku odpovědí, pokud ještě neexistuje"""
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response BLOB NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Uložená odpověď, nebo None (i když ji nejde načíst - např. po změně verze SDK)"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception as e:
+            logger.debug(f"Odpověď z cache nejde načíst ({key[:12]}): {e}")
+            return None
+
+    def put(self, key: str, model: Optional[str], response: Any):
+        """Uloží odpověď (stejný klíč se přepíše)"""
+        blob = pickle.dumps(response)
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO responses (key, model, response, created) VALUES (?, ?, ?, ?)",
+                         (key, model, blob, time.time()))
+        finally:
+            conn.close()
+
+    def prune(self, older_than: Optional[float] = None) -> int:
+        """Smaže odpovědi uložené před časem `older_than` (None = všechny); vrátí jejich počet"""
+        conn = self._connect()
+        try:
+            if older_than is None:
+                return conn.execute("DELETE FROM responses").rowcount
+            return conn.execute("DELETE FROM responses WHERE created < ?", (older_than,)).rowcount
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        """Počet uložených odpovědí a velikost souboru"""
+        conn = self._connect()
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        finally:
+            conn.close()
+        return {'responses': count, 'size_mb': Path(self.db_path).stat().st_size / 1024 ** 2}
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+Typované schéma tabulky meta-analýzy.
+
+Uvnitř běhu mají sloupce skutečné dtypy (nullable Float64/Int64/Int8,
+category, string) a chybějící hodnota je pd.NA. Řetězec 'NA' se objevuje
+jen na vstupu od modelu a při exportu do Excelu/CSV (to_export).
+"""
+
+import math
+from typing import Dict, List
+
+from meta_common import lazy_import
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+# Zápis chybějící hodnoty v odpovědích modelu i v exportu
+NA_TOKEN = 'NA'
+
+# Definice sloupců
+META_ANALYSIS_COLUMNS = [
+    "Idstudy", "IdEstimate", "Author", "Author_Affiliation", "DOI", "Journal_Name",
+    "Num_Citations", "Year", "Base_Model_Type", "Augmented_base_model",
+    "Augmentation_Description", "Ramsey_Rule", "HH_Included", "Firms_Included",
+    "Banks_Included", "Government_Included", "HH_Maximization_Type",
+    "HH_Maximized_Vars", "Producer_Type", "Producer_Assumption",
+    "Other_Agent_Included", "Other_Agent_Assumptions", "Empirical_Research",
+    "Country", "Flexible_Price_Assumption", "Exogenous_Inflation", "Households_discount_factor",
+    "Consumption_curvature_parameter", "Disutility_of_labor",
+    "Inverse_of_labor_supply_elasticity", "Money_curvature_parameter",
+    "Loan_to_value_ratio", "Labor_share_of_output", "Depositors_discount_factor",
+    "Price_adjustment_cost", "Elasticity_of_substitution_between_goods",
+    "AR1_coefficient_of_TFP", "Std_dev_to_TFP_shock", "Zero_Lower_Bound",
+    "Results_Table", "Results_Inflation", "Results_Inflation_Assumption",
+    "Preferred_Estimate", "Reason_for_Preferred", "Std_Dev_Inflation",
+    "Interest_Rate", "Impact_Factor"
+]
+
+# Pozice sloupců ve výsledné tabulce
+COLUMN_INDEX = {name: idx for idx, name in enumerate(META_ANALYSIS_COLUMNS)}
+
+# Kalibrované parametry a výsledky
+FLOAT_COLUMNS = [
+    'Households_discount_factor', 'Consumption_curvature_parameter',
+    'Disutility_of_labor', 'Inverse_of_labor_supply_elasticity',
+    'Money_curvature_parameter', 'Loan_to_value_ratio',
+    'Labor_share_of_output', 'Depositors_discount_factor',
+    'Price_adjustment_cost', 'Elasticity_of_substitution_between_goods',
+    'AR1_coefficient_of_TFP', 'Std_dev_to_TFP_shock',
+    'Results_Inflation', 'Std_Dev_Inflation', 'Interest_Rate'
+]
+
+# Sloupce, které musí být celé číslo, resp. příznak 0/1
+DIGIT_COLUMNS = {'Year', 'Num_Citations'}
+BINARY_COLUMNS = {
+    'Augmented_base_model', 'Ramsey_Rule', 'HH_Included', 'Firms_Included',
+    'Banks_Included', 'Government_Included', 'Other_Agent_Included',
+    'Empirical_Research', 'Flexible_Price_Assumption', 'Exogenous_Inflation',
+    'Zero_Lower_Bound', 'Preferred_Estimate'
+}
+ID_COLUMNS = {'Idstudy', 'IdEstimate'}
+
+# Málo různých hodnot opakovaných přes všechny odhady
+CATEGORY_COLUMNS = {'Journal_Name', 'Country', 'Base_Model_Type'}
+
+
+def _column_dtype(name: str) -> str:
+    """Dtype sloupce podle skupiny"""
+    if name in FLOAT_COLUMNS:
+        return "Float64"
+    if name in BINARY_COLUMNS:
+        return "Int8"
+    if name in DIGIT_COLUMNS or name in ID_COLUMNS:
+        return "Int64"
+    if name in CATEGORY_COLUMNS:
+        return "category"
+    return "string"
+
+
+COLUMN_DTYPES: Dict[str, str] = {name: _column_dtype(name) for name in META_ANALYSIS_COLUMNS}
+
+
+def _is_missing(value) -> bool:
+    """Chybějící hodnota v libovolné podobě (None, NaN, pd.NA, 'NA', '')"""
+    if isinstance(value, str):
+        return value.strip() in (NA_TOKEN, '')
+    return value is None or value is pd.NA or value != value
+
+
+def _to_float(value) -> float:
+    """Číslo nebo NaN pro nepřevoditelné hodnoty"""
+    if _is_missing(value):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _convert(values, dtype: str):
+    """Převede hodnoty jednoho sloupce na pole daného dtype; 'NA' a nepřevoditelné -> pd.NA
+
+    Pracuje přímo s Python hodnotami a skládá extension pole najednou, což je
+    pro jednotky až desítky řádků studie řádově rychlejší než pd.to_numeric.
+    """
+    if dtype in ("Float64", "Int64", "Int8"):
+        numbers = np.array([_to_float(v) for v in values], dtype="float64")
+        if dtype == "Float64":
+            return pd.arrays.FloatingArray(numbers, np.isnan(numbers))
+        # Desetinná čísla v celočíselných sloupcích (a jiné než 0/1 u příznaků) zahodíme
+        mask = np.isnan(numbers) | (np.round(numbers) != numbers)
+        if dtype == "Int8":
+            mask |= ~np.isin(numbers, [0, 1])
+        return pd.arrays.IntegerArray(np.where(mask, 0, numbers).astype(dtype.lower()), mask)
+    text = [None if _is_missing(v) else str(v).strip() for v in values]
+    if dtype == "category":
+        return pd.Categorical(text)
+    return pd.array(text, dtype="string")
+
+
+def apply_schema(df):
+    """Vrátí DataFrame se sloupci v pořadí a s dtypy schématu"""
+    columns = {}
+    for name in META_ANALYSIS_COLUMNS:
+        dtype = COLUMN_DTYPES[name]
+        if name not in df.columns:
+            columns[name] = _convert([None] * len(df), dtype)
+        elif str(df[name].dtype) == dtype and dtype != "category":
+            columns[name] = df[name].array
+        else:
+            columns[name] = _convert(df[name].tolist(), dtype)
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(df)))
+
+
+def frame_from_grid(grid):
+    """Typovaná tabulka z 2D pole hodnot ve sloupcovém pořadí schématu (bez mezikroku přes object DataFrame)"""
+    columns = {name: _convert(grid[:, idx].tolist(), COLUMN_DTYPES[name])
+               for idx, name in enumerate(META_ANALYSIS_COLUMNS)}
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(grid)))
+
+
+def empty_frame():
+    """Prázdná typovaná tabulka"""
+    return apply_schema(pd.DataFrame(columns=META_ANALYSIS_COLUMNS))
+
+
+def concat_frames(frames: List):
+    """Spojí studie a sjednotí kategorie (concat jinak vrací object)"""
+    if not frames:
+        return empty_frame()
+    return apply_schema(pd.concat(frames, ignore_index=True))
+
+
+def to_export(df):
+    """Kopie pro Excel/CSV: chybějící hodnoty jako 'NA', čísla zůstanou čísly"""
+    exported = df.astype(object)
+    return exported.where(df.notna(), NA_TOKEN)
+
+
+def _json_type(name: str) -> Dict:
+    """JSON schema jedné hodnoty podle dtype sloupce (null = chybějící)"""
+    dtype = COLUMN_DTYPES[name]
+    if dtype == "Float64":
+        return {"type": ["number", "null"]}
+    if dtype == "Int8":
+        return {"type": ["integer", "null"], "enum": [0, 1, None]}
+    if dtype == "Int64":
+        return {"type": ["integer", "null"]}
+    return {"type": ["string", "null"]}
+
+
+def rows_tool(name: str, description: str, columns: List[str]) -> Dict:
+    """Definice nástroje, jehož vstupem jsou typované řádky s danými sloupci"""
+    return {
+        "name": name,
+        "description": description,
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "rows": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {column: _json_type(column) for column in columns},
+                        "required": list(columns),
+                    },
+                },
+            },
+            "required": ["rows"],
+        },
+    }
+
+
+def rows_from_tool_input(tool_input: Dict) -> List[List]:
+    """Typované řádky z tool_use vstupu v kanonickém pořadí sloupců (None = chybí)"""
+    rows = []
+    for item in tool_input.get("rows") or []:
+        if not isinstance(item, dict):
+            continue
+        row = [None] * len(META_ANALYSIS_COLUMNS)
+        for column, value in item.items():
+            if column in COLUMN_INDEX:
+                row[COLUMN_INDEX[column]] = value
+        rows.append(row)
+    return rows
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fulltextový index stran extrahovaných článků (SQLite FTS5).
+
+Index se plní z extrakční cache: každá strana normalizovaného textu je jeden
+řádek FTS5 tabulky s klíčem cache a číslem strany, tabulka `papers` k němu
+drží jméno souboru a Idstudy. Nad celým korpusem se pak dá hledat
+(`meta_cli.py search "zero lower bound"`) a analyzátor z indexu vybírá jen
+strany relevantní k dotazu (reconciliation hledá lokace mimo cachovaný
+prompt Document 3 ve stranách místo v celém článku).
+
+Index leží v cache složce vedle pickle souborů a spojení se otevírá pro
+každou operaci, takže do něj mohou zapisovat extrakční procesy souběžně.
+"""
+
+import logging
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_NAME = "search_index.sqlite"
+
+# Kolik stran vrací výběr pro prompt (každý zásah + následující strana)
+RETRIEVAL_PAGES = 4
+
+# Délka úryvku ve slovech
+SNIPPET_WORDS = 12
+
+# Dotaz s operátory FTS5 se předá beze změny, jinak se slova uzavřou do uvozovek
+FTS_SYNTAX = re.compile(r'["*()]|\b(?:AND|OR|NOT|NEAR)\b')
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+@dataclass
+class SearchHit:
+    """Jedna nalezená strana"""
+    file: str
+    idstudy: Optional[int]
+    page: int
+    score: float
+    snippet: str
+
+
+@lru_cache(maxsize=1)
+def fts5_available() -> bool:
+    """Podporuje SQLite v tomto Pythonu FTS5?"""
+    try:
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute("CREATE VIRTUAL TABLE probe USING fts5(text)")
+        finally:
+            conn.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def phrase_query(text: str) -> str:
+    """Frázový dotaz ze slov textu ("Table A.1" -> "table a 1")"""
+    words = WORD.findall(text.lower())
+    return f'"{" ".join(words)}"' if words else ''
+
+
+def match_query(text: str) -> str:
+    """Dotaz pro MATCH: vlastní syntaxe FTS5 zůstane, jinak AND všech slov"""
+    if FTS_SYNTAX.search(text):
+        return text
+    words = WORD.findall(text)
+    if not words:
+        raise ValueError(f"Prázdný dotaz: {text!r}")
+    return ' '.join(f'"{word}"' for word in words)
+
+
+class SearchIndex:
+    """FTS5 index stran článků z extrakční cache"""
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Nové spojení pro každou operaci (bezpečné napříč vlákny i procesy)"""
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_schema(self):
+        """Vytvoří tabulku článků a FTS5 tabulku stran, pokud ještě neexistují"""
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS papers (
+                    cache_key TEXT PRIMARY KEY,
+                    file TEXT NOT NULL,
+                    idstudy INTEGER,
+                    page_count INTEGER NOT NULL,
+                    indexed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS papers_file ON papers (file);
+                CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
+                    text, cache_key UNINDEXED, page UNINDEXED,
+                    tokenize = 'porter unicode61'
+                );
+            """)
+        finally:
+            conn.close()
+
+    def has(self, cache_key: str) -> bool:
+        """Je článek s tímto klíčem cache už v indexu?"""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM papers WHERE cache_key = ?", (cache_key,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def add_document(self, cache_key: str, file: str, pages: Sequence[str], idstudy: Optional[int] = None):
+        """Zaindexuje strany článku (předchozí verze se stejným jménem souboru se nahradí)"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = [row["cache_key"] for row in
+                     conn.execute("SELECT cache_key FROM papers WHERE file = ? OR cache_key = ?", (file, cache_key))]
+            for key in stale:
+                conn.execute("DELETE FROM pages WHERE cache_key = ?", (key,))
+                conn.execute("DELETE FROM papers WHERE cache_key = ?", (key,))
+            conn.executemany("INSERT INTO pages (text, cache_key, page) VALUES (?, ?, ?)",
+                             [(text, cache_key, number) for number, text in enumerate(pages, 1) if text.strip()])
+            conn.execute("INSERT INTO papers (cache_key, file, idstudy, page_count, indexed) VALUES (?, ?, ?, ?, ?)",
+                         (cache_key, file, idstudy, len(pages), time.time()))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def set_study_id(self, cache_key: str, idstudy: int):
+        """Idstudy je známé až při analýze - doplní se k už zaindexovanému článku
+
+        Každý běh čísluje od 1, stejné Idstudy u článku z dřívějšího běhu se proto smaže.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE papers SET idstudy = NULL WHERE idstudy = ? AND cache_key != ?", (idstudy, cache_key))
+            conn.execute("UPDATE papers SET idstudy = ? WHERE cache_key = ?", (idstudy, cache_key))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def cache_keys(self, files: Iterable[str]) -> Dict[str, str]:
+        """Jméno souboru -> klíč cache poslední extrakce (soubory mimo index chybí)"""
+        wanted = set(files)
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT file, cache_key FROM papers ORDER BY indexed").fetchall()
+        finally:
+            conn.close()
+        return {row["file"]: row["cache_key"] for row in rows if row["file"] in wanted}
+
+    def prune(self, keep_keys: Iterable[str]) -> int:
+        """Odstraní články, jejichž položka cache už neexistuje; vrátí jejich počet"""
+        keep = set(keep_keys)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = [row["cache_key"] for row in conn.execute("SELECT cache_key FROM papers")
+                     if row["cache_key"] not in keep]
+            for key in stale:
+                conn.execute("DELETE FROM pages WHERE cache_key = ?", (key,))
+                conn.execute("DELETE FROM papers WHERE cache_key = ?", (key,))
+            conn.execute("COMMIT")
+            return len(stale)
+        finally:
+            conn.close()
+
+    def search(self, query: str, limit: int = 20, file: Optional[str] = None,
+               cache_key: Optional[str] = None) -> List[SearchHit]:
+        """Strany seřazené podle BM25 (volitelně jen v jednom článku)"""
+        sql = f"""
+            SELECT papers.file, papers.idstudy, pages.page, bm25(pages) AS score,
+                   snippet(pages, 0, '[', ']', '…', {SNIPPET_WORDS}) AS snippet
+            FROM pages JOIN papers ON papers.cache_key = pages.cache_key
+            WHERE pages MATCH ?
+        """
+        params: list = [match_query(query)]
+        if file is not None:
+            sql += " AND papers.file = ?"
+            params.append(file)
+        if cache_key is not None:
+            sql += " AND pages.cache_key = ?"
+            params.append(cache_key)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        conn = self._connect()
+        try:
+            return [SearchHit(row["file"], row["idstudy"], int(row["page"]), row["score"], row["snippet"])
+                    for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def retrieve_pages(self, cache_key: str, query: str, limit: int = RETRIEVAL_PAGES) -> List[int]:
+        """Čísla stran článku pro prompt: nejlepší zásahy a strana za každým (tabulky přetékají)"""
+        try:
+            hits = self.search(query, limit=limit, cache_key=cache_key)
+        except (ValueError, sqlite3.OperationalError) as e:
+            logger.debug(f"Dotaz do indexu selhal ({query!r}): {e}")
+            return []
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT page_count FROM papers WHERE cache_key = ?", (cache_key,)).fetchone()
+        finally:
+            conn.close()
+        page_count = row["page_count"] if row else 0
+        selected = []
+        for hit in hits:
+            for page in (hit.page, hit.page + 1):
+                if page <= page_count and page not in selected and len(selected) < limit:
+                    selected.append(page)
+        return sorted(selected)
+
+    def stats(self) -> dict:
+        """Počet článků a stran v indexu"""
+        conn = self._connect()
+        try:
+            papers = conn.execute("SELECT COUNT(*), COALESCE(SUM(page_count), 0) FROM papers").fetchone()
+            return {'papers': papers[0], 'pages': papers[1], 'size_mb': Path(self.db_path).stat().st_size / 1024 ** 2}
+        finally:
+            conn.close()
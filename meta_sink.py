@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+"""
+Průběžné ukládání výsledků studií na disk.
+
+Místo hromadění DataFrame všech studií v paměti a jednoho pd.concat na konci
+se řádky každé studie hned připíší do úložiště v exportní složce:
+
+- Parquet (řádková skupina na studii), pokud je nainstalované pyarrow,
+- jinak CSV (exportní podoba, chybějící hodnoty jako 'NA').
+
+Finální Excel a CSV se pak skládají z úložiště po dávkách (openpyxl
+write_only), takže paměť neroste s počtem článků a dokončené studie jsou
+na disku i při pádu běhu.
+"""
+
+import importlib.util
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from meta_common import lazy_import
+from meta_schema import COLUMN_DTYPES, META_ANALYSIS_COLUMNS, NA_TOKEN, apply_schema, to_export
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+SINK_FORMATS = ("auto", "csv", "parquet")
+
+# Po kolika řádcích se úložiště čte při skládání výstupů
+CHUNK_ROWS = 5000
+
+# Arrow typy podle dtype sloupce (kategorie se ukládají jako text)
+_ARROW_TYPES = {"Float64": "float64", "Int64": "int64", "Int8": "int8"}
+
+
+# Přiřazení Idstudy -> PDF: list Excelu a soubor vedle CSV/Parquet výsledků
+STUDIES_SHEET = 'Studies'
+STUDIES_SUFFIX = '_studies.csv'
+
+
+def studies_frame(study_ids: Dict[str, int]):
+    """Tabulka Idstudy -> jméno PDF z přiřazení analyzátoru (jméno PDF -> Idstudy)"""
+    return pd.DataFrame(sorted((idstudy, file) for file, idstudy in study_ids.items()),
+                        columns=['Idstudy', 'File'])
+
+
+def studies_path(results_path) -> Path:
+    """Soubor s přiřazením Idstudy -> PDF k danému CSV/Parquet souboru výsledků"""
+    path = Path(results_path)
+    return path.with_name(path.stem + STUDIES_SUFFIX)
+
+
+def write_studies(results_path, study_ids: Dict[str, int]):
+    """Uloží přiřazení Idstudy -> PDF vedle souboru výsledků"""
+    studies_frame(study_ids).to_csv(studies_path(results_path), index=False, encoding='utf-8-sig')
+
+
+def parquet_available() -> bool:
+    """Je k dispozici pyarrow?"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class ResultsSink:
+    """Append-only úložiště řádků studií (thread-safe, API workery zapisují souběžně)"""
+
+    def __init__(self, path_base, fmt: str = "auto"):
+        if fmt not in SINK_FORMATS:
+            raise ValueError(f"Neznámý formát úložiště: {fmt} (povolené: {', '.join(SINK_FORMATS)})")
+        if fmt == "auto":
+            fmt = "parquet" if parquet_available() else "csv"
+        elif fmt == "parquet" and not parquet_available():
+            raise ValueError("Formát parquet vyžaduje pyarrow (pip install pyarrow)")
+        self.format = fmt
+        self.path = Path(path_base).with_suffix(f".{fmt}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.rows = 0
+        self.studies = set()
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def empty(self) -> bool:
+        return self.rows == 0
+
+    def append(self, df_study):
+        """Připíše řádky jedné studie"""
+        if df_study is None or df_study.empty:
+            return
+        df_study = apply_schema(df_study)
+        with self._lock:
+            if self.format == "parquet":
+                self._append_parquet(df_study)
+            else:
+                # Stejná podoba jako CSV záloha výsledků (BOM kvůli Excelu)
+                first = self.rows == 0
+                to_export(df_study).to_csv(self.path, mode='w' if first else 'a', header=first,
+                                           index=False, encoding='utf-8-sig' if first else 'utf-8')
+            self.rows += len(df_study)
+            self.studies.update(int(v) for v in df_study['Idstudy'].dropna())
+
+    def _append_parquet(self, df_study):
+        """Jedna řádková skupina na studii, schéma pevné podle META_ANALYSIS_COLUMNS"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self._writer is None:
+            schema = pa.schema([(name, getattr(pa, _ARROW_TYPES.get(dtype, "string"))())
+                                for name, dtype in COLUMN_DTYPES.items()])
+            self._writer = pq.ParquetWriter(str(self.path), schema)
+        frame = df_study.astype({name: "string" for name, dtype in COLUMN_DTYPES.items()
+                                 if dtype == "category"})
+        self._writer.write_table(pa.Table.from_pandas(frame, schema=self._writer.schema, preserve_index=False))
+
+    def close(self):
+        """Uzavře zápis (Parquet potřebuje zapsat patičku, než se dá číst)"""
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def iter_chunks(self, chunk_rows: int = CHUNK_ROWS) -> Iterator:
+        """Typované dávky řádků v pořadí zápisu"""
+        self.close()
+        if self.empty:
+            return
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(str(self.path)).iter_batches(batch_size=chunk_rows):
+                yield apply_schema(batch.to_pandas())
+        else:
+            for chunk in pd.read_csv(self.path, dtype=str, keep_default_na=False, chunksize=chunk_rows,
+                                     encoding='utf-8-sig'):
+                yield apply_schema(chunk)
+
+    def write_csv(self, csv_path: str, chunk_rows: int = CHUNK_ROWS):
+        """CSV záloha po dávkách"""
+        first = True
+        for chunk in self.iter_chunks(chunk_rows):
+            to_export(chunk).to_csv(csv_path, mode='w' if first else 'a', header=first,
+                                    index=False, encoding='utf-8-sig' if first else 'utf-8')
+            first = False
+
+    def write_excel(self, excel_path: str, extra_sheets: Optional[Dict[str, object]] = None,
+                    sheet_name: str = 'Meta-Analysis', chunk_rows: int = CHUNK_ROWS):
+        """Excel v režimu write_only: hlavní list po dávkách z úložiště, další listy z malých DataFrame"""
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.append(META_ANALYSIS_COLUMNS)
+        for chunk in self.iter_chunks(chunk_rows):
+            for row in to_export(chunk).itertuples(index=False, name=None):
+                sheet.append([_cell(value) for value in row])
+        for name, frame in (extra_sheets or {}).items():
+            append_frame(workbook, name, frame)
+        workbook.save(excel_path)
+
+
+def _cell(value):
+    """Hodnota pro openpyxl (numpy/pandas skaláry na Python typy)"""
+    if value is None or value is pd.NA:
+        return NA_TOKEN
+    return value.item() if hasattr(value, 'item') else value
+
+
+def append_frame(workbook, sheet_name: str, frame):
+    """Přidá malý DataFrame jako list do write_only sešitu"""
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append([str(column) for column in frame.columns])
+    for row in frame.itertuples(index=False, name=None):
+        sheet.append([None if value is None or (isinstance(value, float) and value != value) else _cell(value)
+                      for value in row])
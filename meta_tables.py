@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lokální číselné mřížky tabulek z textu PDF.
+
+Pod titulkem tabulky ("Table 2 ...") se řádky rozdělí na popisek a číselné
+buňky. Tabulka, jejíž řádky mají převážně stejný počet čísel, se považuje
+za dobře strukturovanou a dostane mřížku s adresami G<tabulka>R<řádek>C<sloupec>.
+Model pak jen označí, které buňky jsou inflační výsledky (Grid_Cell), a hodnota
+se doplní přímo z dokumentu - žádné přepisování čísel modelem.
+"""
+
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+
+from meta_evidence import parse_number
+
+# Titulek tabulky na začátku řádku ("Table 3", "TABLE A.2:", "Table 4b.")
+TABLE_CAPTION_PATTERN = re.compile(r'^\s*table\s+([A-Z]?\.?\d+[a-z]?)\b[.:]?\s*(.*)$', re.IGNORECASE)
+
+# Adresa buňky v odpovědi modelu
+GRID_CELL_PATTERN = re.compile(r'^\s*G(\d+)\s*R(\d+)\s*C(\d+)\s*$', re.IGNORECASE)
+
+# Kolik řádků pod titulkem se nejvýš prochází
+MAX_TABLE_LINES = 40
+
+# Dobře strukturovaná tabulka: aspoň tolik datových řádků a takový podíl
+# řádků se stejným počtem čísel
+MIN_DATA_ROWS = 2
+MIN_REGULAR_SHARE = 0.7
+
+# Řádek s tolika slovy a bez čísla je už text článku
+PROSE_WORDS = 12
+
+
+@dataclass
+class TableGrid:
+    """Číselná mřížka jedné tabulky (hodnoty jako řetězce přesně podle dokumentu)"""
+    grid_id: int
+    label: str
+    page: int
+    caption: str
+    header: List[str] = field(default_factory=list)
+    row_labels: List[str] = field(default_factory=list)
+    rows: List[List[str]] = field(default_factory=list)
+
+    def cell(self, row: int, col: int) -> Optional[str]:
+        """Hodnota buňky (řádky a sloupce od 1)"""
+        if 1 <= row <= len(self.rows) and 1 <= col <= len(self.rows[row - 1]):
+            return self.rows[row - 1][col - 1]
+        return None
+
+    def render(self) -> str:
+        """Textová podoba pro prompt s adresami buněk"""
+        lines = [f"### G{self.grid_id}: {self.label} (page {self.page}) {self.caption}".rstrip()]
+        if self.header:
+            lines.append("header: " + ' / '.join(self.header))
+        for r, (label, values) in enumerate(zip(self.row_labels, self.rows), 1):
+            cells = ' | '.join(f"C{c}={value}" for c, value in enumerate(values, 1))
+            lines.append(f"R{r} | {label or '-'} | {cells}")
+        return '\n'.join(lines)
+
+
+def _split_row(line: str):
+    """Popisek řádku a číselné buňky (čísla za popiskem; text mezi čísly řádek vyřadí)"""
+    tokens = line.split()
+    values = []
+    label = []
+    for token in tokens:
+        number = parse_number(token)
+        if number is not None:
+            values.append(number)
+        elif values:
+            # Text za prvním číslem - poznámka nebo próza, ne řádek mřížky
+            return ' '.join(label), values, False
+        else:
+            label.append(token)
+    return ' '.join(label), values, True
+
+
+def _parse_table(lines: List[str]):
+    """Hlavička a datové řádky z řádků pod titulkem"""
+    header, row_labels, rows = [], [], []
+    for line in lines[:MAX_TABLE_LINES]:
+        if not line.strip() or TABLE_CAPTION_PATTERN.match(line):
+            if rows:
+                break
+            continue
+        label, values, clean = _split_row(line)
+        if not values:
+            if rows or len(line.split()) >= PROSE_WORDS:
+                break
+            header.append(line.strip())
+            continue
+        if not clean:
+            if rows:
+                break
+            continue
+        row_labels.append(label)
+        rows.append(values)
+    return header, row_labels, rows
+
+
+def parse_table_grids(pages: List[str]) -> List[TableGrid]:
+    """Dobře strukturované tabulky článku jako číselné mřížky"""
+    grids: List[TableGrid] = []
+    seen = set()
+    for page_num, page_text in enumerate(pages, 1):
+        lines = page_text.split('\n')
+        for i, line in enumerate(lines):
+            match = TABLE_CAPTION_PATTERN.match(line)
+            if not match:
+                continue
+            label = f"Table {match.group(1)}"
+            if label.lower() in seen:
+                continue
+            header, row_labels, rows = _parse_table(lines[i + 1:])
+            if len(rows) < MIN_DATA_ROWS:
+                continue
+            _, regular = Counter(len(r) for r in rows).most_common(1)[0]
+            if regular / len(rows) < MIN_REGULAR_SHARE:
+                continue
+            seen.add(label.lower())
+            grids.append(TableGrid(len(grids) + 1, label, page_num, match.group(2).strip()[:120],
+                                   header, row_labels, rows))
+    return grids
+
+
+def resolve_cell(grids: Dict[int, TableGrid], reference: str, scale: str = '') -> Optional[Dict[str, str]]:
+    """Hodnota a tabulka pro adresu G#R#C#; scale 'percent' převede procenta na desetinné číslo"""
+    match = GRID_CELL_PATTERN.match(str(reference or ''))
+    if not match:
+        return None
+    grid = grids.get(int(match.group(1)))
+    value = grid.cell(int(match.group(2)), int(match.group(3))) if grid else None
+    if value is None:
+        return None
+    if str(scale or '').strip().lower().startswith('percent'):
+        try:
+            value = format((Decimal(value) / 100).normalize(), 'f')
+        except InvalidOperation:
+            return None
+    return {'value': value, 'table': grid.label}
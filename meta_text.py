@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+Normalizace textu článku před odesláním do promptů.
+
+Text z PyPDF2 obsahuje na každé straně záhlaví časopisu, čísla stran,
+řádky s copyrightem a na konci seznam literatury. Nic z toho žádná fáze
+nepotřebuje, a přesto se to platí jako vstupní (a cachované) tokeny.
+
+Normalizace pracuje po stranách, aby čísla stran (evidence, index tabulek)
+zůstala platná:
+- řádky opakované na začátku/konci většiny stran se zahodí (čísla v nich
+  se při porovnání ignorují, "Journal 12 (2019) 45" == "Journal 12 (2019) 46"),
+- samostatná čísla stran na okraji strany a copyright řádky se zahodí,
+- slova rozdělená na konci řádku se spojí, prázdné řádky a mezery v próze se zkrátí,
+- seznam literatury se oddělí do `references`; strany, které obsahují jen
+  literaturu, zůstanou prázdné,
+- začátek přílohy se označí (`appendix_page`, `appendix_offset`), aby výsledková
+  fáze mohla přílohu přidat jen tehdy, když na ni ukazuje pre-scan.
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from meta_common import count_tokens
+
+# Kolik řádků na začátku a konci strany se považuje za záhlaví/zápatí
+EDGE_LINES = 3
+
+# Řádek je záhlaví/zápatí, pokud se opakuje na takovém podílu stran (a aspoň na dvou)
+REPEATED_SHARE = 0.4
+
+# Samostatné číslo strany ("12", "- 12 -", "Page 3 of 20")
+PAGE_NUMBER_LINE = re.compile(r'^\s*(?:page\s+)?[-–]?\s*\d{1,4}\s*[-–]?(?:\s*(?:of|/)\s*\d{1,4})?\s*$', re.IGNORECASE)
+
+# Copyright, licence a poznámky vydavatele
+COPYRIGHT_LINE = re.compile(
+    r'©|\(c\)\s*\d{4}|\bcopyright\b|all rights reserved|downloaded from|this content downloaded|'
+    r'terms and conditions of use|published by elsevier', re.IGNORECASE)
+
+# Nadpis seznamu literatury na samostatném řádku ("References", "5. Bibliography")
+REFERENCES_HEADING = re.compile(
+    r'^\s*(?:\d+\.?\s*)?(references|bibliography|literature cited|works cited)\s*$', re.IGNORECASE)
+
+# Nadpis přílohy - literatura končí před ní
+APPENDIX_HEADING = re.compile(r'^\s*(?:online\s+)?(appendix|appendices|supplementary material)\b', re.IGNORECASE)
+
+# Nadpis přílohy je krátký řádek a nestojí v první části článku ("Appendix A shows..." je text)
+APPENDIX_HEADING_WORDS = 8
+APPENDIX_MIN_SHARE = 0.3
+
+# Slovo rozdělené na konci řádku ("infla-\ntion")
+HYPHENATED = re.compile(r'([A-Za-z])-\n\s*([a-z])')
+
+# Tři a více prázdných řádků
+BLANK_LINES = re.compile(r'\n\s*\n(\s*\n)+')
+
+# Víc mezer v řádku (v řádcích tabulek oddělují sloupce, tam zůstanou)
+SPACES = re.compile(r'[ \t]{2,}')
+
+# Číselná buňka; řádek se dvěma a více je řádek tabulky
+NUMBER_TOKEN = re.compile(r'(?<![\w.])[-−–]?\d+(?:[.,]\d+)?%?(?![\w.])')
+
+# Desetinné číslo - v záhlaví časopisu nebývá, v řádku tabulky ano
+DECIMAL = re.compile(r'\d[.,]\d')
+
+
+def _line_key(line: str) -> str:
+    """Klíč pro porovnání záhlaví mezi stranami (bez čísel a velikosti písmen)
+
+    Řádky s desetinnými čísly dostanou prázdný klíč - řádky tabulek se stejným
+    popiskem ("Baseline 0.5 1.2") se nesmí zahodit jako záhlaví.
+    """
+    if DECIMAL.search(line):
+        return ''
+    return re.sub(r'\d+', '#', ' '.join(line.lower().split()))
+
+
+def _edge_indices(lines: List[str]) -> List[int]:
+    """Indexy neprázdných řádků na začátku a konci strany"""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return sorted(set(filled[:EDGE_LINES] + filled[-EDGE_LINES:]))
+
+
+def strip_running_lines(pages: List[str]) -> List[str]:
+    """Odstraní opakovaná záhlaví/zápatí, čísla stran a copyright řádky"""
+    split_pages = [page.split('\n') for page in pages]
+    counts = Counter()
+    for lines in split_pages:
+        counts.update({_line_key(lines[i]) for i in _edge_indices(lines)})
+    threshold = max(2, REPEATED_SHARE * len(pages))
+    repeated = {key for key, count in counts.items() if count >= threshold and key.strip('# ')}
+
+    cleaned = []
+    for lines in split_pages:
+        edges = set(_edge_indices(lines))
+        # Samostatná čísla jen na okraji strany - uvnitř mohou být buňky tabulky
+        kept = [line for i, line in enumerate(lines)
+                if not (i in edges and (_line_key(line) in repeated or PAGE_NUMBER_LINE.match(line)))
+                and not COPYRIGHT_LINE.search(line)]
+        cleaned.append('\n'.join(kept))
+    return cleaned
+
+
+def normalize_whitespace(text: str) -> str:
+    """Spojí rozdělená slova, zkrátí prázdné řádky a mezery v próze"""
+    text = HYPHENATED.sub(r'\1\2', text)
+    lines = [line.rstrip() if len(NUMBER_TOKEN.findall(line)) >= 2 else SPACES.sub(' ', line).strip()
+             for line in text.split('\n')]
+    return BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip()
+
+
+def split_references(pages: List[str]) -> Tuple[List[str], str]:
+    """Oddělí seznam literatury: (strany bez literatury, text literatury)
+
+    Bere se poslední nadpis literatury; literatura končí nadpisem přílohy nebo koncem článku.
+    """
+    start = None
+    for page_num, page in enumerate(pages):
+        for line_num, line in enumerate(page.split('\n')):
+            if REFERENCES_HEADING.match(line):
+                start = (page_num, line_num)
+    if start is None:
+        return list(pages), ''
+
+    main_pages = list(pages[:start[0]])
+    references = []
+    in_references = True
+    for page_num in range(start[0], len(pages)):
+        lines = pages[page_num].split('\n')
+        first = start[1] if page_num == start[0] else 0
+        kept = lines[:first]
+        for line in lines[first:]:
+            if in_references and APPENDIX_HEADING.match(line):
+                in_references = False
+            (references if in_references else kept).append(line)
+        main_pages.append('\n'.join(kept))
+    return main_pages, '\n'.join(references).strip()
+
+
+def find_appendix(pages: List[str]) -> Optional[Tuple[int, int]]:
+    """(strana, řádek) prvního nadpisu přílohy za úvodní částí článku, jinak None"""
+    first_page = int(len(pages) * APPENDIX_MIN_SHARE)
+    for page_num in range(first_page, len(pages)):
+        for line_num, line in enumerate(pages[page_num].split('\n')):
+            if APPENDIX_HEADING.match(line) and len(line.split()) <= APPENDIX_HEADING_WORDS:
+                return page_num, line_num
+    return None
+
+
+def main_text(content: Dict[str, Any]) -> str:
+    """Text článku bez přílohy"""
+    offset = content.get('appendix_offset')
+    return content['full_text'] if offset is None else content['full_text'][:offset]
+
+
+def appendix_text(content: Dict[str, Any]) -> str:
+    """Text přílohy (prázdný, pokud článek přílohu nemá)"""
+    offset = content.get('appendix_offset')
+    return '' if offset is None else content['full_text'][offset:]
+
+
+def normalize_pages(pages: List[str]) -> Dict[str, Any]:
+    """Celá normalizace: strany, literatura, začátek přílohy a statistika úspory tokenů"""
+    raw_text = '\n'.join(pages)
+    cleaned = [normalize_whitespace(page) for page in strip_running_lines(pages)]
+    cleaned, references = split_references(cleaned)
+    full_text = '\n'.join(cleaned)
+
+    appendix_page = appendix_offset = None
+    appendix = find_appendix(cleaned)
+    if appendix is not None:
+        page_num, line_num = appendix
+        appendix_page = page_num + 1
+        appendix_offset = (sum(len(page) + 1 for page in cleaned[:page_num])
+                           + sum(len(line) + 1 for line in cleaned[page_num].split('\n')[:line_num]))
+
+    raw_tokens = count_tokens(raw_text)
+    clean_tokens = count_tokens(full_text)
+    return {
+        "pages": cleaned,
+        "full_text": full_text,
+        "references": references,
+        "appendix_page": appendix_page,
+        "appendix_offset": appendix_offset,
+        "text_stats": {
+            "raw_chars": len(raw_text),
+            "clean_chars": len(full_text),
+            "references_chars": len(references),
+            "raw_tokens": raw_tokens,
+            "clean_tokens": clean_tokens,
+            "saved_tokens": raw_tokens - clean_tokens,
+            "saved_pct": round(100 * (raw_tokens - clean_tokens) / raw_tokens, 1) if raw_tokens else 0.0,
+            "appendix_tokens": count_tokens(full_text[appendix_offset:]) if appendix_offset is not None else 0,
+        },
+    }
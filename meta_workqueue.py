@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sdílená SQLite fronta práce pro zpracování jedné složky na více strojích.
+
+Každý worker si v transakci zapůjčí (lease) jeden PDF, průběžně lease
+prodlužuje heartbeatem a výsledné řádky připisuje do vlastního shardu
+`shards/<worker_id>.csv`. Idstudy přiděluje fronta globálně, takže se
+mezi workery nikdy neopakuje. Příkaz `queue merge` poskládá shardy do
+finálního listu Meta-Analysis.
+
+Kopie a verze téže studie se hledají už při `queue init` (lokální extrakce
+do sdílené cache, bez API); vyřazené PDF dostanou stav `skipped` a žádný
+worker si je nezapůjčí.
+
+Poznámka: SQLite na síťovém disku spoléhá na zamykání souborů daného FS
+(SMB/NFS s funkčními locky). Fronta proto nepoužívá WAL režim.
+"""
+
+import csv
+import json
+import logging
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from meta_schema import apply_schema, empty_frame, to_export
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_NAME = "work_queue.sqlite"
+SHARD_DIR_NAME = "shards"
+
+# Pomocné sloupce shardu - při merge se podle nich vybírá platný pokus
+SHARD_WORKER_COLUMN = "_worker"
+SHARD_ATTEMPT_COLUMN = "_attempt"
+WORKER_STATS_SUFFIX = "_stats.json"
+
+
+@dataclass
+class Task:
+    """Jeden zapůjčený PDF"""
+    pdf_name: str
+    idstudy: int
+    attempt: int
+
+
+def default_worker_id() -> str:
+    """Identifikátor workera: stroj a PID"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """Fronta PDF v SQLite s lease/heartbeat sémantikou"""
+
+    def __init__(self, db_path: str, lease_seconds: float = 600, max_attempts: int = 3):
+        self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Nové spojení pro každou operaci (bezpečné napříč vlákny i procesy)"""
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_schema(self):
+        """Vytvoří tabulky fronty a čítač Idstudy, pokud ještě neexistují"""
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    pdf_name TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    idstudy INTEGER UNIQUE,
+                    worker TEXT,
+                    lease_until REAL,
+                    heartbeat REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    rows INTEGER,
+                    error TEXT
+                );
+                CREATE TABLE IF NOT EXISTS duplicates (
+                    pdf_name TEXT PRIMARY KEY,
+                    canonical TEXT NOT NULL,
+                    relation TEXT NOT NULL,
+                    reason TEXT NOT NULL,
+                    similarity REAL NOT NULL,
+                    skipped INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO counters (name, value) VALUES ('idstudy', 0);
+            """)
+        finally:
+            conn.close()
+
+    def enqueue_folder(self, pdf_folder: str) -> int:
+        """Zařadí všechny PDF ze složky (jména relativně ke složce) a vrátí počet nových"""
+        names = sorted(p.name for p in Path(pdf_folder).glob("*.pdf"))
+        conn = self._connect()
+        try:
+            before = conn.total_changes
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR IGNORE INTO tasks (pdf_name) VALUES (?)",
+                             [(name,) for name in names])
+            conn.execute("COMMIT")
+            return conn.total_changes - before
+        finally:
+            conn.close()
+
+    def mark_duplicates(self, links: Iterable, skipped: Set[str]) -> int:
+        """Zapíše kopie a verze (DuplicateLink); čekající PDF ze `skipped` vyřadí, vrátí jejich počet"""
+        conn = self._connect()
+        try:
+            before = conn.total_changes
+            conn.execute("BEGIN IMMEDIATE")
+            for link in links:
+                conn.execute("""
+                    INSERT OR REPLACE INTO duplicates (pdf_name, canonical, relation, reason, similarity, skipped)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (link.file, link.canonical, link.relation, link.reason, link.similarity,
+                      int(link.file in skipped)))
+            marked = conn.total_changes - before
+            conn.executemany("""
+                UPDATE tasks SET status = 'skipped', error = 'duplicate'
+                WHERE pdf_name = ? AND status = 'pending' AND attempts = 0
+            """, [(name,) for name in sorted(skipped)])
+            conn.execute("COMMIT")
+            return conn.total_changes - before - marked
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def duplicate_links(self) -> List[Dict]:
+        """Kopie a verze nalezené při zařazení (pro list Duplicates)"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM duplicates ORDER BY canonical, pdf_name").fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def allocate_study_id(self, conn: sqlite3.Connection) -> int:
+        """Globálně unikátní Idstudy (volat uvnitř otevřené transakce)"""
+        conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'idstudy'")
+        return conn.execute("SELECT value FROM counters WHERE name = 'idstudy'").fetchone()[0]
+
+    def claim(self, worker_id: str) -> Optional[Task]:
+        """Zapůjčí další čekající PDF nebo PDF s prošlým lease"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Prošlý lease po posledním povoleném pokusu už nikdo nepřevezme
+            conn.execute("""
+                UPDATE tasks SET status = 'failed', error = 'lease expired', lease_until = NULL
+                WHERE status = 'running' AND lease_until < ? AND attempts >= ?
+            """, (now, self.max_attempts))
+            row = conn.execute("""
+                SELECT pdf_name, idstudy, attempts FROM tasks
+                WHERE (status = 'pending' OR (status = 'running' AND lease_until < ?))
+                  AND attempts < ?
+                ORDER BY rowid LIMIT 1
+            """, (now, self.max_attempts)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            idstudy = row["idstudy"]
+            if idstudy is None:
+                idstudy = self.allocate_study_id(conn)
+            attempt = row["attempts"] + 1
+            conn.execute("""
+                UPDATE tasks SET status = 'running', worker = ?, idstudy = ?,
+                    lease_until = ?, heartbeat = ?, attempts = ?, error = NULL
+                WHERE pdf_name = ?
+            """, (worker_id, idstudy, now + self.lease_seconds, now, attempt, row["pdf_name"]))
+            conn.execute("COMMIT")
+            return Task(row["pdf_name"], idstudy, attempt)
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, task: Task, worker_id: str) -> bool:
+        """Prodlouží lease; False znamená, že lease mezitím převzal jiný worker"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute("""
+                UPDATE tasks SET lease_until = ?, heartbeat = ?
+                WHERE pdf_name = ? AND worker = ? AND attempts = ? AND status = 'running'
+            """, (now + self.lease_seconds, now, task.pdf_name, worker_id, task.attempt))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def complete(self, task: Task, worker_id: str, rows: int) -> bool:
+        """Označí PDF jako hotový (jen pokud lease stále patří tomuto workerovi)"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute("""
+                UPDATE tasks SET status = 'done', rows = ?, lease_until = NULL
+                WHERE pdf_name = ? AND worker = ? AND attempts = ? AND status = 'running'
+            """, (rows, task.pdf_name, worker_id, task.attempt))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def fail(self, task: Task, worker_id: str, error: str):
+        """Vrátí PDF do fronty, po max_attempts pokusech ho označí jako failed"""
+        status = 'failed' if task.attempt >= self.max_attempts else 'pending'
+        conn = self._connect()
+        try:
+            conn.execute("""
+                UPDATE tasks SET status = ?, error = ?, lease_until = NULL
+                WHERE pdf_name = ? AND worker = ? AND attempts = ? AND status = 'running'
+            """, (status, error[:500], task.pdf_name, worker_id, task.attempt))
+        finally:
+            conn.close()
+
+    def status_counts(self) -> Dict[str, int]:
+        """Počty PDF podle stavu"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status").fetchall()
+            return {row["status"]: row["n"] for row in rows}
+        finally:
+            conn.close()
+
+    def active_workers(self, exclude: Optional[str] = None) -> int:
+        """Počet workerů, kteří právě drží platný lease (volitelně bez `exclude`)"""
+        conn = self._connect()
+        try:
+            return conn.execute("""
+                SELECT COUNT(DISTINCT worker) FROM tasks
+                WHERE status = 'running' AND lease_until >= ? AND worker IS NOT ?
+            """, (time.time(), exclude)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def completed_attempts(self) -> Dict[int, tuple]:
+        """Idstudy -> (worker, attempt) platného dokončeného pokusu"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT idstudy, worker, attempts FROM tasks WHERE status = 'done'").fetchall()
+            return {row["idstudy"]: (row["worker"], row["attempts"]) for row in rows}
+        finally:
+            conn.close()
+
+    def study_files(self) -> Dict[str, int]:
+        """Jméno PDF -> Idstudy dokončených studií"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT pdf_name, idstudy FROM tasks WHERE status = 'done'").fetchall()
+            return {row["pdf_name"]: row["idstudy"] for row in rows}
+        finally:
+            conn.close()
+
+
+class _Heartbeat(threading.Thread):
+    """Vlákno, které během zpracování prodlužuje lease"""
+
+    def __init__(self, queue: WorkQueue, task: Task, worker_id: str):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.task = task
+        self.worker_id = worker_id
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """Prodlužuje lease každou třetinu jeho délky"""
+        interval = max(self.queue.lease_seconds / 3, 1)
+        while not self._stop_event.wait(interval):
+            try:
+                if not self.queue.heartbeat(self.task, self.worker_id):
+                    self.lost = True
+                    return
+            except sqlite3.OperationalError as e:
+                logger.warning(f"⚠️ Heartbeat selhal: {e}")
+
+    def stop(self):
+        """Ukončí heartbeat a počká na vlákno"""
+        self._stop_event.set()
+        self.join()
+
+
+def append_to_shard(shard_path: Path, rows: List[Dict[str, str]], columns: List[str]):
+    """Připíše řádky studie do CSV shardu workera"""
+    shard_path.parent.mkdir(parents=True, exist_ok=True)
+    new_file = not shard_path.exists()
+    with open(shard_path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns + [SHARD_WORKER_COLUMN, SHARD_ATTEMPT_COLUMN])
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_worker_stats(analyzer, shard_dir: Path, worker_id: str, processed: int):
+    """Uloží tokeny a náklady workera vedle jeho shardu"""
+    tracker = analyzer.cost_tracker
+    stats = {
+        'worker': worker_id,
+        'processed': processed,
+        'input_tokens': tracker.input_tokens,
+        'output_tokens': tracker.output_tokens,
+        'cache_write_tokens': tracker.cache_write_tokens,
+        'cache_read_tokens': tracker.cache_read_tokens,
+        'cost': tracker.calculate_cost(),
+    }
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    with open(shard_dir / f"{worker_id}{WORKER_STATS_SUFFIX}", 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+
+
+def load_worker_stats(export_folder: str) -> List[Dict]:
+    """Načte statistiky všech workerů"""
+    stats = []
+    for path in sorted((Path(export_folder) / SHARD_DIR_NAME).glob(f"*{WORKER_STATS_SUFFIX}")):
+        with open(path, encoding='utf-8') as f:
+            stats.append(json.load(f))
+    return stats
+
+
+def run_worker(analyzer, queue: WorkQueue, pdf_folder: str, export_folder: str,
+               columns: List[str], worker_id: Optional[str] = None,
+               poll_interval: float = 30) -> int:
+    """Zpracovává PDF z fronty, dokud nejsou všechny hotové; vrací počet zpracovaných"""
+    worker_id = worker_id or default_worker_id()
+    shard_dir = Path(export_folder) / SHARD_DIR_NAME
+    shard_path = shard_dir / f"{worker_id}.csv"
+    columns = list(columns)
+    processed = 0
+
+    logger.info(f"👷 Worker {worker_id} startuje (fronta {queue.db_path})")
+    while True:
+        if analyzer.is_paused():
+            logger.warning(f"⏸️ Worker {worker_id}: rozpočet vyčerpán, další PDF nepřebírám")
+            break
+        task = queue.claim(worker_id)
+        if task is None:
+            counts = queue.status_counts()
+            if counts.get('running', 0) == 0:
+                break
+            # Jiný worker ještě běží - jeho lease může vypršet
+            time.sleep(poll_interval)
+            continue
+
+        logger.info(f"👷 {worker_id}: {task.pdf_name} (Idstudy {task.idstudy}, pokus {task.attempt})")
+        heartbeat = _Heartbeat(queue, task, worker_id)
+        heartbeat.start()
+        try:
+            df_study = analyzer.analyze_pdf_optimized(
+                str(Path(pdf_folder) / task.pdf_name), study_id=task.idstudy)
+        except Exception as e:
+            heartbeat.stop()
+            logger.error(f"❌ {task.pdf_name}: {e}")
+            queue.fail(task, worker_id, str(e))
+            continue
+        heartbeat.stop()
+
+        if heartbeat.lost:
+            logger.warning(f"⚠️ Lease pro {task.pdf_name} převzal jiný worker, výsledek zahazuji")
+            continue
+
+        # Do CSV shardu jde exportní podoba (chybějící hodnoty jako 'NA')
+        rows = to_export(df_study).to_dict('records')
+        for row in rows:
+            row[SHARD_WORKER_COLUMN] = worker_id
+            row[SHARD_ATTEMPT_COLUMN] = task.attempt
+        append_to_shard(shard_path, rows, columns)
+        if queue.complete(task, worker_id, len(rows)):
+            processed += 1
+        write_worker_stats(analyzer, shard_dir, worker_id, processed)
+
+        # Rozpočet hlídá každý worker zvlášť (vlastní cost tracker a limit), proto se do
+        # projekce počítá jen jeho podíl čekajících PDF; běžící PDF patří ostatním workerům
+        pending = queue.status_counts().get('pending', 0)
+        share = math.ceil(pending / (queue.active_workers(exclude=worker_id) + 1))
+        analyzer.check_budget(processed, processed + share)
+
+    logger.info(f"👷 Worker {worker_id} končí, zpracováno {processed} PDF")
+    return processed
+
+
+def merge_shards(queue: WorkQueue, export_folder: str, columns: List[str]):
+    """Sloučí shardy všech workerů do jednoho DataFrame (jen platné pokusy)"""
+    import pandas as pd
+
+    shard_files = sorted((Path(export_folder) / SHARD_DIR_NAME).glob("*.csv"))
+    if not shard_files:
+        return empty_frame()
+
+    frames = [pd.read_csv(f, dtype=str, keep_default_na=False) for f in shard_files]
+    merged = pd.concat(frames, ignore_index=True)
+
+    # Po převzetí lease může stejná studie ležet ve dvou shardech
+    valid = queue.completed_attempts()
+    keys = list(zip(merged['Idstudy'].astype(int), merged[SHARD_WORKER_COLUMN],
+                    merged[SHARD_ATTEMPT_COLUMN].astype(int)))
+    mask = [valid.get(idstudy) == (worker, attempt) for idstudy, worker, attempt in keys]
+    merged = merged[mask]
+
+    merged = merged.assign(
+        _study=pd.to_numeric(merged['Idstudy'], errors='coerce'),
+        _estimate=pd.to_numeric(merged['IdEstimate'], errors='coerce'),
+    ).sort_values(['_study', '_estimate'], kind='stable')
+    return apply_schema(merged[columns].reset_index(drop=True))